@@ -0,0 +1,51 @@
+"""
+Compare payload size and latency of the list page and the JSON API.
+
+Usage: python -m benchmarks.api_payload [--items 100] [--repeat 200]
+"""
+
+import argparse
+import gzip
+import time
+
+from benchmarks.common import percentile, setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from lists import api
+    from lists.models import List
+    from lists.writes import append_items
+
+    with test_database():
+        list_ = List.objects.create()
+        append_items(list_.id, [f'Item number {n}' for n in range(args.items)])
+        client = Client()
+        variants = {
+            'html': (f'/lists/{list_.id}/', {}),
+            'json': (f'/api/lists/{list_.id}', {}),
+        }
+        if api.msgpack is not None:
+            variants['msgpack'] = (f'/api/lists/{list_.id}', {'HTTP_ACCEPT': 'application/msgpack'})
+
+        print(f'{"variant":<10}{"bytes":>10}{"gzip":>10}{"p50 ms":>10}{"p95 ms":>10}')
+        for name, (url, headers) in variants.items():
+            latencies = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = client.get(url, **headers)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            body = response.content
+            print(f'{name:<10}{len(body):>10}{len(gzip.compress(body)):>10}'
+                  f'{percentile(latencies, 50) * 1000:>10.2f}{percentile(latencies, 95) * 1000:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Compare appending items one POST at a time with the bulk endpoint.
+
+Usage: python -m benchmarks.bulk_insert [--items 1000]
+"""
+
+import argparse
+import json
+
+from benchmarks.common import setup_django, test_database, timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from lists.models import Item, List
+
+    texts = [f'Item {i}' for i in range(args.items)]
+    results = {}
+    with test_database():
+        client = Client()
+
+        list_ = List.objects.create()
+        with timer(results, 'per_item'):
+            for text in texts:
+                client.post(f'/lists/{list_.id}/new_item', data={'item_text': text})
+        assert Item.objects.filter(list=list_).count() == args.items
+
+        list_ = List.objects.create()
+        with timer(results, 'bulk'):
+            client.post(
+                f'/lists/{list_.id}/bulk',
+                data=json.dumps(texts),
+                content_type='application/json',
+            )
+        assert Item.objects.filter(list=list_).count() == args.items
+
+    for name, seconds in results.items():
+        print(f'{name:>10}: {seconds * 1000:9.1f} ms  ({args.items / seconds:10.0f} items/s)')
+    print(f'{"speedup":>10}: {results["per_item"] / results["bulk"]:9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
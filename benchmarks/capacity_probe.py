@@ -0,0 +1,148 @@
+"""
+Find the gunicorn worker profile that serves the most requests on this box.
+
+Run it on the deployment target itself (``fab capacity-probe`` does that):
+
+    python -m benchmarks.capacity_probe --output ../gunicorn-profile.json
+
+Each candidate worker class / workers / threads combination is started as a
+real gunicorn server with deploy_tools/gunicorn.conf.py, on a unix socket
+and a throwaway SQLite database, and driven with the mixed read/write
+scenario from benchmarks.loadtest. The fastest profile without errors is
+written as JSON; gunicorn.conf.py picks it up through ``GUNICORN_PROFILE``.
+If every profile had errors, nothing is written and the probe exits with
+status 1.
+"""
+
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.loadtest import Target, build_scenarios, run_scenario
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+GUNICORN_CONFIG = PROJECT_ROOT / 'deploy_tools' / 'gunicorn.conf.py'
+UVICORN_WORKER = 'uvicorn_worker.UvicornWorker'
+IN_PROCESS_BROKER = 'lists.events.InProcessBroker'
+
+
+def candidate_profiles(cpu_count):
+    candidates = [
+        ('sync', cpu_count * 2 + 1, 1),
+        ('gthread', cpu_count, 2),
+        ('gthread', cpu_count, 4),
+        ('gthread', cpu_count, 8),
+        ('gthread', cpu_count * 2, 4),
+    ]
+    if importlib.util.find_spec('uvicorn_worker'):
+        if os.getenv('DJANGO_LIST_EVENTS_BACKEND', IN_PROCESS_BROKER) == IN_PROCESS_BROKER:
+            # Live updates through the in-process broker need a single worker;
+            # gunicorn.conf.py refuses to start more.
+            candidates.append((UVICORN_WORKER, 1, 1))
+        else:
+            candidates += [(UVICORN_WORKER, cpu_count, 1), (UVICORN_WORKER, cpu_count * 2, 1)]
+    return [
+        {'worker_class': worker_class, 'workers': workers, 'threads': threads}
+        for worker_class, workers, threads in dict.fromkeys(candidates)
+    ]
+
+
+def _server_env(profile, database):
+    asgi = profile['worker_class'] == UVICORN_WORKER
+    return {
+        **os.environ,
+        'DJANGO_SQLITE_PATH': database,
+        'DJANGO_DEBUG': 'False',
+        'DJANGO_ALLOWED_HOSTS': 'localhost',
+        # Persistent connections are not reused from async code; matches tasks.py.
+        'DJANGO_CONN_MAX_AGE': '0' if asgi else '600',
+        'DJANGO_ASYNC_VIEWS': str(asgi),
+        'GUNICORN_PROFILE': '',
+        'GUNICORN_WORKER_CLASS': profile['worker_class'],
+        'GUNICORN_WORKERS': str(profile['workers']),
+        'GUNICORN_THREADS': str(profile['threads']),
+    }
+
+
+def _wait_for_socket(path, server, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if server.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError(f'gunicorn did not start (exit code {server.poll()})')
+        time.sleep(0.1)
+
+
+def probe(profile, workdir, concurrency, duration):
+    database = os.path.join(workdir, 'probe.sqlite3')
+    socket_path = os.path.join(workdir, 'probe.socket')
+    env = _server_env(profile, database)
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '--verbosity', '0'],
+                   cwd=PROJECT_ROOT, env=env, check=True)
+
+    asgi = profile['worker_class'] == UVICORN_WORKER
+    app = 'notes.asgi:application' if asgi else 'notes.wsgi:application'
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', str(GUNICORN_CONFIG),
+         '--bind', f'unix:{socket_path}', app],
+        cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for_socket(socket_path, server)
+        target = Target(unix_socket=socket_path, host='localhost')
+        target.fetch_csrf_token()
+        scenarios = build_scenarios(target, (10,))
+        return run_scenario(target, scenarios['mixed_90_10'], concurrency, duration)
+    finally:
+        server.terminate()
+        server.wait()
+        for path in (database, socket_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per profile')
+    parser.add_argument('--output', default=str(PROJECT_ROOT / 'gunicorn-profile.json'))
+    args = parser.parse_args()
+
+    cpu_count = multiprocessing.cpu_count()
+    results = []
+    print(f'{"worker class":<32}{"workers":>8}{"threads":>8}{"req/s":>10}{"p99 ms":>10}{"errors":>8}')
+    for profile in candidate_profiles(cpu_count):
+        with tempfile.TemporaryDirectory() as workdir:
+            result = probe(profile, workdir, args.concurrency, args.duration)
+        results.append({**profile, **result})
+        print(f'{profile["worker_class"]:<32}{profile["workers"]:>8}{profile["threads"]:>8}'
+              f'{result["throughput"]:>10.1f}{result["p99_ms"]:>10.1f}{result["errors"]:>8}')
+
+    healthy = [result for result in results if not result['errors']]
+    if not healthy:
+        # Keep whatever profile gunicorn.conf.py already uses rather than one that fails requests.
+        print(f'\nEvery profile failed requests; {args.output} left unchanged', file=sys.stderr)
+        sys.exit(1)
+    best = max(healthy, key=lambda result: result['throughput'])
+    profile = {
+        'worker_class': best['worker_class'],
+        'workers': best['workers'],
+        'threads': best['threads'],
+        'cpu_count': cpu_count,
+        'throughput': best['throughput'],
+        'p99_ms': best['p99_ms'],
+        'probed_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    Path(args.output).write_text(json.dumps(profile, indent=2))
+    print(f'\nBest profile: {best["worker_class"]} x{best["workers"]} '
+          f'({best["threads"]} threads), saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
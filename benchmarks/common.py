@@ -0,0 +1,60 @@
+"""
+Shared helpers for the benchmark scripts in this package.
+
+Benchmarks run against a throwaway test database created the same way
+``manage.py test`` does, so they never touch ``../database/db.sqlite3``.
+Like the tests, they render static URLs without a collectstatic manifest.
+"""
+
+import contextlib
+import os
+import time
+
+import django
+
+from lists.metrics import percentile  # noqa: F401  re-exported for the benchmark scripts
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'notes.settings')
+    django.setup()
+
+
+def _without_static_manifest():
+    """Let templates fall back to unhashed static names, as they do under ``manage.py test``."""
+    from django.conf import settings
+    from django.test.utils import override_settings
+
+    staticfiles = settings.STORAGES['staticfiles']
+    options = {**staticfiles.get('OPTIONS', {}), 'manifest_fallback': True}
+    return override_settings(STORAGES={**settings.STORAGES, 'staticfiles': {**staticfiles, 'OPTIONS': options}})
+
+
+@contextlib.contextmanager
+def test_database(alias='default', *more_aliases):
+    """Create fresh, migrated test databases for the duration of the block."""
+    from django.db import connections
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    created = []
+    manifest = _without_static_manifest()
+    manifest.enable()
+    try:
+        for name in (alias, *more_aliases):
+            connection = connections[name]
+            created.append((connection, connection.settings_dict['NAME']))
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        yield connections[alias]
+    finally:
+        for connection, old_name in reversed(created):
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        manifest.disable()
+        teardown_test_environment()
+
+
+@contextlib.contextmanager
+def timer(results, name):
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
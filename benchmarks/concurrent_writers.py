@@ -0,0 +1,110 @@
+"""
+Measure concurrent new_item throughput under different write profiles.
+
+Each profile runs in its own interpreter against a fresh on-disk test
+database, with several threads POSTing to new_item at the same time:
+Django's defaults, the SQLite tuning from lists/db.py, and the tuning plus
+the write-behind queue from lists/writequeue.py.
+
+Usage: python -m benchmarks.concurrent_writers [--threads 8] [--writes 200]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.common import setup_django, test_database
+
+PROFILES = {
+    # Django's defaults: rollback journal, per-request connections, DEFERRED transactions.
+    'baseline': {'pragmas': {}, 'conn_max_age': 0, 'transaction_mode': None},
+    'tuned': {'pragmas': None, 'conn_max_age': 600, 'transaction_mode': 'IMMEDIATE'},
+    # Tuned, plus new_item appends batched by the write-behind queue.
+    'write_behind': {'pragmas': None, 'conn_max_age': 600, 'transaction_mode': 'IMMEDIATE',
+                     'write_behind': True},
+}
+
+
+def run_profile(name, threads, writes):
+    profile = PROFILES[name]
+    setup_django()
+    from django.conf import settings
+    from django.db import connections
+    from django.test import Client
+    from lists.models import Item, List
+
+    db = settings.DATABASES['default']
+    db['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    db['CONN_MAX_AGE'] = profile['conn_max_age']
+    db['OPTIONS']['transaction_mode'] = profile['transaction_mode']
+    if profile['pragmas'] is not None:
+        settings.SQLITE_PRAGMAS = profile['pragmas']
+    settings.LIST_WRITE_BEHIND = profile.get('write_behind', False)
+
+    errors = []
+    with test_database():
+        list_ = List.objects.create()
+        connections.close_all()
+
+        def writer(n):
+            client = Client(raise_request_exception=False)
+            for i in range(writes):
+                response = client.post(f'/lists/{list_.id}/new_item', data={'item_text': f'{n}-{i}'})
+                if response.status_code != 302:
+                    errors.append(response.status_code)
+            connections.close_all()
+
+        workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        saved = Item.objects.count()
+        if settings.LIST_WRITE_BEHIND:
+            from lists.writequeue import get_queue
+            get_queue().stop()
+            commits = get_queue().commits
+        else:
+            commits = saved
+
+    return {'profile': name, 'seconds': elapsed, 'saved': saved, 'errors': len(errors),
+            'writes_per_second': saved / elapsed, 'commits_per_second': commits / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200, help='writes per thread')
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args.profile, args.threads, args.writes)))
+        return
+
+    results = []
+    for name in PROFILES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.concurrent_writers', '--profile', name,
+             '--threads', str(args.threads), '--writes', str(args.writes)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    baseline = results[0]['writes_per_second']
+    for result in results:
+        print(f'{result["profile"]:>12}: {result["writes_per_second"]:8.0f} writes/s '
+              f'{result["commits_per_second"]:8.0f} commits/s '
+              f'{result["writes_per_second"] / baseline:5.1f}x '
+              f'({result["saved"]} saved, {result["errors"]} failed, {result["seconds"]:.2f}s)')
+
+
+if __name__ == '__main__':
+    main()
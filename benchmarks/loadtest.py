@@ -0,0 +1,273 @@
+"""
+Load-test a running todolist server and record a latency baseline.
+
+Point it at ``manage.py runserver`` or at gunicorn's unix socket:
+
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000
+    python -m benchmarks.loadtest --unix-socket /run/gunicorn/site.socket --host azure.paimoe.tech
+
+Every scenario reports throughput and p50/p95/p99 latency. ``--query-counts``
+additionally replays one request per endpoint in-process against a throwaway
+test database and records how many SQL queries each one issues. Results are
+written as JSON (``--output``) and can be diffed against an earlier run
+with ``--compare``.
+"""
+
+import argparse
+import http.client
+import json
+import random
+import socket
+import subprocess
+import threading
+import time
+from http.cookies import SimpleCookie
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.common import percentile
+
+BASELINE_DIR = Path(__file__).resolve().parent / 'baselines'
+LIST_SIZES = (10, 1_000, 100_000)
+SEED_BATCH = 5_000
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, host):
+        super().__init__(host)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.unix_path)
+
+
+class Target:
+    """Where requests go, plus the CSRF cookie the HTML form views need."""
+
+    def __init__(self, url=None, unix_socket=None, host='localhost'):
+        if unix_socket:
+            self.unix_socket, self.host, self.port = unix_socket, host, None
+        else:
+            parts = urlsplit(url)
+            self.unix_socket, self.host, self.port = None, parts.hostname, parts.port or 80
+        self.csrf_token = None
+
+    def connect(self):
+        if self.unix_socket:
+            return UnixHTTPConnection(self.unix_socket, self.host)
+        return http.client.HTTPConnection(self.host, self.port)
+
+    def request(self, conn, method, path, body=None, headers=None):
+        headers = {'Host': self.host, **(headers or {})}
+        if method == 'POST' and self.csrf_token:
+            headers['Cookie'] = f'csrftoken={self.csrf_token}'
+            headers['X-CSRFToken'] = self.csrf_token
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        payload = response.read()
+        if response.status >= 400:
+            raise RuntimeError(f'{method} {path} -> {response.status}')
+        return response, payload
+
+    def fetch_csrf_token(self):
+        conn = self.connect()
+        response, _ = self.request(conn, 'GET', '/')
+        cookie = SimpleCookie(response.getheader('Set-Cookie', ''))
+        self.csrf_token = cookie['csrftoken'].value
+        conn.close()
+
+
+def _form(text):
+    return urlencode({'item_text': text}), {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+def create_list(target, conn):
+    body, headers = _form('Seed item')
+    response, _ = target.request(conn, 'POST', '/lists/new', body, headers)
+    return int(response.getheader('Location').rstrip('/').rsplit('/', 1)[-1])
+
+
+def seed_list(target, size):
+    conn = target.connect()
+    list_id = create_list(target, conn)
+    remaining = size - 1
+    while remaining > 0:
+        batch = min(remaining, SEED_BATCH)
+        body = json.dumps([f'Item {n}' for n in range(batch)])
+        target.request(conn, 'POST', f'/lists/{list_id}/bulk', body, {'Content-Type': 'application/json'})
+        remaining -= batch
+    conn.close()
+    return list_id
+
+
+def build_scenarios(target, sizes):
+    """Return ``{name: callable(conn)}``; each callable issues one request."""
+    lists = {size: seed_list(target, size) for size in sizes}
+    append_to = lists[min(sizes)]
+
+    def append_item(conn):
+        body, headers = _form(f'Load item {random.random()}')
+        target.request(conn, 'POST', f'/lists/{append_to}/new_item', body, headers)
+
+    def view(list_id):
+        return lambda conn: target.request(conn, 'GET', f'/lists/{list_id}/')
+
+    def mixed(read_ratio):
+        read = view(append_to)
+        return lambda conn: read(conn) if random.random() < read_ratio else append_item(conn)
+
+    scenarios = {
+        'create_list': lambda conn: create_list(target, conn),
+        'append_item': append_item,
+    }
+    for size, list_id in lists.items():
+        scenarios[f'view_list_{size}'] = view(list_id)
+    scenarios['mixed_90_10'] = mixed(0.9)
+    scenarios['mixed_50_50'] = mixed(0.5)
+    return scenarios
+
+
+def run_scenario(target, action, concurrency, duration):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        conn = target.connect()
+        local = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                action(conn)
+            except (OSError, http.client.HTTPException, RuntimeError) as e:
+                errors.append(str(e))
+                conn.close()
+                conn = target.connect()
+                continue
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def measure_query_counts(sizes):
+    """Replay each endpoint once in-process and count its SQL queries."""
+    from benchmarks.common import setup_django, test_database
+    setup_django()
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from lists.models import List
+    from lists.writes import append_items
+
+    counts = {}
+    with test_database():
+        client = Client()
+        lists = {}
+        for size in sizes:
+            lists[size] = List.objects.create()
+            for start in range(0, size, SEED_BATCH):
+                append_items(lists[size].id, [f'Item {n}' for n in range(start, min(start + SEED_BATCH, size))])
+        requests = {
+            'create_list': lambda: client.post('/lists/new', {'item_text': 'Seed item'}),
+            'append_item': lambda: client.post(f'/lists/{lists[min(sizes)].id}/new_item', {'item_text': 'x'}),
+        }
+        for size, list_ in lists.items():
+            requests[f'view_list_{size}'] = lambda list_=list_: client.get(f'/lists/{list_.id}/')
+        for name, send in requests.items():
+            with CaptureQueriesContext(connection) as queries:
+                send()
+            counts[name] = len(queries)
+    return counts
+
+
+def compare(current, baseline):
+    print(f'\n{"scenario":<16}{"metric":<12}{"baseline":>12}{"current":>12}{"change":>10}')
+    for name, result in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if not before:
+            continue
+        for metric in ('throughput', 'p50_ms', 'p95_ms', 'p99_ms'):
+            old, new = before[metric], result[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            print(f'{name:<16}{metric:<12}{old:>12.1f}{new:>12.1f}{change:>+9.1f}%')
+    for name, count in current.get('query_counts', {}).items():
+        old = baseline.get('query_counts', {}).get(name)
+        if old is not None and old != count:
+            print(f'{name:<16}{"queries":<12}{old:>12}{count:>12}')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target_group = parser.add_mutually_exclusive_group()
+    target_group.add_argument('--url', default='http://127.0.0.1:8000')
+    target_group.add_argument('--unix-socket')
+    parser.add_argument('--host', default='localhost', help='Host header to send over a unix socket')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per scenario')
+    parser.add_argument('--sizes', default=','.join(map(str, LIST_SIZES)),
+                        help='comma separated list sizes to seed and view')
+    parser.add_argument('--only', help='comma separated scenario names to run')
+    parser.add_argument('--query-counts', action='store_true')
+    parser.add_argument('--output', help=f'JSON result file (default: {BASELINE_DIR}/<git revision>.json)')
+    parser.add_argument('--compare', help='earlier JSON result to diff against')
+    args = parser.parse_args()
+
+    sizes = tuple(int(size) for size in args.sizes.split(','))
+    target = Target(args.url, args.unix_socket, args.host)
+    target.fetch_csrf_token()
+    scenarios = build_scenarios(target, sizes)
+    if args.only:
+        scenarios = {name: scenarios[name] for name in args.only.split(',')}
+
+    results = {'revision': git_revision(), 'concurrency': args.concurrency, 'scenarios': {}}
+    print(f'{"scenario":<16}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}')
+    for name, action in scenarios.items():
+        result = run_scenario(target, action, args.concurrency, args.duration)
+        results['scenarios'][name] = result
+        print(f'{name:<16}{result["throughput"]:>10.1f}{result["p50_ms"]:>10.1f}'
+              f'{result["p95_ms"]:>10.1f}{result["p99_ms"]:>10.1f}{result["errors"]:>8}')
+
+    if args.query_counts:
+        results['query_counts'] = measure_query_counts(sizes)
+        for name, count in results['query_counts'].items():
+            print(f'{name:<16}{count:>4} queries')
+
+    output = Path(args.output) if args.output else BASELINE_DIR / f'{results["revision"]}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f'\nSaved results to {output}')
+
+    if args.compare:
+        compare(results, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Measure how concurrent write throughput scales with the number of shards.
+
+Each shard count runs in its own interpreter (``DJANGO_LIST_SHARDS=N``)
+against fresh on-disk test databases, one SQLite file per shard. Writer
+processes (like gunicorn workers, so the GIL is not the bottleneck) POST
+to new_item, each on its own list, and the lists are spread evenly over
+the shards. With one shard every commit queues on the same writer lock;
+with more shards, writes to lists on different shards commit in parallel.
+The gain shows once commits rather than CPU are the bottleneck: on a
+durable disk (``--synchronous full``) with at least as many cores as
+writers.
+
+Usage: python -m benchmarks.sharded_writers [--shards 1,2,4] [--writers 8] [--writes 200]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import setup_django, test_database
+
+
+def _writer(list_id, writes, failures):
+    from django.test import Client
+
+    client = Client(raise_request_exception=False)
+    for i in range(writes):
+        response = client.post(f'/lists/{list_id}/new_item', data={'item_text': f'{list_id}-{i}'})
+        if response.status_code != 302:
+            with failures.get_lock():
+                failures.value += 1
+
+
+def run_shards(writers, writes):
+    setup_django()
+    from django.conf import settings
+    from django.db import connections
+    from lists.models import Item, List
+    from lists.sharding import allocate_list_id
+
+    directory = tempfile.mkdtemp()
+    for alias in settings.LIST_SHARD_DATABASES:
+        settings.DATABASES[alias]['TEST']['NAME'] = os.path.join(directory, f'bench-{alias}.sqlite3')
+
+    context = multiprocessing.get_context('fork')
+    failures = context.Value('i', 0)
+    with test_database(*settings.LIST_SHARD_DATABASES):
+        # Writer n writes to a list in slot n, so consecutive writers land on different shards.
+        lists = [List.objects.create(id=allocate_list_id(n % settings.LIST_SHARD_SLOTS)) for n in range(writers)]
+        # Connections must not be shared with the forked writers.
+        connections.close_all()
+
+        processes = [context.Process(target=_writer, args=(list_.id, writes, failures)) for list_ in lists]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+        saved = sum(Item.objects.using(alias).count() for alias in settings.LIST_SHARD_DATABASES)
+
+    return {'shards': len(settings.LIST_SHARD_DATABASES), 'seconds': elapsed, 'saved': saved,
+            'errors': failures.value, 'writes_per_second': saved / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--shards', default='1,2,4', help='comma separated shard counts to compare')
+    parser.add_argument('--writers', type=int, default=8, help='concurrent writer processes')
+    parser.add_argument('--writes', type=int, default=200, help='writes per writer')
+    parser.add_argument('--synchronous', default='full',
+                        help='SQLite synchronous pragma; with full every commit waits for an fsync under the writer lock')
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_shards(args.writers, args.writes)))
+        return
+
+    results = []
+    for shards in args.shards.split(','):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.sharded_writers', '--run',
+             '--writers', str(args.writers), '--writes', str(args.writes)],
+            check=True, capture_output=True, text=True,
+            env={**os.environ, 'DJANGO_LIST_SHARDS': shards, 'DJANGO_LIST_SHARD_SLOTS': str(args.writers),
+                 'DJANGO_SQLITE_SYNCHRONOUS': args.synchronous},
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    baseline = results[0]['writes_per_second']
+    for result in results:
+        print(f'{result["shards"]:>3} shards: {result["writes_per_second"]:8.0f} writes/s '
+              f'{result["writes_per_second"] / baseline:5.1f}x '
+              f'({result["saved"]} saved, {result["errors"]} failed, {result["seconds"]:.2f}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Track a fresh worker's time-to-first-response against a budget.
+
+Each run starts a new interpreter that imports notes.wsgi and serves one
+request (see lists/startup.py), which is what every gunicorn worker does
+after a restart when the app is not preloaded. The median of several runs
+is compared with ``--budget-ms``, and the script exits non-zero when the
+median is over budget, so it can gate a deploy or a CI job. Pages link
+hashed static names, so run collectstatic first, or set DJANGO_TESTING=1
+to serve plain names like the test suite does.
+
+Usage: python -m benchmarks.worker_startup [--runs 7] [--budget-ms 600]
+       [--settings notes.settings,notes.settings_lean]
+"""
+
+import argparse
+import json
+import sys
+
+from benchmarks.common import percentile
+from lists.startup import profile_startup
+
+DEFAULT_BUDGET_MS = 600
+
+
+def measure(settings_module, path, runs):
+    profiles = [profile_startup(settings_module, path) for _ in range(runs)]
+    result = {'settings': settings_module, 'runs': runs}
+    for key in ('wsgi_import_ms', 'first_response_ms', 'process_ms'):
+        values = sorted(profile[key] for profile in profiles)
+        result[key] = percentile(values, 50)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--path', default='/')
+    parser.add_argument('--settings', default='notes.settings,notes.settings_lean',
+                        help='comma separated settings modules to compare')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help='median process time to first response allowed per worker')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    results = [measure(module, args.path, args.runs) for module in args.settings.split(',')]
+    print(f'{"settings":<24}{"import+setup":>14}{"1st response":>14}{"process":>10}{"budget":>10}')
+    over_budget = False
+    for result in results:
+        ok = result['process_ms'] <= args.budget_ms
+        over_budget |= not ok
+        print(f'{result["settings"]:<24}{result["wsgi_import_ms"]:>11.1f} ms{result["first_response_ms"]:>11.1f} ms'
+              f'{result["process_ms"]:>7.1f} ms{"ok" if ok else "OVER":>10}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'budget_ms': args.budget_ms, 'results': results}, f, indent=2)
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+#!/bin/sh
+# 平滑重载 Gunicorn：systemd service 的 ExecReload，用法 gunicorn-reload.sh <unit> <旧 master 的 PID>
+#
+# USR2 让旧 master 启动一个新的 master（重新执行 gunicorn，加载新代码；preload_app 时 HUP 只会复用已加载的旧代码），
+# 新旧两组 worker 共用同一个监听 socket。新 master 就绪后通过 sd_notify 把 MAINPID 交给 systemd（见 gunicorn.conf.py 的 when_ready），
+# 等它的 worker 起来后再向旧 master 发送 TERM：旧 worker 处理完手上的请求后退出，整个过程中一直有 worker 在接受连接。
+# 新 master 启动失败时旧 master 继续服务，本脚本以非零状态退出，systemctl reload 失败，部署中止。
+# 注意：新 master 沿用旧 master 启动时的环境变量，service 文件中的 Environment 改变后需要 restart。
+set -eu
+
+unit=$1
+old_pid=$2
+
+kill -USR2 "$old_pid"
+
+new_pid=$old_pid
+for i in $(seq 60); do
+    new_pid=$(systemctl show --property MainPID --value "$unit")
+    if [ "$new_pid" != "$old_pid" ] && [ "$new_pid" != 0 ] && pgrep -P "$new_pid" > /dev/null; then
+        kill -TERM "$old_pid"
+        exit 0
+    fi
+    sleep 1
+done
+
+echo "New Gunicorn master did not come up; $old_pid keeps serving" >&2
+exit 1
@@ -0,0 +1,113 @@
+# Gunicorn 配置文件，由 systemd service 通过 --config 加载
+#
+# worker 类型、数量与线程数的取值顺序：环境变量 > 容量探测结果 (GUNICORN_PROFILE) > 默认值 / 按 CPU 核数估算。
+# 环境变量指定的 worker 类型与探测结果不同时，整份探测结果都不使用。
+# 容量探测结果由 `python -m benchmarks.capacity_probe` 在目标机器上生成（fab capacity-probe）。
+
+import json
+import multiprocessing
+import os
+
+CPU_COUNT = multiprocessing.cpu_count()
+UVICORN_WORKER = 'uvicorn_worker.UvicornWorker'
+IN_PROCESS_BROKER = 'lists.events.InProcessBroker'
+
+
+def _load_profile():
+    path = os.getenv('GUNICORN_PROFILE', '')
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _in_process_events():
+    return os.getenv('DJANGO_LIST_EVENTS_BACKEND', IN_PROCESS_BROKER) == IN_PROCESS_BROKER
+
+
+def _default_workers(worker_class):
+    if worker_class == UVICORN_WORKER and _in_process_events():
+        # 进程内的实时更新只能送达同一进程中的订阅者，见下方的检查
+        return 1
+    if worker_class == 'sync':
+        # 同步 worker 每个进程一次只处理一个请求，按经典的 2 * 核数 + 1 估算
+        return CPU_COUNT * 2 + 1
+    # gthread 靠线程、uvicorn 靠事件循环处理并发，每个核一个进程即可；
+    # SQLite 只有一个写锁，进程越多写竞争越激烈
+    return CPU_COUNT
+
+
+
+_profile = _load_profile()
+_forced_worker_class = os.getenv('GUNICORN_WORKER_CLASS')
+if _forced_worker_class and _forced_worker_class != _profile.get('worker_class'):
+    # 探测结果里的 workers / threads 是为另一种 worker 测出来的，不能套用
+    _profile = {}
+
+worker_class = _forced_worker_class or _profile.get('worker_class', 'gthread')
+_asgi = worker_class == UVICORN_WORKER
+# 应用入口随 worker 类型确定：uvicorn worker 运行 notes.asgi，sync / gthread 运行 notes.wsgi；
+# 命令行上给出的应用优先（capacity_probe 就是这样启动的）
+wsgi_app = 'notes.asgi:application' if _asgi else 'notes.wsgi:application'
+# 配置文件在 master 加载应用之前执行，worker 继承这里的环境变量：
+# ASGI 下使用协程视图（见 lists/urls.py），并关闭持久连接（Django 不在异步上下文中复用连接）
+os.environ.setdefault('DJANGO_ASYNC_VIEWS', str(_asgi))
+os.environ.setdefault('DJANGO_CONN_MAX_AGE', '0' if _asgi else '600')
+
+workers = int(os.getenv('GUNICORN_WORKERS') or _profile.get('workers') or _default_workers(worker_class))
+# ASGI 下列表页订阅实时更新（lists/events.py）。进程内的发布/订阅后端只能把新条目推送给
+# 同一 worker 上的连接，多个 worker 时其他 worker 上的页面永远收不到，因此拒绝启动：
+# 改用 lists.events.RedisBroker（部署时设置 DEPLOY_LIST_EVENTS_REDIS_URL），或只运行一个 worker
+if _asgi and workers > 1 and _in_process_events():
+    raise RuntimeError(
+        f'{workers} uvicorn workers cannot share live list updates through {IN_PROCESS_BROKER}; '
+        'set DJANGO_LIST_EVENTS_BACKEND=lists.events.RedisBroker and DJANGO_LIST_EVENTS_REDIS_URL, '
+        'or GUNICORN_WORKERS=1'
+    )
+# 仅对 gthread 生效
+threads = int(os.getenv('GUNICORN_THREADS') or _profile.get('threads') or 4)
+
+# 每个 worker 处理一定数量请求后自动重启，防止内存缓慢增长；
+# 加上随机抖动，避免所有 worker 同时重启导致容量骤降
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+
+# 在 master 进程中加载应用后再 fork，worker 共享已导入的模块，启动更快、内存更省；
+# 每个 worker 的冷启动耗时见 `manage.py startup_profile` 和 benchmarks/worker_startup.py
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+# Nginx 通过 unix socket 转发请求，保持连接几秒即可
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+
+
+def when_ready(server):
+    # preload_app 时应用已在 master 中加载：在 fork 之前预热一次，
+    # 编译好的模板和 URL 解析表随 fork 被所有 worker 共享（写时复制）
+    if server.cfg.preload_app:
+        from lists.warmup import warm_up
+
+        warm_up()
+    # 平滑重载（USR2，见 deploy_tools/gunicorn-reload.sh）启动的新 master：告诉 systemd 主进程换成了自己，
+    # 旧 master 随后退出时 systemd 不会认为服务停止了
+    if server.master_pid:
+        from gunicorn import systemd
+
+        systemd.sd_notify(f'MAINPID={os.getpid()}', server.log)
+
+
+def post_fork(server, worker):
+    # 数据库连接不能跨 fork 共享；master 正常不会打开连接，这里保险起见全部关闭
+    if server.cfg.preload_app:
+        from django.db import connections
+
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    # worker 加载完应用之后、开始接受请求之前预热：编译模板、解析 URL、预渲染首页，
+    # 避免部署或 worker 重启后的首批请求出现延迟尖峰（preload 时已在 master 中完成，这里几乎不耗时）
+    from lists.warmup import warm_up
+
+    warm_up()
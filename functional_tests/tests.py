@@ -9,6 +9,9 @@ from webdriver_manager.chrome import ChromeDriverManager
 import time
 
 class NewVisitorTest(StaticLiveServerTestCase):
+    # The test settings always define a second shard database.
+    databases = '__all__'
+
     def setUp(self):
         self.service = Service(ChromeDriverManager().install())
         self.browser = webdriver.Chrome(service=self.service)
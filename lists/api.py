@@ -0,0 +1,171 @@
+"""
+JSON API for lists and items.
+
+Reads use ``values()`` projections and never build model instances.
+Payloads are compact: there is no whitespace, and items are encoded as
+``[id, text]`` pairs, with the field names sent once in ``fields``.
+Clients that send ``Accept: application/msgpack`` get MessagePack instead
+when the optional ``msgpack`` package is installed.
+"""
+
+import json
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from lists.conditional import get_list_for_read, not_modified_response, set_list_validators
+from lists.models import List
+from lists.pagination import int_param, item_page, position_param
+from lists.search import search_items
+from lists.sharding import list_shard
+from lists.writes import append_items, delete_item, delete_list, move_item
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ITEM_FIELDS = ['id', 'text']
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+
+
+def _wants_msgpack(request):
+    return msgpack is not None and MSGPACK_CONTENT_TYPE in request.headers.get('Accept', '')
+
+
+def payload_response(request, data, status=200):
+    if _wants_msgpack(request):
+        response = HttpResponse(msgpack.packb(data), content_type=MSGPACK_CONTENT_TYPE, status=status)
+    else:
+        response = HttpResponse(
+            json.dumps(data, separators=(',', ':'), ensure_ascii=False),
+            content_type='application/json', status=status,
+        )
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def _read_json(request):
+    try:
+        return json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def parse_bulk_texts(request):
+    if request.content_type == 'application/json':
+        texts = json.loads(request.body)
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            raise ValueError('expected a JSON array of strings')
+    else:
+        texts = request.body.decode(request.encoding or 'utf-8').splitlines()
+    return [text.strip() for text in texts if text.strip()]
+
+
+def _list_detail(request, list_id):
+    list_ = get_list_for_read(list_id)
+    variant = 'msgpack' if _wants_msgpack(request) else 'json'
+    response = not_modified_response(request, list_, variant)
+    if response is not None:
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    limit = min(int_param(request.GET, 'limit', settings.LIST_PAGE_SIZE) or 1, settings.LIST_PAGE_SIZE)
+    items, next_after = item_page(
+        list_.id, position_param(request.GET, 'after'), limit, archived=list_.archived_at is not None,
+    )
+
+    response = payload_response(request, {
+        'id': list_.id,
+        'revision': list_.revision,
+        'fields': ITEM_FIELDS,
+        'items': [[item['id'], item['text']] for item in items],
+        'next_after': next_after,
+    })
+    return set_list_validators(response, list_, variant)
+
+
+@csrf_exempt
+@list_shard
+def list_resource(request, list_id):
+    if request.method in ('GET', 'HEAD'):
+        return _list_detail(request, list_id)
+    if request.method == 'DELETE':
+        if not delete_list(list_id):
+            return payload_response(request, {'error': 'not found'}, status=404)
+        return HttpResponse(status=204)
+    return HttpResponseNotAllowed(['GET', 'HEAD', 'DELETE'])
+
+
+@csrf_exempt
+@require_POST
+@list_shard
+def add_item(request, list_id):
+    list_ = get_object_or_404(List.objects.only('id'), id=list_id)
+    data = _read_json(request)
+    text = data.get('text') if isinstance(data, dict) else None
+    if not isinstance(text, str) or not text.strip():
+        return HttpResponseBadRequest('expected {"text": "..."}')
+    [item] = append_items(list_.id, [text.strip()])
+    return payload_response(request, {'id': item.id, 'list': list_.id}, status=201)
+
+
+@csrf_exempt
+@require_POST
+@list_shard
+def bulk_add_items(request, list_id):
+    list_ = get_object_or_404(List.objects.only('id'), id=list_id)
+    try:
+        texts = parse_bulk_texts(request)
+    except (ValueError, UnicodeDecodeError) as e:
+        return HttpResponseBadRequest(str(e))
+    items = append_items(list_.id, texts)
+    return payload_response(request, {'list': list_.id, 'ids': [item.id for item in items]}, status=201)
+
+
+@csrf_exempt
+@list_shard
+def item_resource(request, list_id, item_id):
+    if request.method != 'DELETE':
+        return HttpResponseNotAllowed(['DELETE'])
+    if not delete_item(list_id, item_id):
+        return payload_response(request, {'error': 'not found'}, status=404)
+    return HttpResponse(status=204)
+
+
+@csrf_exempt
+@require_POST
+@list_shard
+def move_item_resource(request, list_id, item_id):
+    data = _read_json(request)
+    anchors = {key: data.get(key) for key in ('after', 'before')} if isinstance(data, dict) else {}
+    anchors = {key: value for key, value in anchors.items() if value is not None}
+    if len(anchors) != 1 or not all(type(value) is int for value in anchors.values()):
+        return HttpResponseBadRequest('expected {"after": <item id>} or {"before": <item id>}')
+    position = move_item(int(list_id), int(item_id), **anchors)
+    if position is None:
+        return payload_response(request, {'error': 'not found'}, status=404)
+    return payload_response(request, {'id': int(item_id), 'position': position})
+
+
+def search(request):
+    text = request.GET.get('q', '').strip()
+    if not text:
+        return HttpResponseBadRequest('missing q')
+    list_id = request.GET.get('list')
+    if list_id is not None and not list_id.isdigit():
+        return HttpResponseBadRequest('list must be a list id')
+    page = max(int_param(request.GET, 'page', 1), 1)
+    page_size = settings.SEARCH_PAGE_SIZE
+
+    results = search_items(text, list_id, limit=page_size + 1, offset=(page - 1) * page_size)
+    return payload_response(request, {
+        'q': text,
+        'page': page,
+        'results': results[:page_size],
+        'next_page': page + 1 if len(results) > page_size else None,
+    })
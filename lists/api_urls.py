@@ -0,0 +1,12 @@
+from django.urls import path, re_path
+from lists import api
+
+
+urlpatterns = [
+    re_path(r'^lists/(?P<list_id>\d+)$', api.list_resource, name='api_list'),
+    re_path(r'^lists/(?P<list_id>\d+)/items$', api.add_item, name='api_add_item'),
+    re_path(r'^lists/(?P<list_id>\d+)/items/bulk$', api.bulk_add_items, name='api_bulk_add_items'),
+    re_path(r'^lists/(?P<list_id>\d+)/items/(?P<item_id>\d+)$', api.item_resource, name='api_item'),
+    re_path(r'^lists/(?P<list_id>\d+)/items/(?P<item_id>\d+)/move$', api.move_item_resource, name='api_move_item'),
+    path('search', api.search, name='api_search'),
+]
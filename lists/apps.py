@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ListsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'lists'
+
+    def ready(self):
+        from lists import db  # noqa: F401  connects the connection_created hook
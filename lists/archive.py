@@ -0,0 +1,240 @@
+"""
+Archival of cold lists into compressed rows.
+
+``archive_list()`` moves a list's items out of ``lists_item`` into
+``ListArchiveChunk`` rows of ``LIST_ARCHIVE_CHUNK_SIZE`` items each, held
+as zlib-compressed JSON (stdlib only, so every install can read every
+archive). A ``ListArchive`` row records the list's item count and newest
+item id, and ``List.archived_at`` is stamped. The list
+row itself stays, so the overview, the conditional GET validators and
+cached pages are unaffected. Reads serve an archived list from its chunks
+(``iter_archived_items``). Each chunk is keyed by its last position, so a
+page decompresses only the chunk it starts in (and the next, if the page
+runs over), and an export holds one chunk in memory at a time. The first
+write puts the items back in ``lists_item`` with their original ids
+(``restore_list``). Archived items are not in the search index until then.
+
+``manage.py archive_lists`` archives the lists that nobody has written
+to for ``LIST_ARCHIVE_IDLE_DAYS`` and then hands the freed pages back to
+the file system with incremental VACUUM (``reclaim_space``). A database
+created before incremental auto-vacuum was enabled is only converted, with
+one full VACUUM, when asked to (``--convert-auto-vacuum``).
+"""
+
+import itertools
+import json
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max
+from django.utils import timezone
+
+from lists.models import Item, List, ListArchive, ListArchiveChunk
+from lists.sharding import list_atomic
+
+# Pages handed back per statement, so the writer lock is released in between.
+VACUUM_STEP_PAGES = 1000
+
+
+def _compress(payload):
+    return 'zlib', zlib.compress(payload, 9)
+
+
+def _decompress(codec, data):
+    if codec != 'zlib':
+        raise ValueError(f'unknown archive codec {codec!r}')
+    return zlib.decompress(bytes(data))
+
+
+def _pack(rows):
+    return json.dumps(rows, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def _rows(chunk):
+    """The chunk's ``[id, text, position]`` rows, in position order."""
+    return json.loads(_decompress(chunk.codec, chunk.data))
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _save_chunk(list_id, rows, using=None):
+    """Compress ``rows`` into a new chunk of the list; return the raw and compressed sizes."""
+    payload = _pack(rows)
+    codec, data = _compress(payload)
+    ListArchiveChunk(
+        list_id=list_id, last_position=rows[-1][2], codec=codec, data=data, item_count=len(rows),
+    ).save(using=using, force_insert=True)
+    return len(payload), len(data)
+
+
+def _next_chunk(list_id, after, using=None):
+    return (
+        ListArchiveChunk.objects.using(using).filter(list_id=list_id, last_position__gt=after)
+        .order_by('last_position').first()
+    )
+
+
+def archive_list(list_id, idle_before=None):
+    """
+    Move the list's items into compressed ``ListArchiveChunk`` rows of
+    ``LIST_ARCHIVE_CHUNK_SIZE`` items each. Return ``(items, raw bytes,
+    compressed bytes)``, or None if the list is gone, already archived or
+    was written to after ``idle_before``.
+    """
+    with list_atomic(list_id):
+        lists = List.objects.filter(id=list_id, archived_at__isnull=True)
+        if idle_before is not None:
+            lists = lists.filter(updated_at__lt=idle_before)
+        # Claim the list first, which also rechecks it under the write lock.
+        if not lists.update(archived_at=timezone.now()):
+            return None
+        items, raw, compressed, last_item_id = 0, 0, 0, 0
+        rows = (
+            Item.objects.filter(list_id=list_id).order_by('position').values_list('id', 'text', 'position')
+            .iterator(chunk_size=settings.LIST_ARCHIVE_CHUNK_SIZE)
+        )
+        for chunk in _chunks(rows, settings.LIST_ARCHIVE_CHUNK_SIZE):
+            chunk_raw, chunk_compressed = _save_chunk(list_id, chunk)
+            items, raw, compressed = items + len(chunk), raw + chunk_raw, compressed + chunk_compressed
+            last_item_id = max(last_item_id, max(row[0] for row in chunk))
+        ListArchive.objects.create(list_id=list_id, item_count=items, last_item_id=last_item_id)
+        Item.objects.filter(list_id=list_id).delete()
+    return items, raw, compressed
+
+
+def restore_list(list_id):
+    """
+    Put an archived list's items back into ``lists_item``, one chunk at a
+    time. Call it inside the write's transaction before touching the items;
+    for a list that is not archived it costs one UPDATE. Return whether
+    anything was restored.
+    """
+    if not List.objects.filter(id=list_id, archived_at__isnull=False).update(archived_at=None):
+        return False
+    after = ''
+    while (chunk := _next_chunk(list_id, after)) is not None:
+        Item.objects.bulk_create(
+            [Item(id=item_id, list_id=list_id, text=text, position=position)
+             for item_id, text, position in _rows(chunk)],
+            batch_size=settings.LIST_BULK_BATCH_SIZE,
+        )
+        after = chunk.last_position
+    ListArchiveChunk.objects.filter(list_id=list_id).delete()
+    ListArchive.objects.filter(list_id=list_id).delete()
+    return True
+
+
+def iter_archived_items(list_id, after=''):
+    """
+    Yield the items of an archived list after position ``after`` as
+    ``values()``-style dicts, decompressing one chunk at a time. If a write
+    restores the list meanwhile, the rest is read from ``lists_item``.
+    """
+    while (chunk := _next_chunk(list_id, after)) is not None:
+        for item_id, text, position in _rows(chunk):
+            if position > after:
+                yield {'id': item_id, 'text': text, 'position': position}
+        after = chunk.last_position
+    if not List.objects.filter(id=list_id, archived_at__isnull=False).exists():
+        yield from (
+            Item.objects.filter(list_id=list_id, position__gt=after).order_by('position')
+            .values('id', 'text', 'position').iterator(chunk_size=settings.LIST_ARCHIVE_CHUNK_SIZE)
+        )
+
+
+def archived_items(list_id, after='', limit=None):
+    """Up to ``limit`` items of an archived list after position ``after``."""
+    return list(itertools.islice(iter_archived_items(list_id, after), limit))
+
+
+def _reserve_item_ids(using, count):
+    """Keep the next ``count`` item ids on ``using`` unused; return the id before them."""
+    with connections[using].cursor() as cursor:
+        # AUTOINCREMENT hands out max(seq, largest id) + 1.
+        cursor.execute(
+            "SELECT max(coalesce((SELECT seq FROM sqlite_sequence WHERE name = 'lists_item'), 0), "
+            "coalesce((SELECT max(id) FROM lists_item), 0))"
+        )
+        base = cursor.fetchone()[0]
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'lists_item'")
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('lists_item', %s)", [base + count])
+    return base
+
+
+def copy_archives(archives, target):
+    """
+    Copy the ``archives`` queryset and its lists' chunks to the ``target``
+    database, renumbering the archived items so their ids are free there.
+    Every id moves by the same offset, which keeps each list's items in id
+    order. Return the number of archives copied.
+    """
+    offset = _reserve_item_ids(target, archives.aggregate(last=Max('last_item_id'))['last'] or 0)
+    for archive in archives:
+        if archive.last_item_id:
+            archive.last_item_id += offset
+        archive.save(using=target, force_insert=True)
+        after = ''
+        # One chunk in memory at a time.
+        while (chunk := _next_chunk(archive.list_id, after, using=archives.db)) is not None:
+            rows = [[item_id + offset, text, position] for item_id, text, position in _rows(chunk)]
+            _save_chunk(archive.list_id, rows, using=target)
+            after = chunk.last_position
+    return len(archives)
+
+
+def last_archived_item_id(list_id):
+    return ListArchive.objects.filter(list_id=list_id).values_list('last_item_id', flat=True).first() or 0
+
+
+def idle_lists(using, idle_before):
+    return (
+        List.objects.using(using).filter(archived_at__isnull=True, updated_at__lt=idle_before)
+        .order_by('id').values_list('id', flat=True)
+    )
+
+
+def idle_cutoff(days=None):
+    return timezone.now() - timedelta(days=settings.LIST_ARCHIVE_IDLE_DAYS if days is None else days)
+
+
+def _pragma(cursor, name):
+    cursor.execute(f'PRAGMA {name}')
+    return cursor.fetchone()[0]
+
+
+def reclaim_space(using='default', convert=False):
+    """
+    Return the database's free pages to the file system, ``VACUUM_STEP_PAGES``
+    pages per statement, and return the bytes reclaimed. A database created
+    without incremental auto-vacuum has to be rewritten by one full VACUUM,
+    which holds the write lock and needs as much free disk as the file;
+    that only happens with ``convert``, otherwise nothing is done and None
+    is returned.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        page_size = _pragma(cursor, 'page_size')
+        pages_before = _pragma(cursor, 'page_count')
+        if _pragma(cursor, 'auto_vacuum') != 2:  # INCREMENTAL
+            if not convert:
+                return None
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            cursor.execute('VACUUM')
+        else:
+            while _pragma(cursor, 'freelist_count'):
+                # incremental_vacuum frees pages as the statement is stepped.
+                cursor.execute(f'PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})')
+                cursor.fetchall()
+        pages_after = _pragma(cursor, 'page_count')
+    return (pages_before - pages_after) * page_size
@@ -0,0 +1,130 @@
+"""
+Resumable data backfills over large tables.
+
+``run_backfill()`` walks a queryset in primary key order, ``batch_size``
+rows at a time, and hands each batch to a ``process`` function inside its
+own short transaction. The batch's last primary key is saved to a
+``BackfillCheckpoint`` row in that same transaction, so after a crash the
+next run carries on from the last committed batch instead of starting
+over. Between batches it sleeps for ``pause`` seconds, which leaves SQLite's
+single writer lock free for requests while a backfill runs.
+
+A backfill registered with ``atomic=False`` runs ``process`` outside that
+transaction, for work that commits in smaller steps of its own. Its
+checkpoint is saved once ``process`` returns, so it must be safe to repeat
+the batch a crash interrupted.
+
+Named backfills are registered with ``@register`` and run with
+``manage.py backfill <name>``. A data migration can use ``run_python()``::
+
+    class Migration(migrations.Migration):
+        # Let every batch commit on its own instead of inside one
+        # migration-wide transaction.
+        atomic = False
+        dependencies = [('lists', '0010_backfill_checkpoint')]
+        operations = [
+            migrations.RunPython(backfill.run_python('item-text-strip', 'lists.Item', strip_text)),
+        ]
+"""
+
+import contextlib
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+BACKFILLS = {}
+
+
+def register(name, atomic=True):
+    """Register a named backfill: a function returning ``(queryset, process)``."""
+    def decorator(func):
+        func.atomic = atomic
+        BACKFILLS[name] = func
+        return func
+    return decorator
+
+
+def run_backfill(name, queryset, process, batch_size=None, pause=None, progress=None,
+                 restart=False, checkpoint_model=None, atomic=True):
+    """
+    Apply ``process(batch)`` to every row of ``queryset`` in primary key
+    batches and return the checkpoint. A backfill that already completed
+    is not run again unless ``restart`` is true. With ``atomic=False`` the
+    batch is not wrapped in a transaction.
+    """
+    if checkpoint_model is None:
+        from lists.models import BackfillCheckpoint as checkpoint_model
+    if batch_size is None:
+        batch_size = settings.LIST_BACKFILL_BATCH_SIZE
+    if pause is None:
+        pause = settings.LIST_BACKFILL_PAUSE_MS / 1000
+
+    using = queryset.db
+    checkpoint, _ = checkpoint_model.objects.using(using).get_or_create(name=name)
+    if restart:
+        checkpoint.last_pk, checkpoint.processed = 0, 0
+        checkpoint.started_at, checkpoint.completed_at = timezone.now(), None
+        checkpoint.save(using=using)
+    elif checkpoint.completed_at:
+        return checkpoint
+
+    queryset = queryset.order_by('pk')
+    while True:
+        with transaction.atomic(using=using) if atomic else contextlib.nullcontext():
+            batch = list(queryset.filter(pk__gt=checkpoint.last_pk)[:batch_size])
+            if not batch:
+                break
+            process(batch)
+            checkpoint.last_pk = batch[-1].pk
+            checkpoint.processed += len(batch)
+            checkpoint.updated_at = timezone.now()
+            checkpoint.save(using=using, update_fields=['last_pk', 'processed', 'updated_at'])
+        if progress:
+            progress(checkpoint)
+        if len(batch) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    checkpoint.completed_at = checkpoint.updated_at = timezone.now()
+    checkpoint.save(using=using, update_fields=['completed_at', 'updated_at'])
+    return checkpoint
+
+
+def run_python(name, model, process, **options):
+    """Return a ``RunPython`` function that backfills the historical ``model`` ('app_label.Model')."""
+    def forwards(apps, schema_editor):
+        queryset = apps.get_model(model).objects.using(schema_editor.connection.alias)
+        run_backfill(name, queryset, process, checkpoint_model=apps.get_model('lists', 'BackfillCheckpoint'),
+                     **options)
+    return forwards
+
+
+@register('list-summaries')
+def list_summaries():
+    """Recompute every list's item count and previews from lists_item."""
+    from lists.models import List
+
+    def process(lists):
+        List.objects.filter(id__in=[list_.id for list_ in lists]).update(**List.summary_expressions())
+
+    # Archived lists have no rows in lists_item.
+    return List.objects.filter(archived_at__isnull=True).only('id'), process
+
+
+# Rebalancing commits a chunk of one list's items at a time, so the batch
+# of lists must not be wrapped in one long transaction.
+@register('item-positions', atomic=False)
+def item_positions():
+    """Rewrite every list's position keys as short, evenly spaced keys."""
+    from lists.models import List
+    from lists.positions import rebalance
+
+    def process(lists):
+        for list_ in lists:
+            rebalance(list_.id)
+
+    # Archived lists have no rows in lists_item.
+    return List.objects.filter(archived_at__isnull=True).only('id'), process
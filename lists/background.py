@@ -0,0 +1,47 @@
+"""
+Per-list maintenance in background threads.
+
+A ``ListTask`` runs ``func(list_id)`` in a daemon thread once the current
+transaction on the list's database commits, so the thread sees the write
+that asked for it. A list that already has the task running is skipped;
+the running one picks up its state. Failures are logged rather than
+raised, and the thread closes its database connections when done.
+"""
+
+import logging
+import threading
+
+from django.db import close_old_connections, transaction
+
+from lists.sharding import current_db
+
+logger = logging.getLogger(__name__)
+
+
+class ListTask:
+    def __init__(self, func, name):
+        self.func = func
+        self.name = name
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def _run(self, list_id):
+        try:
+            self.func(list_id)
+        except Exception:
+            logger.exception('Background %s of list %s failed', self.name, list_id)
+        finally:
+            close_old_connections()
+            with self._lock:
+                self._running.discard(list_id)
+
+    def _start(self, list_id):
+        with self._lock:
+            if list_id in self._running:
+                return
+            self._running.add(list_id)
+        threading.Thread(target=self._run, args=(list_id,), name=f'lists-{self.name}', daemon=True).start()
+
+    def schedule(self, list_id):
+        """Run the task for the list in a background thread once the current transaction commits."""
+        transaction.on_commit(lambda: self._start(list_id), using=current_db())
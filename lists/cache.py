@@ -0,0 +1,37 @@
+"""
+Rendered-fragment cache for list pages.
+
+Fragment keys embed the list's ``revision``, which every write view bumps
+through ``List.touch``. A write therefore never has to delete anything:
+stale fragments are simply never read again and age out of the backend.
+They also embed ``settings.RELEASE``, so a deploy that changes the
+templates does not serve fragments rendered by the previous version
+from a cache that outlives the workers.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache():
+    return caches[settings.LIST_FRAGMENT_CACHE]
+
+
+def table_fragment_key(list_id, revision, after, offset):
+    return f'lists:{settings.RELEASE}:list:{list_id}:r{revision}:table:{after}:{offset}'
+
+
+def get_fragment(key):
+    return _cache().get(key)
+
+
+def set_fragment(key, html):
+    _cache().set(key, html, timeout=settings.LIST_FRAGMENT_CACHE_TIMEOUT)
+
+
+async def aget_fragment(key):
+    return await _cache().aget(key)
+
+
+async def aset_fragment(key, html):
+    await _cache().aset(key, html, timeout=settings.LIST_FRAGMENT_CACHE_TIMEOUT)
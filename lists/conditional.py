@@ -0,0 +1,44 @@
+"""
+Conditional GET helpers shared by the HTML and JSON list views.
+
+Validators come from ``List.revision`` and ``List.updated_at`` alone, so
+a client holding the current copy gets its 304 before any item query or
+template render runs. The ETag is weak and also names the release and the
+representation (``variant``: the HTML page, JSON or MessagePack), so a
+copy from an older deploy or in another format never matches.
+"""
+
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from lists.models import List
+
+
+def _list_validators_queryset():
+    return List.objects.only('id', 'revision', 'updated_at', 'archived_at')
+
+
+def get_list_for_read(list_id):
+    return get_object_or_404(_list_validators_queryset(), id=list_id)
+
+
+async def aget_list_for_read(list_id):
+    return await aget_object_or_404(_list_validators_queryset(), id=list_id)
+
+
+def _last_modified(list_):
+    return int(list_.updated_at.timestamp())
+
+
+def not_modified_response(request, list_, variant='html'):
+    """Return a 304/412 response if the client's copy is current, else None."""
+    return get_conditional_response(request, etag=list_.etag(variant), last_modified=_last_modified(list_))
+
+
+def set_list_validators(response, list_, variant='html'):
+    response['ETag'] = list_.etag(variant)
+    response['Last-Modified'] = http_date(_last_modified(list_))
+    # Let browsers and nginx keep the page but revalidate it on every use.
+    response['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,30 @@
+"""
+SQLite connection tuning.
+
+Every new SQLite connection gets the pragmas listed in
+``settings.SQLITE_PRAGMAS`` applied before Django hands it out. Combined
+with persistent connections (``CONN_MAX_AGE``) this runs once per worker
+connection instead of once per request. New connections also get the
+request metrics query recorder installed.
+"""
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from lists.metrics import record_query
+
+
+@receiver(connection_created, dispatch_uid='lists.db.configure_sqlite')
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created, dispatch_uid='lists.db.install_query_recorder')
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
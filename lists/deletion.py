@@ -0,0 +1,92 @@
+"""
+Deletion of lists in bounded chunks.
+
+Deleting a ``List`` through the ORM lets the cascade collector load the id
+of every item into memory. It then removes them with large ``IN`` deletes
+in one transaction that holds the shard's writer lock throughout. Instead,
+``tombstone_list()`` stamps ``List.deleted_at``. ``List.objects`` leaves
+tombstoned lists out, so the list disappears from every read at once.
+``purge_list()`` then deletes the items with raw statements of at most
+``LIST_DELETE_CHUNK_SIZE`` rows each. Every statement runs in its own
+transaction with a short pause after it, and the list row goes with the
+last chunk. Memory stays at one chunk of ids inside SQLite, and the writer
+lock is held for one chunk at a time.
+
+``lists.writes.delete_list`` purges a list of at most one chunk right away
+and hands larger ones to a background thread (``schedule_purge``).
+``manage.py delete_lists`` deletes lists the same way in the foreground
+and finishes purges that a restarted worker left behind.
+"""
+
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from lists.background import ListTask
+from lists.models import List
+from lists.sharding import list_atomic, using_db, using_list
+
+
+def tombstone_list(list_id):
+    """Hide the list from every read; return its item count, or None if there is no such list."""
+    with list_atomic(list_id):
+        item_count = List.objects.filter(id=list_id).values_list('item_count', flat=True).first()
+        if item_count is None:
+            return None
+        # The revision bump makes every cached page of the list stale too.
+        List.objects.filter(id=list_id).update(deleted_at=timezone.now(), revision=F('revision') + 1)
+    return item_count
+
+
+def tombstoned_lists(using):
+    return List.all_objects.using(using).filter(deleted_at__isnull=False).order_by('id').values_list('id', flat=True)
+
+
+def purge_list(list_id, chunk_size=None, pause=None, progress=None, using=None):
+    """
+    Delete a tombstoned list's items ``chunk_size`` rows per transaction,
+    then the list itself. Return the number of items deleted, or None if
+    the list is not tombstoned. ``using`` purges the copy on that database
+    instead of the list's shard (the old copy of a moved slot).
+    """
+    if chunk_size is None:
+        chunk_size = settings.LIST_DELETE_CHUNK_SIZE
+    if pause is None:
+        pause = settings.LIST_DELETE_PAUSE_MS / 1000
+
+    with using_list(list_id) if using is None else using_db(using) as alias:
+        if not List.all_objects.filter(id=list_id, deleted_at__isnull=False).exists():
+            return None
+        deleted = 0
+        while True:
+            with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                # The (list, id) index finds the chunk without reading the rest of the list.
+                cursor.execute(
+                    'DELETE FROM lists_item WHERE id IN (SELECT id FROM lists_item WHERE list_id = %s LIMIT %s)',
+                    [list_id, chunk_size],
+                )
+                deleted += cursor.rowcount
+                done = cursor.rowcount < chunk_size
+                if done:
+                    # In the last chunk's transaction, so an item appended
+                    # meanwhile can never be left without its list.
+                    cursor.execute('DELETE FROM lists_listarchivechunk WHERE list_id = %s', [list_id])
+                    cursor.execute('DELETE FROM lists_listarchive WHERE list_id = %s', [list_id])
+                    cursor.execute('DELETE FROM lists_list WHERE id = %s', [list_id])
+            if progress:
+                progress(deleted)
+            if done:
+                return deleted
+            if pause:
+                time.sleep(pause)
+
+
+_purger = ListTask(purge_list, 'purge')
+
+
+def schedule_purge(list_id):
+    """Purge the tombstoned list in a background thread once the current transaction commits."""
+    _purger.schedule(list_id)
@@ -0,0 +1,142 @@
+"""
+Fan-out of new-item events to Server-Sent Events subscribers.
+
+Write paths call ``publish_items`` once their transaction commits; each
+open ``/lists/<id>/events`` stream holds a subscription for its list and
+forwards the events as they arrive. A subscription is ``start()``-ed,
+then read with ``get(timeout)`` and finally ``close()``-d. The broker is chosen by
+``LIST_EVENTS_BACKEND``:
+
+* ``lists.events.InProcessBroker`` (default) delivers within one process,
+  which is enough for a single ASGI worker; deploy_tools/gunicorn.conf.py
+  refuses to start several uvicorn workers with it.
+* ``lists.events.RedisBroker`` relays through Redis pub/sub so that a
+  write handled by one worker reaches viewers connected to any other.
+  It needs the optional ``redis`` package and ``LIST_EVENTS_REDIS_URL``.
+"""
+
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from lists.sharding import current_db
+
+
+class InProcessSubscription:
+    def __init__(self, broker, list_id):
+        self.broker = broker
+        self.list_id = list_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.LIST_EVENTS_QUEUE_SIZE)
+
+    def deliver(self, event):
+        # Called from any thread; hop onto the subscriber's event loop.
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # The loop has shut down; the stream is gone.
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass  # A stalled client falls behind; it catches up via Last-Event-ID on reconnect.
+
+    async def start(self):
+        pass  # Registered with the broker as soon as it was created.
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    async def close(self):
+        self.broker._unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, list_id):
+        subscription = InProcessSubscription(self, list_id)
+        with self._lock:
+            self._subscribers[list_id].add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers[subscription.list_id]
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.list_id]
+
+    def publish(self, list_id, events):
+        with self._lock:
+            subscribers = list(self._subscribers.get(list_id, ()))
+        for subscription in subscribers:
+            for event in events:
+                subscription.deliver(event)
+
+
+class RedisSubscription:
+    def __init__(self, client, channel):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.channel = channel
+
+    async def start(self):
+        await self.pubsub.subscribe(self.channel)
+
+    async def get(self, timeout):
+        message = await self.pubsub.get_message(timeout=timeout)
+        if message is None:
+            raise asyncio.TimeoutError
+        return json.loads(message['data'])
+
+    async def close(self):
+        await self.pubsub.aclose()
+
+
+class RedisBroker:
+    def __init__(self):
+        import redis
+        import redis.asyncio
+
+        self._client = redis.Redis.from_url(settings.LIST_EVENTS_REDIS_URL)
+        self._async_client = redis.asyncio.Redis.from_url(settings.LIST_EVENTS_REDIS_URL)
+
+    @staticmethod
+    def _channel(list_id):
+        return f'lists:list:{list_id}:events'
+
+    def subscribe(self, list_id):
+        return RedisSubscription(self._async_client, self._channel(list_id))
+
+    def publish(self, list_id, events):
+        pipeline = self._client.pipeline(transaction=False)
+        for event in events:
+            pipeline.publish(self._channel(list_id), json.dumps(event))
+        pipeline.execute()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.LIST_EVENTS_BACKEND)()
+        return _broker
+
+
+def publish_items(list_id, items):
+    """Publish ``items`` to the list's subscribers once the current transaction commits."""
+    events = [{'id': item.id, 'text': item.text} for item in items]
+    if events:
+        transaction.on_commit(lambda: get_broker().publish(list_id, events), using=current_db(), robust=True)
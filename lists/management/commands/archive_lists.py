@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lists.archive import archive_list, idle_cutoff, idle_lists, reclaim_space
+from lists.sharding import shard_databases
+
+
+class Command(BaseCommand):
+    help = ('Compress lists nobody has written to for a while into one archive row each, '
+            'then reclaim the freed space with incremental VACUUM.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-days', type=int, default=settings.LIST_ARCHIVE_IDLE_DAYS)
+        parser.add_argument('--limit', type=int, help='archive at most this many lists per shard')
+        parser.add_argument('--dry-run', action='store_true', help='count the idle lists without archiving them')
+        parser.add_argument('--no-vacuum', action='store_true', help='skip the VACUUM step')
+        parser.add_argument(
+            '--convert-auto-vacuum', action='store_true',
+            help='switch databases without incremental auto-vacuum over with one full VACUUM '
+                 '(locks the database and needs as much free disk as its file)',
+        )
+
+    def handle(self, *args, **options):
+        idle_before = idle_cutoff(options['idle_days'])
+        for alias in shard_databases():
+            list_ids = idle_lists(alias, idle_before)
+            if options['limit']:
+                list_ids = list_ids[:options['limit']]
+            if options['dry_run']:
+                self.stdout.write(f'{alias}: {list_ids.count()} lists idle for {options["idle_days"]} days')
+                continue
+
+            archived, items, raw, compressed = 0, 0, 0, 0
+            # Each list is archived in its own short transaction.
+            for list_id in list(list_ids):
+                result = archive_list(list_id, idle_before)
+                if result is not None:
+                    archived += 1
+                    items, raw, compressed = items + result[0], raw + result[1], compressed + result[2]
+            self.stdout.write(
+                f'{alias}: archived {archived} lists ({items} items, {raw / 1024:.1f} KiB '
+                f'compressed to {compressed / 1024:.1f} KiB)'
+            )
+            if not options['no_vacuum']:
+                reclaimed = reclaim_space(alias, convert=options['convert_auto_vacuum'])
+                if reclaimed is None:
+                    self.stdout.write(self.style.WARNING(
+                        f'{alias}: incremental auto-vacuum is off, nothing reclaimed; '
+                        'rerun with --convert-auto-vacuum during a quiet period to turn it on'
+                    ))
+                else:
+                    self.stdout.write(f'{alias}: reclaimed {reclaimed / 1024:.1f} KiB')
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,67 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lists.backfill import BACKFILLS, run_backfill
+from lists.models import BackfillCheckpoint
+from lists.sharding import shard_databases, using_db
+
+
+class Command(BaseCommand):
+    help = 'Run a registered backfill in short, checkpointed batches; rerun it to resume after a crash.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', nargs='?', help='backfill to run; omit to list them with their progress')
+        parser.add_argument('--batch-size', type=int, default=settings.LIST_BACKFILL_BATCH_SIZE)
+        parser.add_argument('--pause-ms', type=int, default=settings.LIST_BACKFILL_PAUSE_MS,
+                            help='sleep between batches so requests can take the write lock')
+        parser.add_argument('--restart', action='store_true', help='start again from the first row')
+
+    def handle(self, *args, **options):
+        if not options['name']:
+            self._list_backfills()
+            return
+        if options['name'] not in BACKFILLS:
+            raise CommandError(f'Unknown backfill {options["name"]!r}; choose from {", ".join(BACKFILLS)}.')
+
+        # Every shard keeps its own checkpoint next to the rows it covers.
+        processed = 0
+        for alias in shard_databases():
+            with using_db(alias):
+                processed += self._run(alias, options)
+        self.stdout.write(self.style.SUCCESS(f'Backfill {options["name"]} completed: {processed} rows.'))
+
+    def _list_backfills(self):
+        checkpoints = {}
+        for alias in shard_databases():
+            for checkpoint in BackfillCheckpoint.objects.using(alias).filter(name__in=BACKFILLS):
+                checkpoints.setdefault(checkpoint.name, []).append(checkpoint)
+        for name, backfill in BACKFILLS.items():
+            shards = checkpoints.get(name)
+            if shards is None:
+                state = 'not run'
+            else:
+                completed = len(shards) == len(shard_databases()) and all(c.completed_at for c in shards)
+                state = f'{"completed" if completed else "stopped"} after {sum(c.processed for c in shards)} rows'
+            self.stdout.write(f'{name:<24}{state:<36}{backfill.__doc__ or ""}')
+
+    def _run(self, alias, options):
+        queryset, process = BACKFILLS[options['name']]()
+        resumed = 0 if options['restart'] else (
+            BackfillCheckpoint.objects.using(alias).filter(name=options['name'])
+            .values_list('processed', flat=True).first() or 0
+        )
+        start = time.monotonic()
+
+        def progress(checkpoint):
+            rate = (checkpoint.processed - resumed) / max(time.monotonic() - start, 1e-6)
+            self.stdout.write(f'Processed {checkpoint.processed} rows on {alias} '
+                              f'(up to pk {checkpoint.last_pk}, {rate:.0f} rows/s)')
+
+        checkpoint = run_backfill(
+            options['name'], queryset.using(alias), process, batch_size=options['batch_size'],
+            pause=options['pause_ms'] / 1000, restart=options['restart'], atomic=BACKFILLS[options['name']].atomic,
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        return checkpoint.processed
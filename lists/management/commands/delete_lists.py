@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lists.deletion import purge_list, tombstone_list, tombstoned_lists
+from lists.sharding import shard_databases
+
+
+class Command(BaseCommand):
+    help = ('Delete lists in short transactions of at most --chunk-size items; with no ids, finish deleting '
+            'the lists that are already tombstoned.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('list_ids', nargs='*', type=int)
+        parser.add_argument('--chunk-size', type=int, default=settings.LIST_DELETE_CHUNK_SIZE)
+        parser.add_argument('--pause-ms', type=int, default=settings.LIST_DELETE_PAUSE_MS,
+                            help='sleep between chunks so requests can take the write lock')
+
+    def handle(self, *args, **options):
+        if options['list_ids']:
+            list_ids = []
+            for list_id in options['list_ids']:
+                if tombstone_list(list_id) is None:
+                    self.stderr.write(f'List {list_id} does not exist.')
+                else:
+                    list_ids.append(list_id)
+        else:
+            list_ids = [list_id for alias in shard_databases() for list_id in tombstoned_lists(alias)]
+
+        for list_id in list_ids:
+            def progress(deleted):
+                self.stdout.write(f'Deleted {deleted} items of list {list_id}')
+
+            deleted = purge_list(
+                list_id, chunk_size=options['chunk_size'], pause=options['pause_ms'] / 1000,
+                progress=progress if options['verbosity'] > 1 else None,
+            )
+            # None when another process finished the purge first.
+            if deleted is not None:
+                self.stdout.write(f'Deleted list {list_id} and {deleted} items.')
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,14 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from lists.sharding import shard_databases
+
+
+class Command(BaseCommand):
+    help = 'Apply migrations to every shard database (the lists app only outside default).'
+
+    def handle(self, *args, **options):
+        for alias in shard_databases():
+            self.stdout.write(f'Migrating {alias}...')
+            call_command('migrate', database=alias, interactive=False, verbosity=options['verbosity'],
+                         stdout=self.stdout)
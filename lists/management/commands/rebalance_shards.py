@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lists.sharding import db_for_slot, lists_in_slot, move_slot, save_slot_map, shard_databases, slot_map
+
+
+class Command(BaseCommand):
+    help = 'Move list slots between shard databases so every shard holds an even share of them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slot', type=int, help='move only this slot (with --to)')
+        parser.add_argument('--to', help='database to move --slot to')
+        parser.add_argument('--pin', action='store_true',
+                            help='record where every slot lives now without moving anything; '
+                                 'run before changing DJANGO_LIST_SHARDS')
+        parser.add_argument('--dry-run', action='store_true', help='show the moves without making them')
+        parser.add_argument('--batch-size', type=int, default=settings.LIST_BULK_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        databases = shard_databases()
+        slots = sorted(set(range(settings.LIST_SHARD_SLOTS)) | set(slot_map()))
+        if options['pin']:
+            save_slot_map({slot: db_for_slot(slot) for slot in slots})
+            self.stdout.write(self.style.SUCCESS(f'Pinned {len(slots)} slots to their current databases.'))
+            return
+
+        if options['slot'] is not None:
+            if options['to'] not in databases:
+                raise CommandError(f'--to must be one of {", ".join(databases)}.')
+            plan = [(options['slot'], options['to'])]
+        else:
+            plan = [(slot, databases[slot % len(databases)]) for slot in slots]
+        plan = [(slot, target) for slot, target in plan if db_for_slot(slot) != target]
+
+        self._report('Before', slots)
+        for slot, target in plan:
+            source = db_for_slot(slot)
+            if options['dry_run']:
+                count = lists_in_slot(slot, source).count()
+                self.stdout.write(f'Would move slot {slot} ({count} lists) from {source} to {target}')
+                continue
+            moved = move_slot(slot, target, options['batch_size'])
+            self.stdout.write(f'Moved slot {slot} ({moved} lists) from {source} to {target}')
+        if not options['dry_run']:
+            self._report('After', slots)
+        self.stdout.write(self.style.SUCCESS(f'{len(plan)} slots to move.' if options['dry_run']
+                                             else f'Moved {len(plan)} slots.'))
+
+    def _report(self, label, slots):
+        counts = {alias: 0 for alias in shard_databases()}
+        for slot in slots:
+            alias = db_for_slot(slot)
+            counts[alias] = counts.get(alias, 0) + lists_in_slot(slot, alias).count()
+        self.stdout.write(f'{label}: ' + ', '.join(f'{alias} {count} lists' for alias, count in counts.items()))
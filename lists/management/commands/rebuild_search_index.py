@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from lists.search import rebuild_index
+from lists.sharding import shard_databases
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the FTS5 item search index from lists_item in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        def progress(indexed, last_id):
+            self.stdout.write(f'Indexed {indexed} items (up to id {last_id})')
+
+        indexed = sum(
+            rebuild_index(options['batch_size'], progress if options['verbosity'] > 1 else None, using=alias)
+            for alias in shard_databases()
+        )
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt: {indexed} items.'))
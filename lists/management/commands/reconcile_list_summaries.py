@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from lists.models import List
+from lists.sharding import shard_databases, using_db
+
+
+class Command(BaseCommand):
+    help = 'Recompute List.item_count and the item previews from lists_item and fix any drift (archived lists are skipped).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='report drift without fixing it')
+
+    def handle(self, *args, **options):
+        fields = ['item_count', 'first_item_text', 'last_item_text']
+        expected = {f'expected_{name}': expression for name, expression in List.summary_expressions().items()}
+        checked, fixed = 0, 0
+        for alias in shard_databases():
+            last_id = 0
+            while True:
+                with using_db(alias), transaction.atomic(using=alias):
+                    batch = list(
+                        List.objects.filter(id__gt=last_id, archived_at__isnull=True).order_by('id')
+                        .only('id', *fields).annotate(**expected)[:options['batch_size']]
+                    )
+                    if not batch:
+                        break
+                    drifted = []
+                    for list_ in batch:
+                        if any(getattr(list_, name) != getattr(list_, f'expected_{name}') for name in fields):
+                            for name in fields:
+                                setattr(list_, name, getattr(list_, f'expected_{name}'))
+                            drifted.append(list_)
+                    if drifted and not options['dry_run']:
+                        List.objects.bulk_update(drifted, fields)
+                last_id = batch[-1].id
+                checked += len(batch)
+                fixed += len(drifted)
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} lists. {verb} {fixed} with drifted summaries.'))
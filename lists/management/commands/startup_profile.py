@@ -0,0 +1,48 @@
+import json
+import os
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from lists.startup import profile_startup
+
+
+class Command(BaseCommand):
+    help = 'Start a fresh worker process and break down the time to its first response.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settings-module', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'notes.settings'),
+                            help='settings the worker is started with')
+        parser.add_argument('--path', default='/', help='URL of the first request')
+        parser.add_argument('--limit', type=int, default=20, help='how many modules and packages to list')
+        parser.add_argument('--json', action='store_true', help='print the raw profile as JSON')
+
+    def handle(self, *args, **options):
+        profile = profile_startup(options['settings_module'], options['path'], importtime=True)
+        if options['json']:
+            self.stdout.write(json.dumps(profile, indent=2))
+            return
+
+        limit = options['limit']
+        imports = profile['imports']
+        packages = defaultdict(int)
+        for name, self_us, _, _ in imports:
+            packages[name.split('.')[0]] += self_us
+
+        self.stdout.write(f'Worker start-up with {options["settings_module"]} ({len(imports)} modules imported)\n')
+        self.stdout.write(f'  {"import notes.wsgi + setup":<40}{profile["wsgi_import_ms"]:>10.1f} ms')
+        self.stdout.write(f'  {"first response " + options["path"]:<40}{profile["first_response_ms"]:>10.1f} ms'
+                          f'  ({profile["status"]})')
+        self.stdout.write(f'  {"process, including interpreter":<40}{profile["process_ms"]:>10.1f} ms')
+
+        self.stdout.write('\nApps (models import / ready)')
+        for label, timings in profile['apps'].items():
+            self.stdout.write(f'  {label:<40}{timings.get("models_ms", 0):>10.1f} ms{timings.get("ready_ms", 0):>10.1f} ms')
+
+        self.stdout.write('\nImport time by top-level package (self time)')
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:limit]:
+            self.stdout.write(f'  {package:<40}{self_us / 1000:>10.1f} ms')
+
+        self.stdout.write('\nSlowest modules (self / cumulative)')
+        for name, self_us, cumulative_us, _ in sorted(imports, key=lambda item: -item[1])[:limit]:
+            self.stdout.write(f'  {name:<56}{self_us / 1000:>8.1f} ms{cumulative_us / 1000:>10.1f} ms')
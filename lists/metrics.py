@@ -0,0 +1,124 @@
+"""
+Per-request performance counters and rolling per-view latency histograms.
+
+``RequestMetricsMiddleware`` (lists/middleware.py) opens a
+``RequestMetrics`` for every request; the ``record_query`` execute wrapper
+and the timed template backend add to whichever one is current.
+"""
+
+import contextvars
+import statistics
+import threading
+import time
+from collections import deque
+
+_current = contextvars.ContextVar('lists_request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self, keep_sql=False):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.keep_sql = keep_sql
+        self.sql = []
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if self.keep_sql:
+            self.sql.append((sql, duration))
+
+    def record_template(self, duration):
+        self.template_time += duration
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def current_metrics():
+    return _current.get()
+
+
+def start_request(keep_sql=False):
+    metrics = RequestMetrics(keep_sql)
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every database connection (see lists/db.py).
+
+    Connections are per thread, but the ORM calls of an async view run in
+    a ``sync_to_async`` worker thread; the current metrics travel there in
+    a context variable, so one wrapper per connection covers both cases.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - start)
+
+
+def percentile(samples, pct):
+    """Return the ``pct``-th percentile of already sorted ``samples``."""
+    if not samples:
+        return 0.0
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+class RollingHistogram:
+    """Latency samples (in ms) for the most recent ``window`` requests."""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.total = 0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.total += 1
+
+    def summary(self):
+        samples = sorted(self.samples)
+        return {
+            'count': self.total,
+            'window': len(samples),
+            'p50_ms': percentile(samples, 50),
+            'p95_ms': percentile(samples, 95),
+            'p99_ms': percentile(samples, 99),
+            'max_ms': samples[-1] if samples else 0.0,
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(url_name, total_ms, window):
+    with _histograms_lock:
+        histogram = _histograms.get(url_name)
+        if histogram is None:
+            histogram = _histograms[url_name] = RollingHistogram(window)
+        histogram.add(total_ms)
+
+
+def snapshot():
+    """Return ``{url_name: summary}`` for every view seen by this process."""
+    with _histograms_lock:
+        return {name: histogram.summary() for name, histogram in _histograms.items()}
+
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
@@ -0,0 +1,83 @@
+import json
+import logging
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from lists import metrics
+
+logger = logging.getLogger('lists.requests')
+
+
+class RequestMetricsMiddleware:
+    """
+    Count SQL queries and time the database, template rendering and the
+    whole request. Results go out as a ``Server-Timing`` header and a JSON
+    log line, and feed the per-URL-name histograms in ``lists.metrics``.
+    Requests slower than ``REQUEST_METRICS_SLOW_MS`` are sampled at
+    ``REQUEST_METRICS_SLOW_SAMPLE_RATE`` and logged with their queries.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _start(self):
+        keep_sql = random.random() < settings.REQUEST_METRICS_SLOW_SAMPLE_RATE
+        return metrics.start_request(keep_sql)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request_metrics, token = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._finish(request, response, request_metrics)
+
+    async def __acall__(self, request):
+        request_metrics, token = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._finish(request, response, request_metrics)
+
+    def _finish(self, request, response, request_metrics):
+        total_ms = request_metrics.elapsed * 1000
+        db_ms = request_metrics.db_time * 1000
+        template_ms = request_metrics.template_time * 1000
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.2f};desc="{request_metrics.queries} queries", '
+            f'tpl;dur={template_ms:.2f}, total;dur={total_ms:.2f}'
+        )
+
+        match = request.resolver_match
+        url_name = match.url_name if match and match.url_name else 'unresolved'
+        metrics.observe(url_name, total_ms, settings.REQUEST_METRICS_WINDOW)
+
+        record = {
+            'url_name': url_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': request_metrics.queries,
+            'db_ms': round(db_ms, 2),
+            'template_ms': round(template_ms, 2),
+            'total_ms': round(total_ms, 2),
+        }
+        if total_ms >= settings.REQUEST_METRICS_SLOW_MS and request_metrics.keep_sql:
+            record['sql'] = [
+                {'sql': sql, 'ms': round(duration * 1000, 2)} for sql, duration in request_metrics.sql
+            ]
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+        return response
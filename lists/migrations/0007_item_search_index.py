@@ -0,0 +1,52 @@
+from django.db import migrations
+
+# External-content FTS5 index over lists_item.text. The triggers keep it in
+# step with every write to lists_item, including cascade deletes from
+# lists_list. Migrations that make Django rebuild lists_item (SQLite's
+# "remake table" path) drop these triggers and must create them again.
+CREATE_TRIGGERS = [
+    """
+    CREATE TRIGGER lists_item_fts_ai AFTER INSERT ON lists_item BEGIN
+        INSERT INTO lists_item_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER lists_item_fts_ad AFTER DELETE ON lists_item BEGIN
+        INSERT INTO lists_item_fts(lists_item_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER lists_item_fts_au AFTER UPDATE OF text ON lists_item BEGIN
+        INSERT INTO lists_item_fts(lists_item_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO lists_item_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+CREATE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE lists_item_fts USING fts5(
+        text, content='lists_item', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    *CREATE_TRIGGERS,
+    "INSERT INTO lists_item_fts(lists_item_fts) VALUES ('rebuild')",
+]
+
+DROP_INDEX = [
+    'DROP TRIGGER IF EXISTS lists_item_fts_au',
+    'DROP TRIGGER IF EXISTS lists_item_fts_ad',
+    'DROP TRIGGER IF EXISTS lists_item_fts_ai',
+    'DROP TABLE IF EXISTS lists_item_fts',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lists', '0006_list_revision'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_INDEX, DROP_INDEX),
+    ]
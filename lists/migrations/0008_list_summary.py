@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:07
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+
+
+def backfill_summaries(apps, schema_editor):
+    List = apps.get_model('lists', 'List')
+    Item = apps.get_model('lists', 'Item')
+    items = Item.objects.filter(list=OuterRef('pk'))
+    List.objects.update(
+        item_count=Coalesce(Subquery(items.order_by().values('list').annotate(n=Count('id')).values('n')), 0),
+        first_item_text=Coalesce(Subquery(items.order_by('id').values(p=Substr('text', 1, 200))[:1]), Value('')),
+        last_item_text=Coalesce(Subquery(items.order_by('-id').values(p=Substr('text', 1, 200))[:1]), Value('')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lists', '0007_item_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='list',
+            name='first_item_text',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='list',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='list',
+            name='last_item_text',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:18
+
+import importlib
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import Q
+
+# Adding the column makes SQLite rebuild lists_item, which drops the FTS
+# triggers from 0007; they are created again once the table is final.
+search_index = importlib.import_module('lists.migrations.0007_item_search_index')
+
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+
+def next_key(key):
+    """The key after ``key`` (``None`` for the first one), frozen from lists.positions.key_between(key, None)."""
+    if key is None:
+        return 'a0'
+    head, digits = key[0], list(key[1:])
+    for i in reversed(range(len(digits))):
+        value = DIGITS.index(digits[i]) + 1
+        if value < len(DIGITS):
+            digits[i] = DIGITS[value]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[0]
+    # Every digit carried over: one more digit, with the next length head.
+    return chr(ord(head) + 1) + ''.join(digits) + DIGITS[0]
+
+
+def backfill_positions(apps, schema_editor):
+    # Existing items keep their id order. Each batch commits on its own, so
+    # the writer lock is never held for the whole table.
+    Item = apps.get_model('lists', 'Item')
+    alias = schema_editor.connection.alias
+    items = Item.objects.using(alias).order_by('list_id', 'id').only('id', 'list_id')
+    list_id, key, last = None, None, None
+    while True:
+        with transaction.atomic(using=alias):
+            after = items if last is None else items.filter(
+                Q(list_id__gt=last.list_id) | Q(list_id=last.list_id, id__gt=last.id),
+            )
+            batch = list(after[:settings.LIST_BACKFILL_BATCH_SIZE])
+            if not batch:
+                return
+            for item in batch:
+                if item.list_id != list_id:
+                    list_id, key = item.list_id, None
+                key = next_key(key)
+                item.position = key
+            Item.objects.using(alias).bulk_update(batch, ['position'])
+        last = batch[-1]
+
+
+class Migration(migrations.Migration):
+    # The backfill commits batch by batch.
+    atomic = False
+
+    dependencies = [
+        ('lists', '0008_list_summary'),
+    ]
+
+    operations = [
+        # Unapplying rebuilds the table too; put the triggers back afterwards.
+        migrations.RunSQL(migrations.RunSQL.noop, search_index.CREATE_TRIGGERS),
+        migrations.AddField(
+            model_name='item',
+            name='position',
+            field=models.CharField(default='', max_length=255),
+        ),
+        migrations.RunPython(backfill_positions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='item',
+            constraint=models.UniqueConstraint(fields=('list', 'position'), name='lists_item_list_position_uniq'),
+        ),
+        migrations.RunSQL(search_index.CREATE_TRIGGERS, search_index.DROP_INDEX[:3]),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+# Lists so far were numbered by AUTOINCREMENT, all in slot 0. Carry on from
+# the highest id it ever handed out so deleted lists' ids are not reused.
+SEED_SLOT_ZERO = """
+INSERT INTO lists_listidsequence (slot, last_id)
+SELECT 0, seq FROM sqlite_sequence WHERE name = 'lists_list'
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lists', '0010_backfill_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListIdSequence',
+            fields=[
+                ('slot', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('last_id', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunSQL(SEED_SLOT_ZERO, migrations.RunSQL.noop),
+    ]
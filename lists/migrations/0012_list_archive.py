@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lists', '0011_list_id_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListArchive',
+            fields=[
+                ('list', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive', serialize=False, to='lists.list')),
+                ('codec', models.CharField(max_length=8)),
+                ('data', models.BinaryField()),
+                ('item_count', models.PositiveIntegerField()),
+                ('last_item_id', models.BigIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='list',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+import json
+import zlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copies of the lists.archive helpers this migration was written against.
+def _compress(payload):
+    return 'zlib', zlib.compress(payload, 9)
+
+
+def _decompress(codec, data):
+    if codec != 'zlib':
+        raise ValueError(f'unknown archive codec {codec!r}')
+    return zlib.decompress(bytes(data))
+
+
+def _pack(rows):
+    return json.dumps(rows, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def split_archives(apps, schema_editor):
+    # Every existing one-row archive becomes chunks of LIST_ARCHIVE_CHUNK_SIZE items.
+    ListArchive = apps.get_model('lists', 'ListArchive')
+    ListArchiveChunk = apps.get_model('lists', 'ListArchiveChunk')
+    size = settings.LIST_ARCHIVE_CHUNK_SIZE
+    for archive in ListArchive.objects.using(schema_editor.connection.alias).iterator(chunk_size=1):
+        rows = json.loads(_decompress(archive.codec, archive.data))
+        for start in range(0, len(rows), size):
+            chunk = rows[start:start + size]
+            codec, data = _compress(_pack(chunk))
+            ListArchiveChunk.objects.using(schema_editor.connection.alias).create(
+                list_id=archive.list_id, last_position=chunk[-1][2], codec=codec, data=data, item_count=len(chunk),
+            )
+
+
+def join_archives(apps, schema_editor):
+    ListArchive = apps.get_model('lists', 'ListArchive')
+    ListArchiveChunk = apps.get_model('lists', 'ListArchiveChunk')
+    for archive in ListArchive.objects.using(schema_editor.connection.alias).iterator(chunk_size=1):
+        rows = []
+        chunks = ListArchiveChunk.objects.using(schema_editor.connection.alias).filter(list_id=archive.list_id)
+        for chunk in chunks.order_by('last_position'):
+            rows += json.loads(_decompress(chunk.codec, chunk.data))
+        archive.codec, archive.data = _compress(_pack(rows))
+        archive.save(update_fields=['codec', 'data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lists', '0013_list_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListArchiveChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_position', models.CharField(max_length=255)),
+                ('codec', models.CharField(max_length=8)),
+                ('data', models.BinaryField()),
+                ('item_count', models.PositiveIntegerField()),
+                ('list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_chunks', to='lists.list')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('list', 'last_position'), name='lists_archivechunk_list_position_uniq')],
+            },
+        ),
+        migrations.RunPython(split_archives, join_archives),
+        # Defaults let unapplying add the columns back to existing rows.
+        migrations.AlterField(
+            model_name='listarchive',
+            name='codec',
+            field=models.CharField(default='zlib', max_length=8),
+        ),
+        migrations.AlterField(
+            model_name='listarchive',
+            name='data',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RemoveField(
+            model_name='listarchive',
+            name='codec',
+        ),
+        migrations.RemoveField(
+            model_name='listarchive',
+            name='data',
+        ),
+    ]
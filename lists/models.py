@@ -1,8 +1,168 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Substr
+from django.utils import timezone
+
+from lists.positions import key_between
+from lists.sharding import allocate_list_id, db_for_list
+
+PREVIEW_LENGTH = 200
+
+
+def preview(text):
+    return text[:PREVIEW_LENGTH]
+
+
+class ListManager(models.Manager):
+    """Leaves out lists that are deleted but still have items being purged, see lists.deletion."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 
 class List(models.Model):
-    pass
+    # Bumped by every write so readers can validate cached copies cheaply.
+    revision = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    # Denormalized summary so overviews never have to touch lists_item.
+    item_count = models.PositiveIntegerField(default=0)
+    first_item_text = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default='')
+    last_item_text = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default='')
+    # Set while the items are compressed into a ListArchive row, see lists.archive.
+    archived_at = models.DateTimeField(null=True, blank=True)
+    # Tombstone set when the list is deleted; its items are purged in chunks afterwards.
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ListManager()
+    # Includes tombstoned lists, for the purge and for moving slots between shards.
+    all_objects = models.Manager()
+
+    @classmethod
+    def touch(cls, list_id, added=()):
+        """Record a write to the list, optionally appending the ``added`` item texts."""
+        updates = {'revision': F('revision') + 1, 'updated_at': timezone.now()}
+        if added:
+            updates['item_count'] = F('item_count') + len(added)
+            updates['first_item_text'] = Case(
+                When(item_count=0, then=Value(preview(added[0]))),
+                default=F('first_item_text'),
+            )
+            updates['last_item_text'] = Value(preview(added[-1]))
+        cls.objects.filter(id=list_id).update(**updates)
+
+    @classmethod
+    def summary_expressions(cls, count=True):
+        """Expressions that recompute the summary columns from lists_item.
+
+        Counting scans all of the list's items; pass ``count=False`` when only
+        the order changed and the first/last item lookups are enough.
+        """
+        items = Item.objects.filter(list=OuterRef('pk'))
+        expressions = {
+            'first_item_text': Coalesce(
+                Subquery(items.order_by('position').values(p=Substr('text', 1, PREVIEW_LENGTH))[:1]), Value(''),
+            ),
+            'last_item_text': Coalesce(
+                Subquery(items.order_by('-position').values(p=Substr('text', 1, PREVIEW_LENGTH))[:1]), Value(''),
+            ),
+        }
+        if count:
+            expressions['item_count'] = Coalesce(
+                Subquery(items.order_by().values('list').annotate(n=Count('id')).values('n')), 0,
+            )
+        return expressions
+
+    @classmethod
+    def refresh_summary(cls, list_id, count=True, removed=0):
+        """Recompute the summary of one list after items were removed or moved.
+
+        Pass the number of ``removed`` items to subtract it from the stored
+        count instead of counting the list's items again.
+        """
+        expressions = cls.summary_expressions(count=count and not removed)
+        if removed:
+            expressions['item_count'] = F('item_count') - removed
+        cls.objects.filter(id=list_id).update(revision=F('revision') + 1, updated_at=timezone.now(), **expressions)
+
+    def etag(self, variant):
+        """Weak validator for one representation (``variant``) of the list in this release."""
+        return f'W/"{self.id}-{self.revision}-{settings.RELEASE}-{variant}"'
+
+    def save(self, *args, **kwargs):
+        if self.id is None:
+            self.id = allocate_list_id()
+        # A list always lives on the shard its id names, see lists.sharding.
+        kwargs['using'] = db_for_list(self.id)
+        super().save(*args, **kwargs)
 
 class Item(models.Model):
     text = models.TextField(default='')
-    list = models.ForeignKey(List, on_delete=models.CASCADE, default=None)
\ No newline at end of file
+    list = models.ForeignKey(List, on_delete=models.CASCADE, default=None)
+    # Fractional order key within the list, see lists.positions.
+    position = models.CharField(max_length=255, default='')
+
+    class Meta:
+        indexes = [
+            # The event stream catches up on new items in id order.
+            models.Index(fields=['list', 'id'], name='lists_item_list_id_id_idx'),
+        ]
+        constraints = [
+            # Also the index that pages and reorders walk.
+            models.UniqueConstraint(fields=['list', 'position'], name='lists_item_list_position_uniq'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.list_id is not None:
+            kwargs['using'] = db_for_list(self.list_id)
+        if not self.position:
+            last = (
+                Item.objects.using(kwargs.get('using')).filter(list_id=self.list_id).order_by('-position')
+                .values_list('position', flat=True).first()
+            )
+            self.position = key_between(last, None)
+        super().save(*args, **kwargs)
+
+
+class ListArchive(models.Model):
+    """A cold list whose items are compressed into ``ListArchiveChunk`` rows, see lists.archive."""
+    list = models.OneToOneField(List, on_delete=models.CASCADE, primary_key=True, related_name='archive')
+    item_count = models.PositiveIntegerField()
+    # Newest item id, where the event stream resumes.
+    last_item_id = models.BigIntegerField(default=0)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+
+class ListArchiveChunk(models.Model):
+    """Consecutive items of an archived list, compressed into one row."""
+    list = models.ForeignKey(List, on_delete=models.CASCADE, related_name='archive_chunks')
+    # Position of the chunk's last item; a page starts at the first chunk past ``after``.
+    last_position = models.CharField(max_length=255)
+    codec = models.CharField(max_length=8)
+    data = models.BinaryField()
+    item_count = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['list', 'last_position'], name='lists_archivechunk_list_position_uniq'),
+        ]
+
+
+class ListIdSequence(models.Model):
+    """Last list id handed out in each slot this database holds, see lists.sharding."""
+    slot = models.PositiveIntegerField(primary_key=True)
+    last_id = models.BigIntegerField()
+
+
+class BackfillCheckpoint(models.Model):
+    """How far a named backfill has got, see lists.backfill."""
+    name = models.CharField(max_length=100, unique=True)
+    # Primary key of the last row processed; the next batch starts after it.
+    last_pk = models.BigIntegerField(default=0)
+    processed = models.PositiveBigIntegerField(default=0)
+    started_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.processed} rows, up to pk {self.last_pk})'
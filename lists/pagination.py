@@ -0,0 +1,55 @@
+"""
+Keyset pagination over a list's items.
+
+Items are ordered by their position key (see ``lists.positions``). Pages
+are addressed by the position of the last item already seen (``after``)
+rather than an OFFSET, so fetching any page is a bounded range scan on the
+``(list_id, position)`` index no matter how deep into the list it is.
+Archived lists are paged from their compressed archive chunks instead,
+starting at the chunk that holds ``after``.
+"""
+
+from asgiref.sync import sync_to_async
+
+from lists.archive import archived_items
+from lists.models import Item
+from lists.positions import is_valid_key
+
+
+def int_param(params, name, default=0):
+    try:
+        return max(int(params.get(name, default)), 0)
+    except ValueError:
+        return default
+
+
+def position_param(params, name):
+    value = params.get(name, '')
+    return value if is_valid_key(value) else ''
+
+
+def _page_queryset(list_id, after, limit):
+    items = Item.objects.filter(list_id=list_id)
+    if after:
+        items = items.filter(position__gt=after)
+    # Fetch one extra row to learn whether a next page exists without a COUNT.
+    return items.order_by('position').values('id', 'text', 'position')[:limit + 1]
+
+
+def _split_page(items, limit):
+    has_next = len(items) > limit
+    items = items[:limit]
+    return items, items[-1]['position'] if has_next else None
+
+
+def item_page(list_id, after, limit, archived=False):
+    """Return ``(items, next_after)`` for up to ``limit`` items after position ``after``."""
+    if archived:
+        return _split_page(archived_items(list_id, after, limit + 1), limit)
+    return _split_page(list(_page_queryset(list_id, after, limit)), limit)
+
+
+async def aitem_page(list_id, after, limit, archived=False):
+    if archived:
+        return _split_page(await sync_to_async(archived_items)(list_id, after, limit + 1), limit)
+    return _split_page([item async for item in _page_queryset(list_id, after, limit)], limit)
@@ -0,0 +1,218 @@
+"""
+Fractional position keys for ordering a list's items.
+
+An item's place in its list is a string ``Item.position``; items sort by it
+with plain byte comparison (SQLite's BINARY collation). There is always a
+key strictly between any two others, so moving an item rewrites only that
+item's row.
+
+A key is an integer part followed by an optional fraction, both in
+ASCII-ordered base-62 digits. The integer part's first character encodes
+its length (``a`` has one digit, ``b`` two and so on; ``A``-``Z`` are
+the negative integers), so appending just increments the integer and keys
+stay short. Only keys generated between two close neighbours grow a
+fraction; when one gets longer than ``LIST_POSITION_REBALANCE_LENGTH``
+the list's keys are rewritten evenly in the background, a chunk of
+``LIST_POSITION_REBALANCE_CHUNK_SIZE`` items per transaction.
+
+The algorithm follows David Greenspan's "Implementing Fractional Indexing".
+"""
+
+from django.conf import settings
+from django.db.models import Value
+from django.db.models.functions import Concat
+
+from lists.background import ListTask
+from lists.sharding import list_atomic, using_list
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+INTEGER_ZERO = 'a0'
+SMALLEST_INTEGER = 'A' + DIGITS[0] * 26
+
+
+def _midpoint(a, b):
+    """Return a fraction strictly between fractions ``a`` and ``b`` (``None`` is the end)."""
+    if b is not None:
+        # Keep the common prefix and find the midpoint of what follows it.
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else DIGITS[0]) == b[n]:
+            n += 1
+        if n:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def _integer_length(head):
+    if 'a' <= head <= 'z':
+        return ord(head) - ord('a') + 2
+    if 'A' <= head <= 'Z':
+        return ord('Z') - ord(head) + 2
+    raise ValueError(f'invalid position key head {head!r}')
+
+
+def _split(key):
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f'invalid position key {key!r}')
+    return key[:length], key[length:]
+
+
+def _increment_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        value = DIGITS.index(digits[i]) + 1
+        if value < len(DIGITS):
+            digits[i] = DIGITS[value]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[0]
+    # Every digit carried over: move to the next integer length.
+    if head == 'Z':
+        return INTEGER_ZERO
+    if head == 'z':
+        return None
+    head = chr(ord(head) + 1)
+    if head > 'a':
+        digits.append(DIGITS[0])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def _decrement_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        value = DIGITS.index(digits[i]) - 1
+        if value >= 0:
+            digits[i] = DIGITS[value]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[-1]
+    if head == 'a':
+        return 'Z' + DIGITS[-1]
+    if head == 'A':
+        return None
+    head = chr(ord(head) - 1)
+    if head < 'Z':
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def is_valid_key(key):
+    if not isinstance(key, str) or not key or key == SMALLEST_INTEGER:
+        return False
+    if any(char not in DIGITS for char in key):
+        return False
+    try:
+        _, fraction = _split(key)
+    except ValueError:
+        return False
+    return not fraction.endswith(DIGITS[0])
+
+
+def key_between(a, b):
+    """Return a key that sorts after ``a`` and before ``b``; either may be ``None``."""
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f'{a!r} must sort before {b!r}')
+    if a is None:
+        if b is None:
+            return INTEGER_ZERO
+        integer, fraction = _split(b)
+        if integer == SMALLEST_INTEGER:
+            return integer + _midpoint('', fraction)
+        if fraction:
+            return integer
+        return _decrement_integer(integer)
+    integer, fraction = _split(a)
+    if b is None:
+        return _increment_integer(integer) or integer + _midpoint(fraction, None)
+    integer_b, fraction_b = _split(b)
+    if integer == integer_b:
+        return integer + _midpoint(fraction, fraction_b)
+    following = _increment_integer(integer)
+    if following is not None and following < b:
+        return following
+    return integer + _midpoint(fraction, None)
+
+
+def keys_after(key, count):
+    """Return ``count`` ascending keys following ``key`` (``None`` starts a fresh list)."""
+    keys = []
+    for _ in range(count):
+        key = key_between(key, None)
+        keys.append(key)
+    return keys
+
+
+def needs_rebalance(key):
+    return len(key) > settings.LIST_POSITION_REBALANCE_LENGTH
+
+
+def _integer_below(key, count):
+    """Return an integer key ``count`` integers below ``key``, or None if there is no room."""
+    integer, _ = _split(key)
+    for _ in range(count):
+        integer = _decrement_integer(integer)
+        if integer is None:
+            return None
+    return integer
+
+
+def rebalance(list_id, chunk_size=None):
+    """
+    Rewrite the list's position keys as short, evenly spaced integers,
+    ``chunk_size`` items per transaction.
+
+    The new keys are consecutive integers that all sort below the list's
+    current first key, and are handed out in position order. Between two
+    chunks every rewritten item therefore still sorts before every item
+    that keeps its old key, so readers always see the list in order. Each
+    chunk's keys are also kept below the next remaining key, so items
+    added between chunks are ordered and rewritten too.
+    """
+    from lists.models import Item, List
+
+    if chunk_size is None:
+        chunk_size = settings.LIST_POSITION_REBALANCE_CHUNK_SIZE
+    with using_list(list_id):
+        items = Item.objects.filter(list_id=list_id)
+        first = items.order_by('position').values_list('position', flat=True).first()
+        if first is None:
+            return 0
+        key = _integer_below(first, items.count())
+        rewritten = 0
+        while True:
+            with list_atomic(list_id):
+                remaining = items if key is None else items.filter(position__gt=key)
+                rows = list(remaining.order_by('position').values_list('id', 'position')[:chunk_size + 1])
+                chunk, following = rows[:chunk_size], rows[chunk_size:]
+                upper = following[0][1] if following else None
+                updates = []
+                for item_id, _ in chunk:
+                    key = key_between(key, upper)
+                    updates.append(Item(id=item_id, position=key))
+                # Park the chunk's keys out of the way first so the new keys
+                # never collide with old ones under the (list, position)
+                # unique constraint.
+                Item.objects.filter(id__in=[item_id for item_id, _ in chunk]).update(
+                    position=Concat(Value('~'), 'position'),
+                )
+                Item.objects.bulk_update(updates, ['position'], batch_size=settings.LIST_BULK_BATCH_SIZE)
+                List.touch(list_id)
+            rewritten += len(chunk)
+            if not following:
+                return rewritten
+
+
+_rebalancer = ListTask(rebalance, 'rebalance')
+
+
+def schedule_rebalance(list_id):
+    """Rebalance the list in a background thread once the current transaction commits."""
+    _rebalancer.schedule(list_id)
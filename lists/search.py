@@ -0,0 +1,159 @@
+"""
+Full-text search over item text, backed by the ``lists_item_fts`` SQLite
+FTS5 table.
+
+The FTS table is an external-content index over ``lists_item``: it stores
+only the index, and triggers created by migration 0007 keep it in step
+with every INSERT, UPDATE and DELETE on ``lists_item`` (including the
+chunked deletes that purge a deleted list, see ``lists.deletion``).
+Items of a deleted list drop out of the results as soon as it is
+tombstoned. ``rebuild_index()`` builds a fresh index in a shadow table
+and swaps it in, so searches keep working while it runs.
+
+Every shard has its own index; a search within one list asks only that
+list's shard, a search across all lists asks every shard and merges.
+"""
+
+import importlib
+
+from django.db import connections, transaction
+
+from lists.sharding import db_for_list, shard_databases
+
+search_index = importlib.import_module('lists.migrations.0007_item_search_index')
+
+FTS_TABLE = 'lists_item_fts'
+# rebuild_index() fills this table next to the live index, then swaps it in.
+SHADOW_TABLE = f'{FTS_TABLE}_new'
+SHADOW_PROGRESS_TABLE = f'{FTS_TABLE}_rebuild'
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query that ANDs every word as a literal."""
+    terms = text.split()
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def search_items(text, list_id=None, limit=20, offset=0):
+    """Return up to ``limit`` matching items, best bm25 rank first."""
+    query = fts_query(text)
+    if not query:
+        return []
+    if list_id is not None:
+        return _search_shard(db_for_list(list_id), query, list_id, limit, offset)
+    databases = shard_databases()
+    if len(databases) == 1:
+        return _search_shard(databases[0], query, None, limit, offset)
+    # Each shard's best ``offset + limit`` rows contain the merged page. Each
+    # index keeps its own term statistics, so ranks only roughly compare.
+    results = []
+    for alias in databases:
+        results += _search_shard(alias, query, None, offset + limit, 0)
+    results.sort(key=lambda result: (result['rank'], result['list'], result['id']))
+    return results[offset:offset + limit]
+
+
+def _search_shard(alias, query, list_id, limit, offset):
+    sql = f'''
+        SELECT i.id, i.list_id, i.text, bm25({FTS_TABLE}) AS rank
+        FROM {FTS_TABLE}
+        JOIN lists_item i ON i.id = {FTS_TABLE}.rowid
+        JOIN lists_list l ON l.id = i.list_id AND l.deleted_at IS NULL
+        WHERE {FTS_TABLE} MATCH %s
+    '''
+    params = [query]
+    if list_id is not None:
+        sql += ' AND i.list_id = %s'
+        params.append(list_id)
+    sql += ' ORDER BY rank, i.id LIMIT %s OFFSET %s'
+    params += [limit, offset]
+    with connections[alias].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            {'id': item_id, 'list': item_list_id, 'text': item_text, 'rank': rank}
+            for item_id, item_list_id, item_text, rank in cursor.fetchall()
+        ]
+
+
+def _shadow_triggers():
+    # Writes to rows the rebuild has already copied go to the new index too;
+    # later rows are copied with their current text when the rebuild gets there.
+    copied = f'(SELECT last_id FROM {SHADOW_PROGRESS_TABLE})'
+    return [
+        f"""
+        CREATE TRIGGER {SHADOW_TABLE}_ai AFTER INSERT ON lists_item WHEN new.id <= {copied} BEGIN
+            INSERT INTO {SHADOW_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END
+        """,
+        f"""
+        CREATE TRIGGER {SHADOW_TABLE}_ad AFTER DELETE ON lists_item WHEN old.id <= {copied} BEGIN
+            INSERT INTO {SHADOW_TABLE}({SHADOW_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+        END
+        """,
+        f"""
+        CREATE TRIGGER {SHADOW_TABLE}_au AFTER UPDATE OF text ON lists_item WHEN old.id <= {copied} BEGIN
+            INSERT INTO {SHADOW_TABLE}({SHADOW_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO {SHADOW_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END
+        """,
+    ]
+
+
+def _drop_shadow_triggers():
+    return [f'DROP TRIGGER IF EXISTS {SHADOW_TABLE}_{suffix}' for suffix in ('au', 'ad', 'ai')]
+
+
+def rebuild_index(batch_size=5000, progress=None, using='default'):
+    """
+    Re-index every item of the ``using`` shard and return the number of
+    items copied.
+
+    The new index is built in a shadow table, ``batch_size`` rows per
+    transaction, so the writer lock is only ever held for one batch and
+    searches keep using the old index meanwhile. The last transaction
+    swaps the new index in.
+    """
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        # Also clears what an interrupted rebuild left behind.
+        for statement in [
+            *_drop_shadow_triggers(),
+            f'DROP TABLE IF EXISTS {SHADOW_TABLE}',
+            f'DROP TABLE IF EXISTS {SHADOW_PROGRESS_TABLE}',
+            search_index.CREATE_INDEX[0].replace(FTS_TABLE, SHADOW_TABLE),
+            f'CREATE TABLE {SHADOW_PROGRESS_TABLE} (last_id INTEGER NOT NULL)',
+            f'INSERT INTO {SHADOW_PROGRESS_TABLE} (last_id) VALUES (0)',
+            *_shadow_triggers(),
+        ]:
+            cursor.execute(statement)
+
+    last_id, indexed = 0, 0
+    while True:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT id, text FROM lists_item WHERE id > %s ORDER BY id LIMIT %s',
+                [last_id, batch_size],
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                # Swap in the same transaction that found nothing left to
+                # copy, so no write can slip in between.
+                for statement in [
+                    *search_index.DROP_INDEX,
+                    *_drop_shadow_triggers(),
+                    f'DROP TABLE {SHADOW_PROGRESS_TABLE}',
+                    f'ALTER TABLE {SHADOW_TABLE} RENAME TO {FTS_TABLE}',
+                    *search_index.CREATE_TRIGGERS,
+                ]:
+                    cursor.execute(statement)
+                break
+            cursor.executemany(f'INSERT INTO {SHADOW_TABLE}(rowid, text) VALUES (%s, %s)', rows)
+            last_id = rows[-1][0]
+            cursor.execute(f'UPDATE {SHADOW_PROGRESS_TABLE} SET last_id = %s', [last_id])
+        indexed += len(rows)
+        if progress:
+            progress(indexed, last_id)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return indexed
@@ -0,0 +1,349 @@
+"""
+Horizontal sharding of lists across several SQLite databases.
+
+Each list lives with its items in one of ``LIST_SHARD_SLOTS`` slots, and
+the slot is the high bits of the list id (``list_id >> SLOT_SHIFT``). Any
+URL that carries a list id therefore already says where the list lives. By
+default slot ``n`` lives on database ``LIST_SHARD_DATABASES[n % shards]``.
+The JSON file at ``LIST_SHARD_MAP`` pins slots elsewhere, and
+``manage.py rebalance_shards`` rewrites it when it moves a slot.
+
+``ShardRouter`` sends a lists-app query to the database bound by
+``using_db()`` / ``using_list()`` or, for a model instance, to its list's
+database. Views wrapped in ``@list_shard`` bind their ``list_id``'s
+database for the whole request, including a streamed response. The write
+helpers in ``lists.writes`` bind it themselves, so they also work from
+background threads.
+
+New list ids come from a per-slot sequence (``allocate_list_id``) instead
+of the table's AUTOINCREMENT, so ids never collide across databases.
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import random
+import time
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+# 2**32 ids per slot; slots up to 2**21 keep every id below 2**53, which
+# JavaScript clients can still represent exactly.
+SLOT_SHIFT = 32
+# How often a worker looks for a new slot map written by a rebalance.
+SLOT_MAP_CHECK_SECONDS = 1.0
+
+_current_db = contextvars.ContextVar('lists_shard_db', default=None)
+
+
+def slot_of(list_id):
+    return int(list_id) >> SLOT_SHIFT
+
+
+def slot_range(slot):
+    """The ``[low, high)`` list ids of ``slot``."""
+    return slot << SLOT_SHIFT, (slot + 1) << SLOT_SHIFT
+
+
+def shard_databases():
+    return settings.LIST_SHARD_DATABASES
+
+
+_slot_map = {'path': None, 'mtime': None, 'checked': 0.0, 'slots': {}}
+
+
+def slot_map():
+    """Slots pinned to a database by ``LIST_SHARD_MAP``, re-read when the file changes."""
+    path = settings.LIST_SHARD_MAP
+    now = time.monotonic()
+    if path == _slot_map['path'] and now - _slot_map['checked'] < SLOT_MAP_CHECK_SECONDS:
+        return _slot_map['slots']
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except (FileNotFoundError, TypeError):
+        mtime = None
+    if path != _slot_map['path'] or mtime != _slot_map['mtime']:
+        slots = {}
+        if mtime is not None:
+            with open(path, encoding='utf-8') as f:
+                slots = {int(slot): alias for slot, alias in json.load(f).items()}
+        _slot_map.update(path=path, mtime=mtime, slots=slots)
+    _slot_map['checked'] = now
+    return _slot_map['slots']
+
+
+def save_slot_map(slots):
+    """Atomically replace the slot map; workers pick it up within ``SLOT_MAP_CHECK_SECONDS``."""
+    path = settings.LIST_SHARD_MAP
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({str(slot): alias for slot, alias in sorted(slots.items())}, f, indent=2)
+    os.replace(tmp, path)
+    _slot_map['path'] = None
+
+
+def db_for_slot(slot):
+    pinned = slot_map().get(slot)
+    if pinned is not None:
+        return pinned
+    databases = shard_databases()
+    return databases[slot % len(databases)]
+
+
+def db_for_list(list_id):
+    return db_for_slot(slot_of(list_id))
+
+
+def current_db():
+    """The database bound for lists-app queries, ``default`` when none is."""
+    return _current_db.get() or DEFAULT_DB_ALIAS
+
+
+@contextlib.contextmanager
+def using_db(alias):
+    token = _current_db.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_db.reset(token)
+
+
+def using_list(list_id):
+    return using_db(db_for_list(list_id))
+
+
+@contextlib.contextmanager
+def list_atomic(list_id):
+    """Bind the list's database and run the block in one transaction on it."""
+    with using_list(list_id) as alias, transaction.atomic(using=alias):
+        yield alias
+
+
+def choose_slot():
+    return random.randrange(settings.LIST_SHARD_SLOTS)
+
+
+def allocate_list_id(slot=None):
+    """Return an unused list id in ``slot`` (a random one by default)."""
+    if slot is None:
+        slot = choose_slot()
+    low, high = slot_range(slot)
+    # One statement, so concurrent allocations can never hand out the same
+    # id. A slot's first id follows any lists already in its range.
+    with connections[db_for_slot(slot)].cursor() as cursor:
+        cursor.execute(
+            '''
+            INSERT INTO lists_listidsequence (slot, last_id)
+            VALUES (%s, (SELECT COALESCE(MAX(id), %s) FROM lists_list WHERE id >= %s AND id < %s) + 1)
+            ON CONFLICT (slot) DO UPDATE SET last_id = last_id + 1
+            RETURNING last_id
+            ''',
+            [slot, low, low, high],
+        )
+        return cursor.fetchone()[0]
+
+
+def lists_in_slot(slot, using):
+    from lists.models import List
+
+    low, high = slot_range(slot)
+    return List.all_objects.using(using).filter(id__gte=low, id__lt=high)
+
+
+def _copy(model, rows, using, batch_size):
+    batch, copied = [], 0
+    for values in rows.iterator(chunk_size=batch_size):
+        batch.append(model(**values))
+        if len(batch) == batch_size:
+            model.objects.using(using).bulk_create(batch)
+            copied, batch = copied + len(batch), []
+    model.objects.using(using).bulk_create(batch)
+    return copied + len(batch)
+
+
+# deleted_at of a list copied to its new shard while the slot still lives on
+# the old one: hidden from every read there until move_slot switches over.
+_STAGED_AT = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _copy_lists(lists, target, batch_size, staged=False, progress=None):
+    """
+    Copy the ``lists`` queryset and its items to ``target``, ``batch_size``
+    lists at a time, each batch committed on its own. Return the list rows
+    as they were read, by id.
+    """
+    from lists.models import Item, List
+
+    copied, last_id = {}, None
+    while True:
+        batch = lists if last_id is None else lists.filter(id__gt=last_id)
+        rows = list(batch.order_by('id').values()[:batch_size])
+        if not rows:
+            return copied
+        # Read before the items: a write in between bumps the revision, so
+        # the catch-up in move_slot copies that list again.
+        List.objects.using(target).bulk_create([
+            List(**{**row, 'deleted_at': row['deleted_at'] or _STAGED_AT} if staged else row) for row in rows
+        ])
+        items = (
+            Item.objects.using(lists.db).filter(list_id__in=[row['id'] for row in rows])
+            .order_by('id').values('list_id', 'text', 'position')
+        )
+        _copy(Item, items, target, batch_size)
+        copied.update((row['id'], row) for row in rows)
+        last_id = rows[-1]['id']
+        if progress:
+            progress(len(copied))
+
+
+def _delete_lists(list_ids, using, batch_size):
+    from lists.models import Item, List
+
+    for start in range(0, len(list_ids), batch_size):
+        chunk = list_ids[start:start + batch_size]
+        Item.objects.using(using).filter(list_id__in=chunk).delete()
+        List.all_objects.using(using).filter(id__in=chunk).delete()
+
+
+def move_slot(slot, target, batch_size=None, progress=None):
+    """
+    Copy a slot's lists and items to the ``target`` database, point the slot
+    map at it and delete them from the old one. Return the number of lists
+    moved.
+
+    The bulk of the copy runs without the old shard's writer lock, in
+    batches of ``batch_size`` lists that each commit on ``target``
+    (``progress(lists)`` is called after each); until the switch the
+    copies are tombstoned there, so no cross-shard read sees them twice.
+    Then, holding the old shard's lock, the lists whose row changed
+    meanwhile (every write bumps the revision) are copied again, the slot
+    map is switched and the old copies are tombstoned, so writes to the
+    moved slot that were already routed there fail. The old copies are
+    purged a chunk at a time afterwards (``lists.deletion``). Moved items,
+    archived ones included, get new ids on ``target`` in the same order;
+    their lists' revisions are bumped so no cached page keeps the old ids.
+    """
+    from lists.archive import copy_archives
+    from lists.deletion import purge_list
+    from lists.models import Item, ListArchive, ListIdSequence
+
+    source = db_for_slot(slot)
+    if source == target:
+        return 0
+    batch_size = batch_size or settings.LIST_BULK_BATCH_SIZE
+    low, high = slot_range(slot)
+    lists = lists_in_slot(slot, source)
+    archives = ListArchive.objects.using(source)
+
+    # Leftovers of an interrupted move; the slot does not live there.
+    with transaction.atomic(using=target):
+        Item.objects.using(target).filter(list_id__gte=low, list_id__lt=high).delete()
+        lists_in_slot(slot, target).delete()
+    copied = _copy_lists(lists, target, batch_size, staged=True, progress=progress)
+    if copied:
+        # Lists created after the copy have higher ids and are caught up below.
+        copy_archives(archives.filter(list_id__gte=low, list_id__lte=max(copied)), target)
+
+    with transaction.atomic(using=source):
+        current = {row['id']: row for row in lists.values().iterator(chunk_size=batch_size)}
+        stale = [list_id for list_id, row in copied.items() if current.get(list_id) != row]
+        # Lists created meanwhile, and changed ones that still exist.
+        recopy = sorted(list_id for list_id in current if list_id not in copied or current[list_id] != copied[list_id])
+        with transaction.atomic(using=target):
+            _delete_lists(stale, target, batch_size)
+            for start in range(0, len(recopy), batch_size):
+                chunk = recopy[start:start + batch_size]
+                _copy_lists(lists.filter(id__in=chunk), target, batch_size)
+                copy_archives(archives.filter(list_id__in=chunk), target)
+            lists_in_slot(slot, target).filter(deleted_at=_STAGED_AT).update(deleted_at=None)
+            lists_in_slot(slot, target).update(revision=F('revision') + 1)
+            for sequence in ListIdSequence.objects.using(source).filter(slot=slot):
+                sequence.save(using=target)
+        save_slot_map({**slot_map(), slot: target})
+        lists.filter(deleted_at__isnull=True).update(deleted_at=timezone.now(), revision=F('revision') + 1)
+        ListIdSequence.objects.using(source).filter(slot=slot).delete()
+    for list_id in list(lists.values_list('id', flat=True)):
+        purge_list(list_id, using=source)
+    return len(current)
+
+
+def _bound_stream(alias, iterator):
+    while True:
+        with using_db(alias):
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+        yield chunk
+
+
+async def _abound_stream(alias, iterator):
+    while True:
+        with using_db(alias):
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                return
+        yield chunk
+
+
+def _bind_response(response, alias):
+    # A streamed body is produced after the view returns; keep the list's
+    # database bound while each chunk is generated.
+    if response.streaming:
+        if response.is_async:
+            response.streaming_content = _abound_stream(alias, aiter(response.streaming_content))
+        else:
+            response.streaming_content = _bound_stream(alias, iter(response.streaming_content))
+    return response
+
+
+def list_shard(view):
+    """Run the view, and stream its response, against the database of its ``list_id``."""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, list_id, *args, **kwargs):
+            with using_list(list_id) as alias:
+                response = await view(request, list_id, *args, **kwargs)
+            return _bind_response(response, alias)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, list_id, *args, **kwargs):
+            with using_list(list_id) as alias:
+                response = view(request, list_id, *args, **kwargs)
+            return _bind_response(response, alias)
+    return wrapper
+
+
+class ShardRouter:
+    """Route the lists app to the list's shard; everything else stays on ``default``."""
+
+    def _db(self, model, hints):
+        if model._meta.app_label != 'lists':
+            return None
+        instance = hints.get('instance')
+        list_id = None
+        if instance is not None and instance._meta.app_label == 'lists':
+            list_id = instance.pk if instance._meta.model_name == 'list' else getattr(instance, 'list_id', None)
+        if list_id is not None:
+            return db_for_list(list_id)
+        return _current_db.get()
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS:
+            return None
+        return app_label == 'lists' and db in shard_databases()
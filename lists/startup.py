@@ -0,0 +1,96 @@
+"""
+Measure how long a fresh worker takes to serve its first response.
+
+``profile_startup()`` starts a new interpreter running this module, the
+same way a gunicorn worker without ``preload_app`` starts. The child
+imports ``notes.wsgi``, which runs ``django.setup()``, and then sends one
+request through the WSGI application. It times each app's model import
+and ``ready()`` and reports everything as JSON. With ``importtime=True``
+the child also runs under ``-X importtime``, and the per-module import
+times are parsed from its stderr.
+
+Used by ``manage.py startup_profile`` and ``benchmarks/worker_startup.py``.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def _timed(timings, label, phase, method):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timings.setdefault(label, {})[phase] = (time.perf_counter() - start) * 1000
+    return wrapper
+
+
+def _child(path):
+    start = time.perf_counter()
+    from django.apps.config import AppConfig
+
+    apps = {}
+    create = AppConfig.create.__func__
+
+    def timed_create(cls, entry):
+        config = create(cls, entry)
+        config.import_models = _timed(apps, config.label, 'models_ms', config.import_models)
+        config.ready = _timed(apps, config.label, 'ready_ms', config.ready)
+        return config
+
+    AppConfig.create = classmethod(timed_create)
+
+    import notes.wsgi
+    loaded = time.perf_counter()
+
+    from wsgiref.util import setup_testing_defaults
+
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', 'HTTP_HOST': 'localhost'}
+    setup_testing_defaults(environ)
+    statuses = []
+    body = b''.join(notes.wsgi.application(environ, lambda status, headers: statuses.append(status)))
+    done = time.perf_counter()
+
+    print(json.dumps({
+        'status': statuses[0],
+        'bytes': len(body),
+        'wsgi_import_ms': (loaded - start) * 1000,
+        'first_response_ms': (done - loaded) * 1000,
+        'total_ms': (done - start) * 1000,
+        'apps': apps,
+    }))
+
+
+def parse_importtime(stderr):
+    """Return ``[(module, self_us, cumulative_us, depth)]`` from ``-X importtime`` output."""
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return modules
+
+
+def profile_startup(settings_module, path='/', importtime=False):
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-m', 'lists.startup', path]
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+    start = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True, env=env, check=True)
+    profile = json.loads(result.stdout.splitlines()[-1])
+    # Includes interpreter start-up, which the child cannot see.
+    profile['process_ms'] = (time.perf_counter() - start) * 1000
+    if importtime:
+        profile['imports'] = parse_importtime(result.stderr)
+    return profile
+
+
+if __name__ == '__main__':
+    _child(sys.argv[1] if len(sys.argv) > 1 else '/')
@@ -0,0 +1,66 @@
+"""
+Static files storage: hashed filenames plus precompressed siblings.
+
+``collectstatic`` writes every file under a content-hashed name (via
+``ManifestStaticFilesStorage``), so nginx can serve ``/static`` with
+far-future, immutable cache headers. It then writes ``.gz`` copies of the
+compressible files, and ``.br`` copies when the optional ``brotli`` package
+is installed, for nginx's ``gzip_static`` / ``brotli_static`` to send
+without compressing on every request.
+"""
+
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.txt', '.html', '.json')
+# Below this size the compressed copy saves less than a packet.
+MIN_COMPRESS_SIZE = 1024
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def __init__(self, *args, manifest_fallback=False, **kwargs):
+        self.manifest_fallback = manifest_fallback
+        super().__init__(*args, **kwargs)
+
+    def stored_name(self, name):
+        # Before the first collectstatic there is no manifest (runserver,
+        # tests); with ``manifest_fallback`` serve the plain name there. In
+        # production a missing manifest must fail loudly, because nginx
+        # would cache the plain name forever.
+        if self.manifest_fallback and not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = []
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.append(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for hashed_name in dict.fromkeys(hashed_names):
+            if hashed_name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self._compress(hashed_name)
+
+    def _compress(self, name):
+        with self.open(name) as f:
+            content = f.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(content)))
+        for suffix, compressed in variants:
+            if len(compressed) >= len(content):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
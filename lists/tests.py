@@ -1,12 +1,48 @@
+import asyncio
+import csv
+import gzip
 import html
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
 from urllib import request
 from django.http import HttpRequest
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.template import engines
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import resolve
+from lists import api, archive, backfill, metrics, positions, search, sharding, startup, views, warmup, writequeue, writes
+from lists.background import ListTask
 from lists.views import home_page
-from lists.models import Item, List
+from lists.writequeue import ItemWriteQueue
+from lists.models import BackfillCheckpoint, Item, List, ListArchive, ListArchiveChunk
+from lists.storage import CompressedManifestStaticFilesStorage
+from notes import settings_lean
 
-class NewItemTest(TestCase):
+
+class ListsTestCase(TestCase):
+    """
+    Rendered list fragments are cached by list id, which the test database
+    reuses. Lists may live on any shard, so every shard's test database is
+    available.
+    """
+
+    databases = '__all__'
+
+    def setUp(self):
+        super().setUp()
+        caches[settings.LIST_FRAGMENT_CACHE].clear()
+
+class NewItemTest(ListsTestCase):
 
     def test_can_save_a_POST_request_to_an_existing_list(self):
         list_ = List.objects.create()
@@ -25,6 +61,8 @@ class NewItemTest(TestCase):
         self.assertEqual(response['location'], f'/lists/{list_.id}/')
 
 class ListAndItemModelTest(TestCase):
+    databases = '__all__'
+
     def test_saving_and_retrieving_items(self):
         list_ = List()
         list_.save()
@@ -51,13 +89,13 @@ class ListAndItemModelTest(TestCase):
         self.assertEqual(saved_items[1].list, list_)
 
 
-class HomePageTest(TestCase):
+class HomePageTest(ListsTestCase):
     def test_uses_home_template(self):
         response = self.client.get('/')
         self.assertTemplateUsed(response, 'home.html')
 
 
-class ListViewTest(TestCase):
+class ListViewTest(ListsTestCase):
     def test_uses_list_template(self):
         list_ = List.objects.create()
         response = self.client.get(f'/lists/{list_.id}/')
@@ -100,3 +138,1133 @@ class ListViewTest(TestCase):
         self.assertEqual(response.status_code, 302)
         new_list = List.objects.first()
         self.assertEqual(response['location'], f'/lists/{new_list.id}/')
+
+
+@override_settings(LIST_PAGE_SIZE=2)
+class ListPaginationTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_ = List.objects.create()
+        self.items = [Item.objects.create(text=f'Item {i}', list=self.list_) for i in range(1, 6)]
+
+    def test_first_page_is_limited_to_page_size(self):
+        response = self.client.get(f'/lists/{self.list_.id}/')
+
+        self.assertContains(response, '1: Item 1')
+        self.assertContains(response, '2: Item 2')
+        self.assertNotContains(response, 'Item 3')
+        self.assertEqual(response.context['next_after'], self.items[1].position)
+
+    def test_next_page_continues_after_cursor(self):
+        response = self.client.get(f'/lists/{self.list_.id}/?after={self.items[1].position}&offset=2')
+
+        self.assertContains(response, '3: Item 3')
+        self.assertContains(response, '4: Item 4')
+        self.assertNotContains(response, 'Item 2')
+
+    def test_last_page_has_no_next_cursor(self):
+        response = self.client.get(f'/lists/{self.list_.id}/?after={self.items[3].position}&offset=4')
+
+        self.assertContains(response, '5: Item 5')
+        self.assertIsNone(response.context['next_after'])
+
+    def test_page_query_count_does_not_grow_with_list_size(self):
+        writes.append_items(self.list_.id, ['filler'] * 50)
+        with self.assertNumQueries(2):
+            self.client.get(f'/lists/{self.list_.id}/')
+
+
+@override_settings(LIST_EXPORT_CHUNK_SIZE=2)
+class ExportListTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_ = List.objects.create()
+        Item.objects.create(text='Buy milk', list=self.list_)
+        Item.objects.create(text='Say "hi", then leave', list=self.list_)
+        Item.objects.create(text='Other list', list=List.objects.create())
+
+    def export(self, query=''):
+        response = self.client.get(f'/lists/{self.list_.id}/export{query}')
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_streams_ndjson_by_default(self):
+        response, body = self.export()
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['text'] for row in rows], ['Buy milk', 'Say "hi", then leave'])
+
+    def test_streams_csv(self):
+        response, body = self.export('?format=csv')
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(body.splitlines()))
+        self.assertEqual(rows[0], ['id', 'text'])
+        self.assertEqual([row[1] for row in rows[1:]], ['Buy milk', 'Say "hi", then leave'])
+
+    def test_unknown_list_is_404(self):
+        response = self.client.get('/lists/999999/export')
+        self.assertEqual(response.status_code, 404)
+
+
+class BulkAddItemsTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_ = List.objects.create()
+        self.url = f'/lists/{self.list_.id}/bulk'
+
+    def test_accepts_json_array(self):
+        response = self.client.post(self.url, data=json.dumps(['one', 'two', ' ']), content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        ids = response.json()['ids']
+        self.assertEqual(list(Item.objects.filter(list=self.list_).values_list('id', 'text')),
+                         list(zip(ids, ['one', 'two'])))
+
+    def test_accepts_newline_separated_text(self):
+        response = self.client.post(self.url, data='one\n\ntwo\n', content_type='text/plain')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Item.objects.filter(list=self.list_).count(), 2)
+
+    @override_settings(LIST_BULK_BATCH_SIZE=2)
+    def test_inserts_in_one_transaction_with_batched_statements(self):
+        # list lookup, savepoint, archive check, last position, 2 INSERTs, revision bump, release
+        with self.assertNumQueries(8):
+            self.client.post(self.url, data='a\nb\nc\n', content_type='text/plain')
+        self.assertEqual(Item.objects.filter(list=self.list_).count(), 3)
+
+    def test_rejects_malformed_json(self):
+        response = self.client.post(self.url, data='{"not": "a list"}', content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Item.objects.count(), 0)
+
+    def test_unknown_list_is_404(self):
+        response = self.client.post('/lists/999999/bulk', data='a', content_type='text/plain')
+        self.assertEqual(response.status_code, 404)
+
+
+class ListFragmentCacheTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_ = List.objects.create()
+        Item.objects.create(text='Cached item', list=self.list_)
+
+    def test_repeat_views_only_read_the_list_revision(self):
+        self.client.get(f'/lists/{self.list_.id}/')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/lists/{self.list_.id}/')
+        self.assertContains(response, '1: Cached item')
+        self.assertEqual(response.context['list'], self.list_)
+
+    def test_new_item_invalidates_cached_table(self):
+        self.client.get(f'/lists/{self.list_.id}/')
+        self.client.post(f'/lists/{self.list_.id}/new_item', data={'item_text': 'Fresh item'})
+
+        response = self.client.get(f'/lists/{self.list_.id}/')
+        self.assertContains(response, '2: Fresh item')
+
+    def test_bulk_add_invalidates_cached_table(self):
+        self.client.get(f'/lists/{self.list_.id}/')
+        self.client.post(f'/lists/{self.list_.id}/bulk', data='Bulk item', content_type='text/plain')
+
+        response = self.client.get(f'/lists/{self.list_.id}/')
+        self.assertContains(response, '2: Bulk item')
+
+    def test_new_release_does_not_read_fragments_of_the_previous_one(self):
+        self.client.get(f'/lists/{self.list_.id}/')
+        Item.objects.update(text='Renamed item')  # bypasses the revision bump
+
+        with override_settings(RELEASE='next'):
+            response = self.client.get(f'/lists/{self.list_.id}/')
+        self.assertContains(response, '1: Renamed item')
+
+
+class ConditionalGetTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_ = List.objects.create()
+        Item.objects.create(text='Item 1', list=self.list_)
+
+    def test_list_page_sends_validators(self):
+        response = self.client.get(f'/lists/{self.list_.id}/')
+
+        self.assertEqual(response['ETag'], f'W/"{self.list_.id}-0-{settings.RELEASE}-html"')
+        self.assertIn('Last-Modified', response)
+
+    def test_matching_etag_is_answered_before_reading_items(self):
+        etag = self.client.get(f'/lists/{self.list_.id}/')['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/lists/{self.list_.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_etag(self):
+        etag = self.client.get(f'/lists/{self.list_.id}/')['ETag']
+        self.client.post(f'/lists/{self.list_.id}/new_item', data={'item_text': 'Item 2'})
+
+        response = self.client.get(f'/lists/{self.list_.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, '2: Item 2')
+
+    def test_json_endpoint_supports_conditional_get(self):
+        response = self.client.get(f'/api/lists/{self.list_.id}')
+
+        self.assertEqual(response.json()['items'], [[Item.objects.get().id, 'Item 1']])
+        response = self.client.get(f'/api/lists/{self.list_.id}', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_differs_between_representations_and_releases(self):
+        etag = self.client.get(f'/lists/{self.list_.id}/')['ETag']
+
+        response = self.client.get(f'/api/lists/{self.list_.id}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        with override_settings(RELEASE='next'):
+            response = self.client.get(f'/lists/{self.list_.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_list_is_404(self):
+        response = self.client.get('/lists/999999/')
+        self.assertEqual(response.status_code, 404)
+
+
+class SQLiteTuningTest(TestCase):
+    def test_new_connections_get_configured_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+class AsyncViewsTest(ListsTestCase):
+    def test_urls_pick_views_for_the_worker_type(self):
+        expected = views.aview_list if settings.LIST_ASYNC_VIEWS else views.view_list
+        self.assertIs(resolve('/lists/1/').func, expected)
+        self.assertFalse(asyncio.iscoroutinefunction(views.view_list))
+
+    async def test_coroutine_views_start_and_extend_a_list(self):
+        factory = AsyncRequestFactory()
+        response = await views.anew_list(factory.post('/lists/new', {'item_text': 'First'}))
+        list_ = await List.objects.afirst()
+        self.assertEqual(response['location'], f'/lists/{list_.id}/')
+
+        await views.anew_item(factory.post(f'/lists/{list_.id}/new_item', {'item_text': 'Second'}), str(list_.id))
+        response = await views.aview_list(factory.get(f'/lists/{list_.id}/'), str(list_.id))
+
+        self.assertContains(response, '1: First')
+        self.assertContains(response, '2: Second')
+
+    async def test_async_client_can_start_and_extend_a_list(self):
+        response = await self.async_client.post('/lists/new', data={'item_text': 'First'})
+        list_ = await List.objects.afirst()
+
+        self.assertEqual(response['location'], f'/lists/{list_.id}/')
+        self.assertContains(await self.async_client.get(f'/lists/{list_.id}/'), '1: First')
+
+
+class RequestMetricsMiddlewareTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.list_ = List.objects.create()
+        Item.objects.create(text='Item 1', list=self.list_)
+
+    def test_server_timing_reports_query_count_and_durations(self):
+        response = self.client.get(f'/lists/{self.list_.id}/')
+
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="2 queries"', timing)  # list, items
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    async def test_counts_queries_for_async_requests(self):
+        response = await self.async_client.get(f'/lists/{self.list_.id}/')
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    def test_keeps_histogram_per_url_name(self):
+        self.client.get('/')
+        self.client.get(f'/lists/{self.list_.id}/')
+        self.client.get(f'/lists/{self.list_.id}/')
+
+        summary = metrics.snapshot()
+        self.assertEqual(summary['home']['count'], 1)
+        self.assertEqual(summary['view_list']['count'], 2)
+        self.assertGreater(summary['view_list']['p50_ms'], 0)
+
+    @override_settings(REQUEST_METRICS_SLOW_MS=0, REQUEST_METRICS_SLOW_SAMPLE_RATE=1)
+    def test_slow_requests_are_logged_with_their_queries(self):
+        with self.assertLogs('lists.requests', 'WARNING') as logs:
+            self.client.get(f'/lists/{self.list_.id}/')
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['url_name'], 'view_list')
+        self.assertEqual(record['queries'], 2)
+        self.assertEqual(len(record['sql']), 2)
+        self.assertIn('lists_item', record['sql'][1]['sql'])
+
+
+@override_settings(SEARCH_PAGE_SIZE=2)
+class SearchTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.groceries = List.objects.create()
+        self.chores = List.objects.create()
+        Item.objects.create(text='Buy oat milk', list=self.groceries)
+        Item.objects.create(text='Buy bread', list=self.groceries)
+        Item.objects.create(text='Milk the cow', list=self.chores)
+
+    def search(self, **params):
+        return self.client.get('/api/search', params).json()
+
+    def test_finds_items_across_lists(self):
+        results = self.search(q='milk')['results']
+        self.assertEqual({r['text'] for r in results}, {'Buy oat milk', 'Milk the cow'})
+
+    def test_filters_by_list(self):
+        results = self.search(q='milk', list=self.chores.id)['results']
+        self.assertEqual([r['text'] for r in results], ['Milk the cow'])
+
+    def test_paginates_results(self):
+        Item.objects.create(text='Buy eggs', list=self.chores)
+
+        first = self.search(q='buy')
+        second = self.search(q='buy', page=2)
+        self.assertEqual(first['next_page'], 2)
+        self.assertIsNone(second['next_page'])
+        self.assertEqual(len({r['id'] for r in first['results'] + second['results']}), 3)
+
+    def test_query_syntax_is_matched_literally(self):
+        self.assertEqual(self.search(q='buy OR "milk')['results'], [])
+
+    def test_index_follows_deletes_including_list_cascade(self):
+        Item.objects.filter(text='Buy bread').delete()
+        self.chores.delete()
+
+        self.assertEqual([r['text'] for r in self.search(q='milk')['results']], ['Buy oat milk'])
+        self.assertEqual(self.search(q='bread')['results'], [])
+
+    def test_bulk_created_items_are_searchable(self):
+        self.client.post(f'/lists/{self.chores.id}/bulk', data='Walk the dog', content_type='text/plain')
+        self.assertEqual(len(self.search(q='dog')['results']), 1)
+
+    def test_rebuild_command_reindexes_everything(self):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO lists_item_fts(lists_item_fts) VALUES ('delete-all')")
+        self.assertEqual(self.search(q='milk')['results'], [])
+
+        call_command('rebuild_search_index', batch_size=2, stdout=io.StringIO())
+        self.assertEqual(len(self.search(q='milk')['results']), 2)
+
+    def test_rebuild_keeps_serving_and_catches_writes_made_meanwhile(self):
+        def progress(indexed, last_id):
+            if indexed == 2:
+                self.assertEqual(len(search.search_items('milk')), 2)
+                Item.objects.filter(text='Buy bread').update(text='Buy rye bread')  # already copied
+                Item.objects.create(text='Milk shake', list=self.chores)  # not copied yet
+
+        search.rebuild_index(batch_size=2, progress=progress)
+
+        self.assertEqual(len(search.search_items('milk')), 3)
+        self.assertEqual([r['text'] for r in search.search_items('rye')], ['Buy rye bread'])
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO lists_item_fts(lists_item_fts) VALUES ('integrity-check')")
+            cursor.execute("SELECT name FROM sqlite_master WHERE name LIKE 'lists_item_fts_new%' OR name LIKE '%_rebuild'")
+            self.assertEqual(cursor.fetchall(), [])
+
+
+class ListSummaryTest(ListsTestCase):
+    def test_new_list_and_new_item_maintain_summary(self):
+        self.client.post('/lists/new', data={'item_text': 'First'})
+        list_ = List.objects.get()
+        self.client.post(f'/lists/{list_.id}/new_item', data={'item_text': 'Second'})
+
+        list_.refresh_from_db()
+        self.assertEqual((list_.item_count, list_.first_item_text, list_.last_item_text), (2, 'First', 'Second'))
+
+    def test_bulk_add_maintains_summary(self):
+        list_ = List.objects.create()
+        self.client.post(f'/lists/{list_.id}/bulk', data='a\nb\nc', content_type='text/plain')
+
+        list_.refresh_from_db()
+        self.assertEqual((list_.item_count, list_.first_item_text, list_.last_item_text), (3, 'a', 'c'))
+
+    def test_refresh_summary_after_delete(self):
+        list_ = List.objects.create()
+        self.client.post(f'/lists/{list_.id}/bulk', data='a\nb\nc', content_type='text/plain')
+        Item.objects.filter(text='c').delete()
+        List.refresh_summary(list_.id)
+
+        list_.refresh_from_db()
+        self.assertEqual((list_.item_count, list_.last_item_text), (2, 'b'))
+
+    def test_delete_item_decrements_count_without_counting_items(self):
+        list_ = writes.create_list('a')
+        writes.append_items(list_.id, ['b', 'c'])
+        last = Item.objects.get(text='c')
+
+        with CaptureQueriesContext(connection) as queries:
+            writes.delete_item(list_.id, last.id)
+
+        list_.refresh_from_db()
+        self.assertEqual((list_.item_count, list_.last_item_text), (2, 'b'))
+        self.assertNotIn('COUNT(', ''.join(q['sql'] for q in queries.captured_queries))
+
+    def test_reconcile_command_fixes_drift(self):
+        list_ = List.objects.create()
+        Item.objects.create(text='Untracked', list=list_)
+        out = io.StringIO()
+
+        call_command('reconcile_list_summaries', stdout=out)
+
+        list_.refresh_from_db()
+        self.assertEqual((list_.item_count, list_.first_item_text), (1, 'Untracked'))
+        self.assertIn('Fixed 1', out.getvalue())
+
+    def test_index_renders_all_lists_in_one_query(self):
+        for n in range(30):
+            self.client.post('/lists/new', data={'item_text': f'List {n}'})
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/lists/all')
+        self.assertContains(response, '1 item', count=30)
+        self.assertContains(response, 'List 29')
+
+
+class ItemWriteQueueTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_ = List.objects.create()
+        self.queue = ItemWriteQueue(interval=1, max_batch=10)
+
+    def test_flush_commits_queued_items_in_one_batch(self):
+        futures = [self.queue.submit(self.list_.id, f'Item {n}') for n in range(3)]
+
+        with self.assertNumQueries(6):  # savepoint, list check, last position, one INSERT, summary UPDATE, release
+            self.assertEqual(self.queue.flush(), 3)
+
+        self.assertEqual([f.result().text for f in futures], ['Item 0', 'Item 1', 'Item 2'])
+        self.list_.refresh_from_db()
+        self.assertEqual((self.list_.item_count, self.list_.revision), (3, 1))
+        self.assertEqual(self.queue.commits, 1)
+
+    def test_bad_item_only_fails_its_own_future(self):
+        good = self.queue.submit(self.list_.id, 'Good')
+        bad = self.queue.submit(999999, 'No such list')
+
+        self.queue.flush()
+
+        self.assertEqual(good.result().text, 'Good')
+        self.assertIsInstance(bad.exception(), List.DoesNotExist)
+
+
+@override_settings(LIST_WRITE_BEHIND=True, LIST_WRITE_BEHIND_INTERVAL_MS=1)
+class WriteBehindNewItemTest(TransactionTestCase):
+    databases = '__all__'
+
+    def tearDown(self):
+        writequeue.get_queue().stop()
+        writequeue._queue = None
+
+    def test_redirects_after_item_is_committed(self):
+        list_ = List.objects.create()
+
+        response = self.client.post(f'/lists/{list_.id}/new_item', data={'item_text': 'Queued item'})
+
+        self.assertEqual(response['location'], f'/lists/{list_.id}/')
+        self.assertEqual(Item.objects.get().text, 'Queued item')
+
+
+class JsonApiTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_ = List.objects.create()
+        self.item = Item.objects.create(text='Item 1', list=self.list_)
+        self.url = f'/api/lists/{self.list_.id}'
+
+    def test_get_list_returns_compact_payload(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertNotIn(b' ', response.content.replace(b'Item 1', b''))
+        self.assertEqual(response.json()['fields'], ['id', 'text'])
+        self.assertEqual(response.json()['items'], [[self.item.id, 'Item 1']])
+
+    def test_append_item(self):
+        response = self.client.post(f'{self.url}/items', data={'text': 'Item 2'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Item.objects.get(id=response.json()['id']).text, 'Item 2')
+        self.list_.refresh_from_db()
+        self.assertEqual(self.list_.item_count, 1)  # the fixture item bypassed the write paths
+
+    def test_append_rejects_missing_text(self):
+        response = self.client.post(f'{self.url}/items', data={'text': ' '}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_append(self):
+        response = self.client.post(f'{self.url}/items/bulk', data=['a', 'b'], content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['ids']), 2)
+
+    def test_delete_item_refreshes_summary(self):
+        other = Item.objects.create(text='Item 2', list=self.list_)
+        List.refresh_summary(self.list_.id)  # the fixture items bypassed the write paths
+
+        response = self.client.delete(f'{self.url}/items/{other.id}')
+
+        self.assertEqual(response.status_code, 204)
+        self.list_.refresh_from_db()
+        self.assertEqual((self.list_.item_count, self.list_.last_item_text), (1, 'Item 1'))
+        self.assertEqual(self.client.delete(f'{self.url}/items/{other.id}').status_code, 404)
+
+    def test_delete_list(self):
+        response = self.client.delete(self.url)
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(List.objects.exists())
+        self.assertFalse(Item.objects.exists())
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    @unittest.skipIf(api.msgpack is None, 'msgpack is not installed')
+    def test_msgpack_content_negotiation(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(api.msgpack.unpackb(response.content)['items'], [[self.item.id, 'Item 1']])
+
+
+class ListEventsTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_ = List.objects.create()
+        self.first = Item.objects.create(text='Seen', list=self.list_)
+        self.missed = Item.objects.create(text='Missed', list=self.list_)
+
+    def test_sync_worker_sends_missed_items_then_ends(self):
+        response = self.client.get(f'/lists/{self.list_.id}/events', HTTP_LAST_EVENT_ID=str(self.first.id))
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('retry: ', body)
+        self.assertIn(f'id: {self.missed.id}\nevent: item\n', body)
+        self.assertNotIn('"Seen"', body)
+
+    async def test_asgi_stream_pushes_new_items(self):
+        response = await self.async_client.get(f'/lists/{self.list_.id}/events?after={self.missed.id}')
+        stream = aiter(response.streaming_content)
+        self.assertIn(b'retry: ', await anext(stream))
+
+        def append_item():
+            with self.captureOnCommitCallbacks(execute=True):
+                return writes.append_items(self.list_.id, ['Live item'])
+
+        next_chunk = asyncio.ensure_future(anext(stream))
+        [item] = await sync_to_async(append_item)()
+
+        chunk = (await asyncio.wait_for(next_chunk, 1)).decode()
+        self.assertIn(f'id: {item.id}\n', chunk)
+        self.assertIn('"Live item"', chunk)
+        await response.streaming_content.aclose()
+
+    @override_settings(LIST_ASYNC_VIEWS=True)
+    def test_list_page_points_last_page_at_event_stream(self):
+        response = self.client.get(f'/lists/{self.list_.id}/')
+        self.assertContains(response, f'data-events-url="/lists/{self.list_.id}/events?after={self.missed.id}"')
+
+    def test_wsgi_list_page_does_not_open_an_event_stream(self):
+        response = self.client.get(f'/lists/{self.list_.id}/')
+        self.assertNotContains(response, 'data-events-url')
+
+
+class WarmUpTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.loader = engines.all()[0].engine.template_loaders[0]
+        self.loader.reset()
+        self.addCleanup(setattr, views, '_home_page_html', None)
+
+    def test_compiles_project_templates_into_cached_loader(self):
+        warmup.warm_up()
+
+        cached = {key.split(':')[0] for key in self.loader.get_template_cache}
+        self.assertLessEqual({'base.html', 'home.html', 'list.html', 'list_table.html'}, cached)
+
+    def test_prerendered_home_page_gets_a_fresh_csrf_token(self):
+        warmup.warm_up()
+
+        response = self.client.get('/')
+        self.assertNotContains(response, views.CSRF_TOKEN_PLACEHOLDER)
+        self.assertContains(response, 'name="csrfmiddlewaretoken"')
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+
+    def test_prerendered_home_page_form_posts(self):
+        warmup.warm_up()
+        self.client.handler.enforce_csrf_checks = True
+
+        response = self.client.get('/')
+        token = html.unescape(response.content.decode()).split('name="csrfmiddlewaretoken" value="')[1].split('"')[0]
+        response = self.client.post('/lists/new', {'item_text': 'Item', 'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+
+
+class StaticFilesStorageTest(ListsTestCase):
+    def test_pages_link_unhashed_names_before_collectstatic(self):
+        response = self.client.get('/')
+        self.assertContains(response, '/static/bootstrap/css/bootstrap.min.css')
+
+    def test_missing_manifest_fails_without_the_fallback(self):
+        with tempfile.TemporaryDirectory() as static_root:
+            storage = CompressedManifestStaticFilesStorage(location=static_root)
+            with self.assertRaisesMessage(ValueError, 'Missing staticfiles manifest entry'):
+                storage.stored_name('bootstrap/css/bootstrap.min.css')
+            fallback = CompressedManifestStaticFilesStorage(location=static_root, manifest_fallback=True)
+            self.assertEqual(fallback.stored_name('bootstrap/css/bootstrap.min.css'), 'bootstrap/css/bootstrap.min.css')
+
+    def test_critical_css_is_inlined(self):
+        response = self.client.get('/')
+        self.assertContains(response, '<style>')
+        self.assertContains(response, 'rel="preload"')
+
+    def test_collectstatic_writes_hashed_and_precompressed_files(self):
+        with tempfile.TemporaryDirectory() as static_root, override_settings(STATIC_ROOT=static_root):
+            call_command('collectstatic', '--noinput', verbosity=0)
+            with open(os.path.join(static_root, 'staticfiles.json')) as f:
+                hashed = json.load(f)['paths']['bootstrap/css/bootstrap.min.css']
+            self.assertNotEqual(hashed, 'bootstrap/css/bootstrap.min.css')
+
+            path = os.path.join(static_root, hashed)
+            with open(path, 'rb') as original, gzip.open(path + '.gz') as compressed:
+                self.assertEqual(compressed.read(), original.read())
+
+            response = self.client.get('/')
+            self.assertContains(response, f'/static/{hashed}')
+
+
+class ItemOrderingTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_ = List.objects.create()
+        self.items = writes.append_items(self.list_.id, ['One', 'Two', 'Three', 'Four'])
+
+    def move(self, item, **anchor):
+        return self.client.post(
+            f'/api/lists/{self.list_.id}/items/{item.id}/move', anchor, content_type='application/json',
+        )
+
+    def texts(self):
+        return list(Item.objects.filter(list=self.list_).order_by('position').values_list('text', flat=True))
+
+    def test_appended_keys_stay_short_and_ordered(self):
+        keys = positions.keys_after(None, 10_000)
+        self.assertEqual(keys, sorted(keys))
+        self.assertLessEqual(max(map(len, keys)), 4)
+
+    def test_key_between_always_fits_between_neighbours(self):
+        low, high = 'a0', 'a1'
+        for _ in range(100):
+            middle = positions.key_between(low, high)
+            self.assertTrue(low < middle < high)
+            high = middle
+
+    def test_move_after_rewrites_only_the_moved_item(self):
+        # savepoint, archive check, item lookup, next neighbour, one item UPDATE, summary UPDATE, release
+        with self.assertNumQueries(7):
+            response = self.move(self.items[3], after=self.items[0].id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.texts(), ['One', 'Four', 'Two', 'Three'])
+
+    def test_move_before_first_item_updates_summary(self):
+        self.move(self.items[2], before=self.items[0].id)
+
+        self.assertEqual(self.texts(), ['Three', 'One', 'Two', 'Four'])
+        self.list_.refresh_from_db()
+        self.assertEqual(self.list_.first_item_text, 'Three')
+        self.assertEqual(self.list_.item_count, 4)
+
+    def test_move_requires_exactly_one_anchor(self):
+        self.assertEqual(self.move(self.items[0]).status_code, 400)
+        self.assertEqual(self.move(self.items[0], after=self.items[1].id, before=self.items[2].id).status_code, 400)
+
+    def test_move_to_item_of_another_list_is_not_found(self):
+        other = writes.create_list('Elsewhere')
+        response = self.move(self.items[0], after=Item.objects.get(list=other).id)
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_follows_position_order(self):
+        self.move(self.items[0], after=self.items[3].id)
+
+        response = self.client.get(f'/lists/{self.list_.id}/')
+        self.assertEqual([item['text'] for item in response.context['items']], ['Two', 'Three', 'Four', 'One'])
+
+    @override_settings(LIST_POSITION_REBALANCE_LENGTH=2)
+    def test_long_keys_schedule_a_rebalance(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            writes.move_item(self.list_.id, self.items[3].id, after=self.items[0].id)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_rebalance_keeps_order_with_short_keys(self):
+        for _ in range(30):
+            writes.move_item(self.list_.id, self.items[3].id, before=self.items[1].id)
+            writes.move_item(self.list_.id, self.items[2].id, before=self.items[3].id)
+        order = self.texts()
+
+        self.assertEqual(positions.rebalance(self.list_.id), 4)
+
+        self.assertEqual(self.texts(), order)
+        keys = Item.objects.filter(list=self.list_).values_list('position', flat=True)
+        self.assertLessEqual(max(map(len, keys)), 2)
+
+    def test_chunked_rebalance_keeps_order_between_chunks(self):
+        for _ in range(30):
+            writes.move_item(self.list_.id, self.items[3].id, before=self.items[1].id)
+        order = self.texts()
+        seen = []
+        bulk_update = Item.objects.bulk_update
+
+        def record_order(*args, **kwargs):
+            result = bulk_update(*args, **kwargs)
+            seen.append(self.texts())
+            return result
+
+        with mock.patch.object(Item.objects, 'bulk_update', record_order):
+            self.assertEqual(positions.rebalance(self.list_.id, chunk_size=1), 4)
+
+        self.assertEqual(seen, [order] * 4)
+        keys = Item.objects.filter(list=self.list_).values_list('position', flat=True)
+        self.assertLessEqual(max(map(len, keys)), 2)
+
+
+@override_settings(
+    MIDDLEWARE=settings_lean.MIDDLEWARE,
+    TEMPLATES=settings_lean.TEMPLATES,
+    SESSION_ENGINE=settings_lean.SESSION_ENGINE,
+)
+class LeanSettingsTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_ = writes.create_list('Item 1')
+
+    def test_home_page_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_view_list_runs_only_its_own_queries(self):
+        with self.assertNumQueries(2):  # list, items
+            self.client.get(f'/lists/{self.list_.id}/')
+        with self.assertNumQueries(1):  # list validators; the table comes from the fragment cache
+            self.client.get(f'/lists/{self.list_.id}/')
+
+    @unittest.skipUnless('django.contrib.auth' in settings.INSTALLED_APPS, 'auth is not installed')
+    def test_anonymous_user_is_resolved_without_queries(self):
+        # Imported here: the lean profile may leave the auth app out entirely.
+        from django.contrib.auth.middleware import AuthenticationMiddleware
+        from django.contrib.sessions.middleware import SessionMiddleware
+
+        request = RequestFactory().get('/')
+        SessionMiddleware(lambda request: None).process_request(request)
+        AuthenticationMiddleware(lambda request: None).process_request(request)
+        with self.assertNumQueries(0):
+            self.assertFalse(request.user.is_authenticated)
+
+
+class StartupProfileTest(TestCase):
+    def test_parses_importtime_output(self):
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     lists.metrics\n'
+            'import time:       300 |        420 |   lists.db\n'
+        )
+        self.assertEqual(startup.parse_importtime(stderr), [('lists.metrics', 120, 120, 2), ('lists.db', 300, 420, 1)])
+
+    @mock.patch.dict(os.environ, {'DJANGO_TESTING': '1'})  # the child has no staticfiles manifest either
+    def test_profiles_a_fresh_worker_up_to_its_first_response(self):
+        out = io.StringIO()
+        call_command('startup_profile', '--json', stdout=out)
+
+        profile = json.loads(out.getvalue())
+        self.assertEqual(profile['status'], '200 OK')
+        self.assertIn('lists', profile['apps'])
+        self.assertIn('notes.wsgi', [name for name, *_ in profile['imports']])
+
+
+class BackfillTest(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.lists = [List.objects.create() for _ in range(5)]
+
+    def test_processes_rows_in_checkpointed_batches(self):
+        batches = []
+
+        checkpoint = backfill.run_backfill('test', List.objects.all(), batches.append, batch_size=2, pause=0)
+
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual((checkpoint.processed, checkpoint.last_pk), (5, self.lists[-1].id))
+        self.assertIsNotNone(BackfillCheckpoint.objects.get(name='test').completed_at)
+
+    def test_resumes_after_the_last_committed_batch(self):
+        def crash(batch):
+            if batch[0].id > self.lists[1].id:
+                raise RuntimeError('worker killed')
+
+        with self.assertRaises(RuntimeError):
+            backfill.run_backfill('test', List.objects.all(), crash, batch_size=2, pause=0)
+        self.assertEqual(BackfillCheckpoint.objects.get(name='test').last_pk, self.lists[1].id)
+
+        seen = []
+        checkpoint = backfill.run_backfill('test', List.objects.all(), seen.extend, batch_size=2, pause=0)
+        self.assertEqual(seen, self.lists[2:])
+        self.assertEqual(checkpoint.processed, 5)
+
+    def test_completed_backfill_runs_again_only_on_restart(self):
+        backfill.run_backfill('test', List.objects.all(), lambda batch: None, pause=0)
+        seen = []
+
+        backfill.run_backfill('test', List.objects.all(), seen.extend, pause=0)
+        self.assertEqual(seen, [])
+        backfill.run_backfill('test', List.objects.all(), seen.extend, pause=0, restart=True)
+        self.assertEqual(len(seen), 5)
+
+    def test_command_runs_a_registered_backfill(self):
+        Item.objects.create(text='Untracked', list=self.lists[0])
+        out = io.StringIO()
+
+        call_command('backfill', 'list-summaries', '--batch-size', '2', '--pause-ms', '0', '-v', '2', stdout=out)
+
+        self.lists[0].refresh_from_db()
+        self.assertEqual((self.lists[0].item_count, self.lists[0].first_item_text), (1, 'Untracked'))
+        self.assertIn('Processed 4 rows on default', out.getvalue())
+        self.assertIn('completed: 5 rows', out.getvalue())
+
+    @override_settings(LIST_POSITION_REBALANCE_CHUNK_SIZE=2)
+    def test_item_positions_rewrites_each_list_in_chunks(self):
+        for text in ['One', 'Two', 'Three']:
+            writes.append_items(self.lists[0].id, [text])
+        Item.objects.filter(list=self.lists[0], text='Three').update(position='a0V')
+
+        with mock.patch.object(positions, 'rebalance', wraps=positions.rebalance) as rebalance:
+            call_command('backfill', 'item-positions', '--pause-ms', '0', stdout=io.StringIO())
+
+        self.assertEqual(rebalance.call_count, 5)
+        self.assertEqual(
+            list(Item.objects.filter(list=self.lists[0]).order_by('position').values_list('text', flat=True)),
+            ['One', 'Three', 'Two'],
+        )
+        self.assertLessEqual(max(len(key) for key in Item.objects.values_list('position', flat=True)), 2)
+
+
+class ShardingTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.map_path = os.path.join(tempfile.mkdtemp(), 'shard-map.json')
+        map_settings = override_settings(LIST_SHARD_MAP=self.map_path)
+        map_settings.enable()
+        self.addCleanup(map_settings.disable)
+
+    @override_settings(LIST_SHARD_SLOTS=4)
+    def test_new_lists_get_ids_in_a_slot(self):
+        list_ = writes.create_list('First')
+
+        self.assertIn(sharding.slot_of(list_.id), range(4))
+        self.assertEqual(
+            [sharding.allocate_list_id(5), sharding.allocate_list_id(5)], [(5 << 32) + 1, (5 << 32) + 2],
+        )
+
+    def test_slot_ids_continue_after_existing_lists(self):
+        List.objects.create(id=(2 << 32) + 41)
+
+        self.assertEqual(sharding.allocate_list_id(2), (2 << 32) + 42)
+
+    def test_slot_map_pins_slots_to_a_database(self):
+        sharding.save_slot_map({5: 'shard9'})
+
+        self.assertEqual(sharding.db_for_slot(5), 'shard9')
+        self.assertEqual(sharding.db_for_slot(len(settings.LIST_SHARD_DATABASES)), 'default')
+
+    def test_views_use_the_lists_shard(self):
+        list_ = List.objects.create(id=sharding.allocate_list_id(1))
+        self.client.post(f'/lists/{list_.id}/new_item', data={'item_text': 'On shard 1'})
+
+        self.assertContains(self.client.get(f'/lists/{list_.id}/'), 'On shard 1')
+        self.assertEqual(Item.objects.using('shard1').filter(list_id=list_.id).count(), 1)
+        self.assertFalse(Item.objects.using('default').exists())
+
+    def test_moved_slot_stays_readable(self):
+        list_ = List.objects.create(id=sharding.allocate_list_id(1))
+        writes.append_items(list_.id, ['a', 'b', 'c'])
+
+        self.assertEqual(sharding.move_slot(1, 'default'), 1)
+
+        self.assertEqual(sharding.db_for_list(list_.id), 'default')
+        self.assertEqual(list(Item.objects.using('default').order_by('position').values_list('text', flat=True)),
+                         ['a', 'b', 'c'])
+        self.assertFalse(List.objects.using('shard1').exists())
+        self.assertContains(self.client.get(f'/lists/{list_.id}/'), 'c')
+
+    def test_move_catches_up_on_writes_made_during_the_copy(self):
+        first, second = self.shard1_list('First'), self.shard1_list('Second')
+        seen = []
+
+        def progress(copied):
+            if not seen:
+                # Copied but not switched over: still served from shard1 only.
+                self.assertEqual(List.objects.using('default').count(), 0)
+                self.assertEqual(len(search.search_items('first')), 1)
+                writes.append_items(first.id, ['First 2'])
+                seen.append(self.shard1_list('Third'))
+
+        self.assertEqual(sharding.move_slot(1, 'default', batch_size=1, progress=progress), 3)
+
+        self.assertEqual(
+            {list_id: list(Item.objects.filter(list_id=list_id).order_by('position').values_list('text', flat=True))
+             for list_id in (first.id, second.id, seen[0].id)},
+            {first.id: ['First', 'First 2'], second.id: ['Second'], seen[0].id: ['Third']},
+        )
+        self.assertEqual(List.objects.get(id=first.id).item_count, 2)
+        self.assertFalse(List.all_objects.using('shard1').exists())
+        self.assertFalse(Item.objects.using('shard1').exists())
+
+    def shard1_list(self, *texts):
+        list_ = List.objects.create(id=sharding.allocate_list_id(1))
+        writes.append_items(list_.id, list(texts))
+        return list_
+
+    @override_settings(LIST_INDEX_PAGE_SIZE=2)
+    def test_list_index_merges_shards_newest_first(self):
+        older, newer = writes.create_list('Older'), writes.create_list('Newer')
+        remote = self.shard1_list('Remote')
+
+        response = self.client.get('/lists/all')
+
+        self.assertEqual([list_['id'] for list_ in response.context['lists']], [remote.id, newer.id])
+        response = self.client.get('/lists/all', {'before': response.context['next_before']})
+        self.assertEqual([list_['id'] for list_ in response.context['lists']], [older.id])
+
+    def test_search_merges_every_shards_results(self):
+        local = writes.create_list('Buy oat milk')
+        remote = self.shard1_list('Milk the cow', 'Feed the cat')
+
+        self.assertEqual({(r['list'], r['text']) for r in search.search_items('milk')},
+                         {(local.id, 'Buy oat milk'), (remote.id, 'Milk the cow')})
+        self.assertEqual([r['text'] for r in search.search_items('milk', list_id=remote.id)], ['Milk the cow'])
+
+    def test_write_queue_commits_each_shard_separately(self):
+        local, remote = writes.create_list('Local'), self.shard1_list('Remote')
+        queue = ItemWriteQueue(interval=1, max_batch=10)
+        futures = [queue.submit(local.id, 'Local 2'), queue.submit(remote.id, 'Remote 2'),
+                   queue.submit(local.id, 'Local 3')]
+
+        self.assertEqual(queue.flush(), 3)
+
+        self.assertEqual([future.result().text for future in futures], ['Local 2', 'Remote 2', 'Local 3'])
+        self.assertEqual(list(Item.objects.using('default').values_list('text', flat=True).order_by('id')),
+                         ['Local', 'Local 2', 'Local 3'])
+        self.assertEqual(list(Item.objects.using('shard1').values_list('text', flat=True).order_by('id')),
+                         ['Remote', 'Remote 2'])
+
+    def test_archive_and_delete_stay_on_the_lists_shard(self):
+        local, remote = writes.create_list('Local'), self.shard1_list('Remote', 'Remote 2')
+        List.all_objects.using('shard1').filter(id=remote.id).update(updated_at=archive.idle_cutoff(31))
+        out = io.StringIO()
+
+        call_command('archive_lists', stdout=out)
+
+        self.assertIn('shard1: archived 1 lists (2 items', out.getvalue())
+        self.assertTrue(ListArchive.objects.using('shard1').filter(list_id=remote.id).exists())
+        self.assertContains(self.client.get(f'/lists/{remote.id}/'), 'Remote 2')
+
+        self.assertTrue(writes.delete_list(remote.id, background=False))
+        self.assertFalse(List.all_objects.using('shard1').exists())
+        self.assertFalse(ListArchive.objects.using('shard1').exists())
+        self.assertEqual(list(List.objects.using('default').all()), [local])
+
+    def test_moved_archive_gets_item_ids_free_on_the_new_shard(self):
+        local = writes.create_list('Local 1')
+        writes.append_items(local.id, ['Local 2'])
+        remote = self.shard1_list('Remote 1', 'Remote 2')
+        archive.archive_list(remote.id)
+
+        sharding.move_slot(1, 'default')
+        writes.append_items(remote.id, ['Remote 3'])
+
+        items = list(Item.objects.filter(list_id=remote.id).order_by('position').values_list('id', 'text'))
+        self.assertEqual([text for _, text in items], ['Remote 1', 'Remote 2', 'Remote 3'])
+        self.assertEqual([item_id for item_id, _ in items], sorted(item_id for item_id, _ in items))
+        self.assertGreater(items[0][0], max(Item.objects.filter(list_id=local.id).values_list('id', flat=True)))
+
+    def test_rebalance_command_moves_slots_to_their_shard(self):
+        sharding.save_slot_map({1: 'default'})
+        list_ = self.shard1_list('a', 'b')
+        self.assertTrue(List.objects.using('default').filter(id=list_.id).exists())
+        out = io.StringIO()
+
+        call_command('rebalance_shards', stdout=out)
+
+        self.assertIn('Moved slot 1 (1 lists) from default to shard1', out.getvalue())
+        self.assertEqual(sharding.db_for_list(list_.id), 'shard1')
+        self.assertEqual(list(Item.objects.using('shard1').order_by('position').values_list('text', flat=True)),
+                         ['a', 'b'])
+        self.assertFalse(List.objects.using('default').exists())
+        self.assertContains(self.client.get(f'/lists/{list_.id}/'), 'b')
+
+
+class ArchiveTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_ = writes.create_list('Buy milk')
+        writes.append_items(self.list_.id, ['Walk dog', 'Call mum'])
+        self.ids = list(Item.objects.order_by('position').values_list('id', flat=True))
+
+    def make_idle(self, list_):
+        List.objects.filter(id=list_.id).update(updated_at=archive.idle_cutoff(31))
+
+    def test_archived_list_is_still_readable(self):
+        self.assertEqual(archive.archive_list(self.list_.id)[0], 3)
+
+        self.assertFalse(Item.objects.exists())
+        self.assertContains(self.client.get(f'/lists/{self.list_.id}/'), '3: Call mum')
+        self.assertEqual([row[1] for row in self.client.get(f'/api/lists/{self.list_.id}').json()['items']],
+                         ['Buy milk', 'Walk dog', 'Call mum'])
+        body = b''.join(self.client.get(f'/lists/{self.list_.id}/export').streaming_content).decode()
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], self.ids)
+
+    @override_settings(LIST_ARCHIVE_CHUNK_SIZE=2)
+    def test_pages_decompress_only_the_chunks_they_need(self):
+        archive.archive_list(self.list_.id)
+        chunks = list(ListArchiveChunk.objects.order_by('last_position').values_list('last_position', 'item_count'))
+        self.assertEqual([count for _, count in chunks], [2, 1])
+
+        with mock.patch.object(archive, '_decompress', wraps=archive._decompress) as decompress:
+            items = archive.archived_items(self.list_.id, after=chunks[0][0], limit=5)
+
+        self.assertEqual([item['id'] for item in items], self.ids[2:])
+        self.assertEqual(decompress.call_count, 1)
+
+    @override_settings(LIST_ARCHIVE_CHUNK_SIZE=1)
+    def test_export_continues_from_the_items_when_restored_meanwhile(self):
+        archive.archive_list(self.list_.id)
+        items = archive.iter_archived_items(self.list_.id)
+
+        first = next(items)
+        writes.append_items(self.list_.id, ['Post letter'])
+
+        self.assertEqual([first['text']] + [item['text'] for item in items],
+                         ['Buy milk', 'Walk dog', 'Call mum', 'Post letter'])
+
+    def test_write_restores_the_original_items(self):
+        archive.archive_list(self.list_.id)
+
+        self.client.post(f'/lists/{self.list_.id}/new_item', data={'item_text': 'Post letter'})
+
+        self.list_.refresh_from_db()
+        self.assertIsNone(self.list_.archived_at)
+        self.assertFalse(ListArchive.objects.exists())
+        self.assertEqual(list(Item.objects.order_by('position').values_list('id', flat=True))[:3], self.ids)
+        self.assertEqual(Item.objects.order_by('position').last().text, 'Post letter')
+
+    def test_command_archives_only_idle_lists(self):
+        busy = writes.create_list('Still in use')
+        self.make_idle(self.list_)
+        out = io.StringIO()
+
+        call_command('archive_lists', stdout=out)
+
+        self.assertEqual(list(List.objects.filter(archived_at__isnull=False)), [self.list_])
+        self.assertEqual(list(Item.objects.values_list('list_id', flat=True)), [busy.id])
+        self.assertIn('default: archived 1 lists (3 items', out.getvalue())
+        self.assertIn('default: reclaimed', out.getvalue())
+
+    def test_command_only_converts_auto_vacuum_when_asked(self):
+        out = io.StringIO()
+
+        with mock.patch('lists.management.commands.archive_lists.reclaim_space', return_value=None) as reclaim:
+            call_command('archive_lists', stdout=out)
+
+        reclaim.assert_any_call('default', convert=False)
+        self.assertIn('default: incremental auto-vacuum is off', out.getvalue())
+
+    def test_dry_run_changes_nothing(self):
+        self.make_idle(self.list_)
+        out = io.StringIO()
+
+        call_command('archive_lists', '--dry-run', stdout=out)
+
+        self.assertIn('default: 1 lists idle for 30 days', out.getvalue())
+        self.assertFalse(ListArchive.objects.exists())
+
+
+@override_settings(LIST_DELETE_CHUNK_SIZE=2, LIST_DELETE_PAUSE_MS=0)
+class DeleteListTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_ = writes.create_list('Item 1')
+        writes.append_items(self.list_.id, ['Item 2', 'Item 3', 'Item 4', 'Item 5'])
+        self.other = writes.create_list('Keep me')
+
+    def test_deletes_items_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(writes.delete_list(self.list_.id, background=False))
+
+        item_deletes = [q['sql'] for q in queries if q['sql'].startswith('DELETE FROM lists_item')]
+        self.assertEqual(len(item_deletes), 3)  # 2 + 2 + 1 items
+        self.assertFalse(List.all_objects.filter(id=self.list_.id).exists())
+        self.assertEqual(list(Item.objects.values_list('text', flat=True)), ['Keep me'])
+        self.assertFalse(writes.delete_list(self.list_.id))
+
+    def test_large_list_disappears_before_it_is_purged(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete(f'/api/lists/{self.list_.id}')
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(Item.objects.filter(list_id=self.list_.id).count(), 5)
+        self.assertEqual(self.client.get(f'/lists/{self.list_.id}/').status_code, 404)
+        self.assertEqual(list(List.objects.all()), [self.other])
+        self.assertEqual(search.search_items('Item'), [])
+
+        call_command('delete_lists', stdout=io.StringIO())
+        self.assertFalse(List.all_objects.filter(id=self.list_.id).exists())
+        self.assertFalse(Item.objects.filter(list_id=self.list_.id).exists())
+
+    def test_command_deletes_lists_by_id(self):
+        archive.archive_list(self.other.id)
+        out = io.StringIO()
+
+        call_command('delete_lists', str(self.list_.id), str(self.other.id), stdout=out)
+
+        self.assertIn(f'Deleted list {self.list_.id} and 5 items.', out.getvalue())
+        self.assertFalse(List.all_objects.exists())
+        self.assertFalse(ListArchive.objects.exists())
+
+
+class ListTaskTest(TestCase):
+    def test_runs_once_at_a_time_per_list_after_commit(self):
+        started, release, calls = threading.Event(), threading.Event(), []
+
+        def func(list_id):
+            calls.append(list_id)
+            started.set()
+            release.wait(5)
+
+        task = ListTask(func, 'test')
+        with self.captureOnCommitCallbacks(execute=True):
+            task.schedule(1)
+            self.assertEqual(calls, [])
+        self.assertTrue(started.wait(5))
+        with self.captureOnCommitCallbacks(execute=True):
+            task.schedule(1)
+            task.schedule(2)
+        release.set()
+
+        for thread in [t for t in threading.enumerate() if t.name == 'lists-test']:
+            thread.join(5)
+        self.assertEqual(sorted(calls), [1, 2])
@@ -1,11 +1,21 @@
+from django.conf import settings
 from django.urls import path, re_path
-from lists import views
+from lists import api, views
 
+# Coroutine views for ASGI workers, plain ones for WSGI workers (see lists.views).
+if settings.LIST_ASYNC_VIEWS:
+    home_page, new_list, view_list, new_item = views.ahome_page, views.anew_list, views.aview_list, views.anew_item
+else:
+    home_page, new_list, view_list, new_item = views.home_page, views.new_list, views.view_list, views.new_item
 
 urlpatterns = [
     # path('admin/', admin.site.urls),
-    path('', views.home_page, name='home'),  # Include the URLs from the lists app
-    path('new', views.new_list, name='new_list'),
-    re_path(r'^(?P<list_id>\d+)/$', views.view_list, name='view_list'),
-    re_path(r'^(?P<list_id>\d+)/new_item$', views.new_item, name='add_item'),
+    path('', home_page, name='home'),  # Include the URLs from the lists app
+    path('new', new_list, name='new_list'),
+    path('all', views.list_index, name='list_index'),
+    re_path(r'^(?P<list_id>\d+)/$', view_list, name='view_list'),
+    re_path(r'^(?P<list_id>\d+)/new_item$', new_item, name='add_item'),
+    re_path(r'^(?P<list_id>\d+)/export$', views.export_list, name='export_list'),
+    re_path(r'^(?P<list_id>\d+)/events$', views.list_events, name='list_events'),
+    re_path(r'^(?P<list_id>\d+)/bulk$', api.bulk_add_items, name='bulk_add_items'),
 ]
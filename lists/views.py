@@ -1,29 +1,293 @@
-from django.shortcuts import redirect, render
+import asyncio
+import csv
+import io
+import json
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.middleware.csrf import get_token
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db.models import Max
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from lists.archive import iter_archived_items, last_archived_item_id
+from lists.cache import aget_fragment, aset_fragment, get_fragment, set_fragment, table_fragment_key
+from lists.conditional import aget_list_for_read, get_list_for_read, not_modified_response, set_list_validators
+from lists.events import get_broker
 from lists.models import Item, List
+from lists.pagination import aitem_page, int_param, item_page, position_param
+from lists.sharding import list_shard, shard_databases
+from lists.writequeue import get_queue
+from lists.writes import append_items, create_list
+
+
+# The home page is static apart from its CSRF token. Workers pre-render it
+# once (lists.warmup) with a placeholder that each request swaps for its
+# own token. Until then, e.g. under runserver, it is rendered normally.
+CSRF_TOKEN_PLACEHOLDER = 'csrf-token-placeholder'
+_home_page_html = None
 
+def prerender_home_page():
+    global _home_page_html
+    _home_page_html = render_to_string('home.html', {'csrf_token': CSRF_TOKEN_PLACEHOLDER})
+
+# Each page view comes in two flavours: a plain function for WSGI workers
+# and a coroutine (``a`` prefix) for ASGI workers, picked in lists.urls by
+# LIST_ASYNC_VIEWS. Under WSGI a coroutine view would pay for async_to_sync
+# plus a thread hop per query.
 
 def home_page(request):
+    if _home_page_html is not None:
+        return HttpResponse(_home_page_html.replace(CSRF_TOKEN_PLACEHOLDER, get_token(request)))
     return render(request, 'home.html')
 
+async def ahome_page(request):
+    return home_page(request)
+
+def _newest_item_id(list_id):
+    # The last page listens for new items. Moved items make the page's
+    # ids unordered, so resume the event stream from the list's newest id.
+    return Item.objects.filter(list_id=list_id).aggregate(last_id=Max('id'))['last_id']
+
+def _live_events(next_after):
+    # Only ASGI workers keep the event stream open. On a WSGI worker it ends
+    # after the catch-up and the browser would reconnect every few seconds,
+    # holding a worker thread each time, so the page is reloaded instead.
+    return next_after is None and settings.LIST_ASYNC_VIEWS
+
+def _list_table(request, list_, items, next_after, offset, last_id):
+    return render_to_string('list_table.html', {
+        'list': list_,
+        'items': items,
+        'offset': offset,
+        'next_after': next_after,
+        'next_offset': offset + len(items),
+        'live_events': _live_events(next_after),
+        'last_id': last_id or 0,
+    }, request)
+
+def _render_list_table(request, list_, after, offset):
+    archived = list_.archived_at is not None
+    items, next_after = item_page(list_.id, after, settings.LIST_PAGE_SIZE, archived=archived)
+    last_id = None
+    if _live_events(next_after):
+        last_id = last_archived_item_id(list_.id) if archived else _newest_item_id(list_.id)
+    return _list_table(request, list_, items, next_after, offset, last_id)
+
+async def _arender_list_table(request, list_, after, offset):
+    archived = list_.archived_at is not None
+    items, next_after = await aitem_page(list_.id, after, settings.LIST_PAGE_SIZE, archived=archived)
+    last_id = None
+    if _live_events(next_after) and archived:
+        last_id = await sync_to_async(last_archived_item_id)(list_.id)
+    elif _live_events(next_after):
+        last_id = (await Item.objects.filter(list_id=list_.id).aaggregate(last_id=Max('id')))['last_id']
+    return _list_table(request, list_, items, next_after, offset, last_id)
+
+def _table_key(request, list_):
+    after = position_param(request.GET, 'after')
+    offset = int_param(request.GET, 'offset')
+    return after, offset, table_fragment_key(list_.id, list_.revision, after, offset)
+
+def _list_page(request, list_, table):
+    response = render(request, 'list.html', {'list': list_, 'table': mark_safe(table)})
+    return set_list_validators(response, list_)
+
+@list_shard
 def view_list(request, list_id):
-    list_ = List.objects.get(id=list_id)
-    return render(request, 'list.html', {'list': list_})
+    list_ = get_list_for_read(list_id)
+    response = not_modified_response(request, list_)
+    if response is not None:
+        return response
+
+    after, offset, key = _table_key(request, list_)
+    table = get_fragment(key)
+    if table is None:
+        table = _render_list_table(request, list_, after, offset)
+        set_fragment(key, table)
+    return _list_page(request, list_, table)
+
+@list_shard
+async def aview_list(request, list_id):
+    list_ = await aget_list_for_read(list_id)
+    response = not_modified_response(request, list_)
+    if response is not None:
+        return response
+
+    after, offset, key = _table_key(request, list_)
+    table = await aget_fragment(key)
+    if table is None:
+        table = await _arender_list_table(request, list_, after, offset)
+        await aset_fragment(key, table)
+    return _list_page(request, list_, table)
+
+def _export_rows(list_id, fmt, archived=False):
+    chunk_size = settings.LIST_EXPORT_CHUNK_SIZE
+    if archived:
+        rows = ((item['id'], item['text']) for item in iter_archived_items(list_id))
+    else:
+        rows = (
+            Item.objects.filter(list_id=list_id)
+            .order_by('position')
+            .values_list('id', 'text')
+            .iterator(chunk_size=chunk_size)
+        )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(['id', 'text'])
+    pending = 0
+    for item_id, text in rows:
+        if fmt == 'csv':
+            writer.writerow([item_id, text])
+        else:
+            buffer.write(json.dumps({'id': item_id, 'text': text}, ensure_ascii=False))
+            buffer.write('\n')
+        pending += 1
+        # Flush once per fetched chunk so memory stays bounded by chunk_size.
+        if pending >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+@list_shard
+def export_list(request, list_id):
+    list_ = get_object_or_404(List.objects.only('id', 'archived_at'), id=list_id)
+    fmt = request.GET.get('format', 'ndjson')
+    if fmt not in EXPORT_CONTENT_TYPES:
+        fmt = 'ndjson'
+    response = StreamingHttpResponse(
+        _export_rows(list_.id, fmt, archived=list_.archived_at is not None),
+        content_type=EXPORT_CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="list-{list_.id}.{fmt}"'
+    return response
 
 def new_list(request):
     if request.method == 'POST':
         new_item_text = request.POST.get('item_text', '')
         if new_item_text:
-            list_ = List.objects.create()
-            Item.objects.create(text=new_item_text, list=list_)
+            list_ = create_list(new_item_text)
+            return redirect(f'/lists/{list_.id}/')
+
+async def anew_list(request):
+    if request.method == 'POST':
+        new_item_text = request.POST.get('item_text', '')
+        if new_item_text:
+            list_ = await sync_to_async(create_list)(new_item_text)
             return redirect(f'/lists/{list_.id}/')
 
     
+@list_shard
 def new_item(request, list_id):
     if request.method == 'POST':
         list_ = List.objects.get(id=list_id)
         new_item_text = request.POST.get('item_text', '')
         if new_item_text:
-            Item.objects.create(text=new_item_text, list=list_)
+            if settings.LIST_WRITE_BEHIND:
+                get_queue().submit(list_.id, new_item_text).result()
+            else:
+                append_items(list_.id, [new_item_text])
+            return redirect(f'/lists/{list_.id}/')
+    return redirect(f'/lists/{list_id}/')
+
+@list_shard
+async def anew_item(request, list_id):
+    if request.method == 'POST':
+        list_ = await List.objects.aget(id=list_id)
+        new_item_text = request.POST.get('item_text', '')
+        if new_item_text:
+            if settings.LIST_WRITE_BEHIND:
+                await asyncio.wrap_future(get_queue().submit(list_.id, new_item_text))
+            else:
+                await sync_to_async(append_items)(list_.id, [new_item_text])
             return redirect(f'/lists/{list_.id}/')
-    return redirect(f'/lists/{list_id}/')
\ No newline at end of file
+    return redirect(f'/lists/{list_id}/')
+
+def list_index(request):
+    before = int_param(request.GET, 'before')
+    page_size = settings.LIST_INDEX_PAGE_SIZE
+    lists = List.objects.order_by('-id')
+    if before:
+        lists = lists.filter(id__lt=before)
+    lists = lists.values('id', 'item_count', 'first_item_text', 'last_item_text', 'updated_at')[:page_size + 1]
+    # One query per shard, merged newest id first.
+    lists = sorted(
+        (list_ for alias in shard_databases() for list_ in lists.using(alias)),
+        key=lambda list_: list_['id'], reverse=True,
+    )[:page_size + 1]
+    has_next = len(lists) > page_size
+    lists = lists[:page_size]
+    return render(request, 'list_index.html', {
+        'lists': lists,
+        'next_before': lists[-1]['id'] if has_next else None,
+    })
+
+
+def _sse(item):
+    return f'id: {item["id"]}\nevent: item\ndata: {json.dumps(item, ensure_ascii=False)}\n\n'
+
+def _missed_items(list_id, last_id):
+    return (
+        Item.objects.filter(list_id=list_id, id__gt=last_id)
+        .order_by('id')
+        .values('id', 'text')[:settings.LIST_PAGE_SIZE]
+    )
+
+def _catch_up_stream(list_id, last_id):
+    # A sync worker must not be pinned by an endless stream: send what the
+    # client missed, then end and let the browser reconnect after ``retry``.
+    yield f'retry: {settings.LIST_EVENTS_RETRY_MS}\n\n'
+    if last_id:
+        for item in _missed_items(list_id, last_id):
+            yield _sse(item)
+
+async def _live_stream(list_id, last_id):
+    # Subscribe before catching up so nothing committed in between is lost.
+    subscription = get_broker().subscribe(list_id)
+    try:
+        await subscription.start()
+        yield f'retry: {settings.LIST_EVENTS_RETRY_MS}\n\n'
+        if last_id:
+            async for item in _missed_items(list_id, last_id):
+                last_id = item['id']
+                yield _sse(item)
+        while True:
+            try:
+                event = await subscription.get(settings.LIST_EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if event['id'] > last_id:
+                last_id = event['id']
+                yield _sse(event)
+    finally:
+        await subscription.close()
+
+@list_shard
+async def list_events(request, list_id):
+    list_ = await aget_object_or_404(List.objects.only('id'), id=list_id)
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.GET.get('after') or 0)
+    except ValueError:
+        last_id = 0
+    if isinstance(request, ASGIRequest):
+        stream = _live_stream(list_.id, last_id)
+    else:
+        stream = _catch_up_stream(list_.id, last_id)
+
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
@@ -0,0 +1,144 @@
+"""
+Opt-in write-behind queue for item appends (``LIST_WRITE_BEHIND``).
+
+Instead of every ``new_item`` request running its own INSERT and COMMIT,
+requests hand their item to an in-process queue and wait on a future. A
+background thread drains the queue every ``LIST_WRITE_BEHIND_INTERVAL_MS``
+(or as soon as ``LIST_WRITE_BEHIND_MAX_BATCH`` items are waiting) and
+commits the whole batch with one ``bulk_create`` in one transaction per
+shard. The future resolves only after that commit, so the redirect a request sends
+always points at a list that already contains its item.
+"""
+
+import atexit
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from lists import positions
+from lists.archive import restore_list
+from lists.events import publish_items
+from lists.models import Item, List
+from lists.sharding import db_for_list, using_db
+from lists.writes import last_position
+
+
+class ItemWriteQueue:
+    def __init__(self, interval, max_batch):
+        self.interval = interval
+        self.max_batch = max_batch
+        self.commits = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='lists-write-queue', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def submit(self, list_id, text):
+        """Queue an item; the returned future resolves to the saved ``Item``."""
+        future = Future()
+        with self._lock:
+            self._pending.append((list_id, text, future))
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self._wakeup.set()
+        return future
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            close_old_connections()
+            while self.flush() == self.max_batch:
+                pass
+        self.flush()
+
+    def flush(self):
+        """Commit up to ``max_batch`` queued items; return how many were taken."""
+        with self._lock:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if not batch:
+            return 0
+        try:
+            self._commit(batch)
+        except Exception:
+            # Whatever went wrong, one bad item must not fail the others, so
+            # fall back to committing them one by one.
+            for entry in batch:
+                if entry[2].done():
+                    continue
+                try:
+                    self._commit([entry])
+                except Exception as e:
+                    entry[2].set_exception(e)
+        return len(batch)
+
+    def _commit(self, batch):
+        shards = defaultdict(list)
+        for entry in batch:
+            shards[db_for_list(entry[0])].append(entry)
+        for alias, entries in shards.items():
+            self._commit_to(alias, entries)
+
+    def _commit_to(self, alias, batch):
+        with using_db(alias), transaction.atomic(using=alias):
+            # The list may have been deleted since the request looked it up.
+            # Fail those entries up front rather than through a deferred
+            # foreign key error that would abort the whole batch at COMMIT.
+            list_ids = {list_id for list_id, _, _ in batch}
+            existing = dict(List.objects.filter(id__in=list_ids).values_list('id', 'archived_at'))
+            for list_id, archived_at in existing.items():
+                if archived_at is not None:
+                    restore_list(list_id)
+            for list_id, _, future in batch:
+                if list_id not in existing:
+                    future.set_exception(List.DoesNotExist(f'List {list_id} does not exist.'))
+            batch = [entry for entry in batch if entry[0] in existing]
+
+            counts = Counter(list_id for list_id, _, _ in batch)
+            keys = {
+                list_id: iter(positions.keys_after(last_position(list_id), count))
+                for list_id, count in counts.items()
+            }
+            items = Item.objects.bulk_create(
+                Item(list_id=list_id, text=text, position=next(keys[list_id])) for list_id, text, _ in batch
+            )
+            added = defaultdict(list)
+            for item in items:
+                added[item.list_id].append(item)
+            for list_id, list_items in added.items():
+                List.touch(list_id, added=[item.text for item in list_items])
+                publish_items(list_id, list_items)
+        self.commits += 1
+        for item, (_, _, future) in zip(items, batch):
+            future.set_result(item)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """Return this process's queue, starting its flusher on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ItemWriteQueue(
+                settings.LIST_WRITE_BEHIND_INTERVAL_MS / 1000, settings.LIST_WRITE_BEHIND_MAX_BATCH,
+            )
+            _queue.start()
+        return _queue
@@ -0,0 +1,117 @@
+"""
+Write paths shared by the HTML views and the JSON API.
+
+Each function runs in one transaction on the list's shard (see
+``lists.sharding``) and keeps the list's denormalized summary and revision
+(see ``List.touch``) in step with its items.
+"""
+
+from django.conf import settings
+
+from lists import positions
+from lists.archive import restore_list
+from lists.deletion import purge_list, schedule_purge, tombstone_list
+from lists.events import publish_items
+from lists.models import Item, List, preview
+from lists.sharding import allocate_list_id, list_atomic
+
+
+def create_list(text):
+    list_id = allocate_list_id()
+    with list_atomic(list_id):
+        list_ = List.objects.create(
+            id=list_id, item_count=1, first_item_text=preview(text), last_item_text=preview(text),
+        )
+        Item.objects.create(text=text, list=list_, position=positions.key_between(None, None))
+    return list_
+
+
+def last_position(list_id):
+    return (
+        Item.objects.filter(list_id=list_id).order_by('-position')
+        .values_list('position', flat=True).first()
+    )
+
+
+def append_items(list_id, texts):
+    """Append ``texts`` to the list in order and return the new items."""
+    with list_atomic(list_id):
+        restore_list(list_id)
+        keys = positions.keys_after(last_position(list_id), len(texts))
+        items = Item.objects.bulk_create(
+            [Item(text=text, list_id=list_id, position=key) for text, key in zip(texts, keys)],
+            batch_size=settings.LIST_BULK_BATCH_SIZE,
+        )
+        List.touch(list_id, added=texts)
+        publish_items(list_id, items)
+    return items
+
+
+def delete_item(list_id, item_id):
+    """Delete one item; return False if the list has no such item."""
+    with list_atomic(list_id):
+        restore_list(list_id)
+        deleted, _ = Item.objects.filter(list_id=list_id, id=item_id).delete()
+        if deleted:
+            List.refresh_summary(list_id, removed=deleted)
+    return bool(deleted)
+
+
+def _neighbour_position(list_id, item_id, position, after):
+    """Position of the item right after (or before) ``position``, skipping ``item_id``."""
+    items = Item.objects.filter(list_id=list_id).exclude(id=item_id)
+    if after:
+        items = items.filter(position__gt=position).order_by('position')
+    else:
+        items = items.filter(position__lt=position).order_by('-position')
+    return items.values_list('position', flat=True).first()
+
+
+def move_item(list_id, item_id, after=None, before=None):
+    """Move an item to right after item ``after`` or right before item ``before``.
+
+    Only the moved item's row is written. Return its new position, or None if
+    either item is not in the list.
+    """
+    with list_atomic(list_id):
+        restore_list(list_id)
+        anchor_id = after if after is not None else before
+        found = dict(
+            Item.objects.filter(list_id=list_id, id__in=[item_id, anchor_id]).values_list('id', 'position')
+        )
+        if item_id not in found or anchor_id not in found:
+            return None
+        if anchor_id == item_id:
+            return found[item_id]
+        anchor = found[anchor_id]
+        if after is not None:
+            low, high = anchor, _neighbour_position(list_id, item_id, anchor, after=True)
+        else:
+            low, high = _neighbour_position(list_id, item_id, anchor, after=False), anchor
+        position = positions.key_between(low, high)
+        Item.objects.filter(id=item_id).update(position=position)
+        List.refresh_summary(list_id, count=False)
+        if positions.needs_rebalance(position):
+            positions.schedule_rebalance(list_id)
+    return position
+
+
+def delete_list(list_id, background=None):
+    """
+    Delete a list and its items; return False if there was no such list.
+
+    The list disappears at once, and its items are deleted in chunks (see
+    ``lists.deletion``). A list of more than one chunk is purged in a
+    background thread when ``background`` (default
+    ``LIST_DELETE_IN_BACKGROUND``) is true.
+    """
+    if background is None:
+        background = settings.LIST_DELETE_IN_BACKGROUND
+    item_count = tombstone_list(list_id)
+    if item_count is None:
+        return False
+    if background and item_count > settings.LIST_DELETE_CHUNK_SIZE:
+        schedule_purge(list_id)
+    else:
+        purge_list(list_id)
+    return True
@@ -11,12 +11,28 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import subprocess
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short=12', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'dev'
+
+
+# 当前代码的版本，默认取 git 提交哈希（部署时 git reset --hard 到要发布的提交）。
+# 计入表格片段的缓存键和列表的 ETag：模板或接口格式改变后，上一版本缓存的片段和浏览器中的副本都不再命中
+RELEASE = os.getenv('DJANGO_RELEASE') or _git_revision()
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -38,6 +54,8 @@ CSRF_TRUSTED_ORIGINS = [origin.strip() for origin in CSRF_TRUSTED_ORIGINS_STR.sp
 
 # 确保DEBUG=False 在生产环境中
 DEBUG = os.getenv('DJANGO_DEBUG', 'False').lower() == 'true'
+# 是否在运行 manage.py test；测试启动的子进程通过 DJANGO_TESTING=1 声明
+TESTING = sys.argv[1:2] == ['test'] or os.getenv('DJANGO_TESTING') == '1'
 
 
 # Application definition
@@ -53,6 +71,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'lists.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,10 +85,19 @@ ROOT_URLCONF = 'notes.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates 的子类，额外统计模板渲染耗时（见 lists/middleware.py）
+        'BACKEND': 'lists.templating.TimedDjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
+        # 显式使用缓存加载器：模板只编译一次，之后复用编译结果；
+        # worker 启动时由 lists.warmup 预先编译全部模板（见 deploy_tools/gunicorn.conf.py）
+        'APP_DIRS': False,
         'OPTIONS': {
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -88,7 +116,68 @@ WSGI_APPLICATION = 'notes.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, '../database/db.sqlite3'),
+        # 可用 DJANGO_SQLITE_PATH 指向其他数据库文件，例如容量探测时使用的临时库
+        'NAME': os.getenv('DJANGO_SQLITE_PATH') or os.path.join(BASE_DIR, '../database/db.sqlite3'),
+        # 持久连接：每个 worker 复用数据库连接，而不是每个请求重新打开
+        'CONN_MAX_AGE': int(os.getenv('DJANGO_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # 写事务使用 BEGIN IMMEDIATE，在事务开始时就获取写锁，
+            # 避免并发写入时在提交阶段才出现 "database is locked"。
+            # 读视图不开启事务，因此不受影响。设置为空字符串则使用 SQLite 默认的 DEFERRED。
+            'transaction_mode': os.getenv('DJANGO_SQLITE_TRANSACTION_MODE', 'IMMEDIATE') or None,
+        },
+    }
+}
+
+# 清单分片：DJANGO_LIST_SHARDS 大于 1 时，清单及其条目按 id 分布到多个 SQLite 文件
+# （default 之外的分片为 db-shard1.sqlite3、db-shard2.sqlite3……，与 default 放在同一目录），
+# 每个文件有各自的写锁。路由规则见 lists/sharding.py；新增分片后用 manage.py migrate_shards 建表，
+# 再用 manage.py rebalance_shards 迁移数据
+LIST_SHARDS = int(os.getenv('DJANGO_LIST_SHARDS', '1'))
+# 测试时至少有两个分片数据库，跨分片的代码路径总能被测试覆盖（见下面的 LIST_SHARD_SLOTS）
+_shard_count = max(LIST_SHARDS, 2) if TESTING else LIST_SHARDS
+_db_root, _db_ext = os.path.splitext(DATABASES['default']['NAME'])
+for _shard in range(1, _shard_count):
+    DATABASES[f'shard{_shard}'] = {
+        **DATABASES['default'],
+        'NAME': f'{_db_root}-shard{_shard}{_db_ext}',
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+    }
+LIST_SHARD_DATABASES = ['default'] + [f'shard{_shard}' for _shard in range(1, _shard_count)]
+# 清单 id 的高位是槽位号，新清单随机落在 LIST_SHARD_SLOTS 个槽位之一；迁移数据以槽位为单位。
+# 只有一个分片时默认只用槽位 0，清单 id 与以前一样从 1 递增。
+# 测试时也只用槽位 0，新清单都在 default 上；测试需要其他分片时显式分配槽位 1 的 id
+LIST_SHARD_SLOTS = int(
+    os.getenv('DJANGO_LIST_SHARD_SLOTS') or (1 if LIST_SHARDS == 1 or TESTING else 16 * LIST_SHARDS)
+)
+# 记录被 rebalance_shards 迁移到其他分片的槽位（JSON），所有 worker 共享
+LIST_SHARD_MAP = os.getenv('DJANGO_LIST_SHARD_MAP') or os.path.join(os.path.dirname(_db_root), 'shard-map.json')
+DATABASE_ROUTERS = ['lists.sharding.ShardRouter']
+
+# 每个新建的 SQLite 连接都会执行这些 PRAGMA（见 lists/db.py）
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('DJANGO_SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': os.getenv('DJANGO_SQLITE_SYNCHRONOUS', 'normal'),
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -20000,  # 负数表示以 KiB 为单位，约 20 MB
+    'temp_store': 'memory',
+    # 新建的数据库从一开始就支持增量 VACUUM；已有数据库需要运行一次 archive_lists --convert-auto-vacuum 转换（完整 VACUUM，期间锁库）
+    'auto_vacuum': 'incremental',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 默认使用进程内 LocMem 缓存；生产环境可以通过环境变量切换为文件缓存或 memcached/redis，例如：
+# DJANGO_CACHE_BACKEND="django.core.cache.backends.filebased.FileBasedCache"
+# DJANGO_CACHE_LOCATION="/var/tmp/todolist_cache"
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', ''),
     }
 }
 
@@ -130,7 +219,107 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, '../static')
 
+# collectstatic 时给文件名加上内容哈希，并为 CSS/JS 等生成 .gz（安装了 brotli 时还有 .br）压缩副本，
+# 由 Nginx 的 gzip_static 直接返回，并设置永久缓存（见 deploy_tools/nginx.template.conf）
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'lists.storage.CompressedManifestStaticFilesStorage',
+        'OPTIONS': {
+            # collectstatic 之前没有 manifest：只在调试和测试时退回未加哈希的文件名。
+            # 生产环境缺少 manifest 条目时直接报错，否则 Nginx 会给未加哈希的文件加上永久缓存
+            'manifest_fallback': DEBUG or TESTING,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Logging
+# 每个请求会在 lists.requests 日志中输出一行 JSON（SQL 数量、数据库耗时、模板耗时、总耗时），
+# 默认只输出慢请求；设置 DJANGO_REQUEST_LOG_LEVEL=INFO 可以记录所有请求
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'lists.requests': {
+            'handlers': ['console'],
+            'level': os.getenv('DJANGO_REQUEST_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+# 超过该耗时（毫秒）的请求会连同其执行的 SQL 一起以 WARNING 级别记录
+REQUEST_METRICS_SLOW_MS = float(os.getenv('DJANGO_REQUEST_METRICS_SLOW_MS', '500'))
+# 记录 SQL 语句的请求比例（0~1），用于控制慢请求采样的开销
+REQUEST_METRICS_SLOW_SAMPLE_RATE = float(os.getenv('DJANGO_REQUEST_METRICS_SLOW_SAMPLE_RATE', '0.1'))
+# 每个 URL name 的滚动直方图保留的最近请求数
+REQUEST_METRICS_WINDOW = 1000
+
+
+# Lists app
+
+# 列表页每页显示的条目数（基于 Item.id 的 keyset 分页）
+LIST_PAGE_SIZE = int(os.getenv('DJANGO_LIST_PAGE_SIZE', '100'))
+# 渲染好的列表表格片段所使用的缓存别名及过期时间（秒）
+LIST_FRAGMENT_CACHE = 'default'
+LIST_FRAGMENT_CACHE_TIMEOUT = int(os.getenv('DJANGO_LIST_FRAGMENT_CACHE_TIMEOUT', '3600'))
+# 导出列表时每次从数据库游标读取的行数
+LIST_EXPORT_CHUNK_SIZE = int(os.getenv('DJANGO_LIST_EXPORT_CHUNK_SIZE', '2000'))
+# 列表总览页每页显示的列表数（只读取 List 表上的汇总字段，一次查询）
+LIST_INDEX_PAGE_SIZE = int(os.getenv('DJANGO_LIST_INDEX_PAGE_SIZE', '2000'))
+# 写入合并（write-behind）：开启后 new_item 把条目放入进程内队列，由后台线程每隔
+# LIST_WRITE_BEHIND_INTERVAL_MS 毫秒或攒满 LIST_WRITE_BEHIND_MAX_BATCH 条时，在一个事务中批量写入。
+# 请求会等待自己的条目提交后再重定向。
+LIST_WRITE_BEHIND = os.getenv('DJANGO_LIST_WRITE_BEHIND', 'False').lower() == 'true'
+LIST_WRITE_BEHIND_INTERVAL_MS = int(os.getenv('DJANGO_LIST_WRITE_BEHIND_INTERVAL_MS', '5'))
+LIST_WRITE_BEHIND_MAX_BATCH = int(os.getenv('DJANGO_LIST_WRITE_BEHIND_MAX_BATCH', '200'))
+# 使用 ASGI（uvicorn worker）部署时改用协程视图；WSGI worker 运行协程视图要经过 async_to_sync，
+# 每个请求、每次查询都多一次线程切换，所以默认使用同步视图（deploy_tools/gunicorn.conf.py 在使用 uvicorn worker 时打开）
+LIST_ASYNC_VIEWS = os.getenv('DJANGO_ASYNC_VIEWS', 'False').lower() == 'true'
+# 列表实时更新（Server-Sent Events）只在使用协程视图（ASGI）时开启，WSGI 下页面不订阅，刷新后才看到新条目。
+# 发布/订阅后端默认只在单个进程内分发；
+# 多个 worker 时改为 lists.events.RedisBroker 并设置 DJANGO_LIST_EVENTS_REDIS_URL（需要安装 redis 可选依赖：uv sync --extra redis），
+# 否则 deploy_tools/gunicorn.conf.py 拒绝启动多个 uvicorn worker
+LIST_EVENTS_BACKEND = os.getenv('DJANGO_LIST_EVENTS_BACKEND', 'lists.events.InProcessBroker')
+LIST_EVENTS_REDIS_URL = os.getenv('DJANGO_LIST_EVENTS_REDIS_URL', 'redis://localhost:6379/0')
+LIST_EVENTS_QUEUE_SIZE = 1000
+LIST_EVENTS_HEARTBEAT_SECONDS = 15
+# 浏览器断线或在同步（WSGI）worker 上流结束后，多久重新连接（毫秒）
+LIST_EVENTS_RETRY_MS = 3000
+# 全文搜索每页返回的结果数
+SEARCH_PAGE_SIZE = int(os.getenv('DJANGO_SEARCH_PAGE_SIZE', '20'))
+# 批量导入条目时每条 INSERT 语句包含的行数
+LIST_BULK_BATCH_SIZE = int(os.getenv('DJANGO_LIST_BULK_BATCH_SIZE', '500'))
+# 拖动排序时只改写被移动条目的 position；反复插入到同一位置会让 position 变长，
+# 超过这个长度后在后台线程中把整个清单的 position 重新均匀分配（见 lists/positions.py）
+LIST_POSITION_REBALANCE_LENGTH = int(os.getenv('DJANGO_LIST_POSITION_REBALANCE_LENGTH', '32'))
+# 重新分配时每个事务改写的条目数，大清单分成多个短事务，不会长时间占用写锁
+LIST_POSITION_REBALANCE_CHUNK_SIZE = int(os.getenv('DJANGO_LIST_POSITION_REBALANCE_CHUNK_SIZE', '1000'))
+# 数据回填（lists/backfill.py）每批处理的行数，以及两批之间的暂停（毫秒）。
+# 每批一个短事务，暂停期间其他请求可以拿到 SQLite 的写锁
+LIST_BACKFILL_BATCH_SIZE = int(os.getenv('DJANGO_LIST_BACKFILL_BATCH_SIZE', '1000'))
+LIST_BACKFILL_PAUSE_MS = int(os.getenv('DJANGO_LIST_BACKFILL_PAUSE_MS', '50'))
+# 超过这么多天没有写入的清单由 manage.py archive_lists 压缩归档：条目从 lists_item 移到
+# zlib 压缩数据中，查看时解压，再次写入时自动恢复
+LIST_ARCHIVE_IDLE_DAYS = int(os.getenv('DJANGO_LIST_ARCHIVE_IDLE_DAYS', '30'))
+# 归档时每 LIST_ARCHIVE_CHUNK_SIZE 条条目压缩成一行，翻页和导出每次只解压需要的那一块
+LIST_ARCHIVE_CHUNK_SIZE = int(os.getenv('DJANGO_LIST_ARCHIVE_CHUNK_SIZE', '1000'))
+# 删除清单时先打上删除标记，清单立即对所有读取不可见；之后每个短事务最多删除 LIST_DELETE_CHUNK_SIZE 条条目，
+# 批间暂停 LIST_DELETE_PAUSE_MS 毫秒让出写锁。条目多于一批的清单默认交给后台线程删除（见 lists/deletion.py）
+LIST_DELETE_CHUNK_SIZE = int(os.getenv('DJANGO_LIST_DELETE_CHUNK_SIZE', '1000'))
+LIST_DELETE_PAUSE_MS = int(os.getenv('DJANGO_LIST_DELETE_PAUSE_MS', '10'))
+LIST_DELETE_IN_BACKGROUND = os.getenv('DJANGO_LIST_DELETE_IN_BACKGROUND', 'True').lower() == 'true'
@@ -0,0 +1,49 @@
+"""
+Lean settings profile for the anonymous-only lists app.
+
+The app has no user accounts, so nothing needs auth, DB-backed sessions,
+the message framework or their context processors. This profile keeps the
+default settings and trims those pieces, so that a worker imports less at
+start-up and a request only does its view's own queries:
+
+    DJANGO_SETTINGS_MODULE=notes.settings_lean
+
+``tasks.deploy`` uses it by default (``DEPLOY_SETTINGS_MODULE``).
+``manage.py startup_profile`` shows what each piece costs at start-up.
+"""
+
+import copy
+import os
+
+from notes.settings import *  # noqa: F403
+from notes.settings import INSTALLED_APPS, MIDDLEWARE, TEMPLATES
+
+# 默认不加载用不到的 contrib 应用（auth / contenttypes / sessions / messages）及其中间件，
+# worker 启动时少导入一批模块（auth 的模型导入占 django.setup() 的一成左右）。
+# 以后需要会话或 request.user 时设置 DJANGO_LEAN_CONTRIB_APPS=True：
+# 会话保存在签名 cookie 中，request.user 惰性解析，匿名用户不会查询数据库
+LEAN_CONTRIB_APPS = os.getenv('DJANGO_LEAN_CONTRIB_APPS', 'False').lower() == 'true'
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+
+UNUSED_APPS = ['django.contrib.messages']
+UNUSED_MIDDLEWARE = ['django.contrib.messages.middleware.MessageMiddleware']
+if not LEAN_CONTRIB_APPS:
+    UNUSED_APPS += ['django.contrib.auth', 'django.contrib.contenttypes', 'django.contrib.sessions']
+    UNUSED_MIDDLEWARE += [
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+    ]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in UNUSED_APPS]
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in UNUSED_MIDDLEWARE]
+
+# 模板中没有用到 user / perms / messages，去掉对应的 context processor
+TEMPLATES = copy.deepcopy(TEMPLATES)
+TEMPLATES[0]['OPTIONS']['context_processors'] = [
+    processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+    if processor not in (
+        'django.contrib.auth.context_processors.auth',
+        'django.contrib.messages.context_processors.messages',
+    )
+]
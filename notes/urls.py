@@ -17,12 +17,13 @@ Including another URLconf
 # from django.contrib import admin
 
 from django.urls import include, path, re_path
-from lists import views as list_views
 from lists import urls as list_urls
+from lists import api_urls as list_api_urls
 
 
 urlpatterns = [
     # path('admin/', admin.site.urls),
-    path('', list_views.home_page, name='home'),  # Include the URLs from the lists app
+    path('', list_urls.home_page, name='home'),  # Include the URLs from the lists app
     path('lists/', include(list_urls)),
+    path('api/', include(list_api_urls)),
 ]
@@ -1,8 +1,10 @@
 # tasks.py
 
+import hashlib
 import os
-from invoke import task
-from fabric import Connection
+import subprocess
+from invoke import Exit, task
+from fabric import ThreadingGroup
 
 # --- 全局配置变量 ---
 # 请根据你的实际情况修改这些值
@@ -13,7 +15,10 @@ LOCAL_FABFILE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # 远程服务器上的路径配置
 # 你的站点根目录，所有部署文件将放在这里
-REMOTE_SITE_PATH = "/home/opaimon/azure.paimoe.tech"
+# 用户和域名见下方“服务器连接信息”
+REMOTE_USER = os.getenv("DEPLOY_USER", "opaimon") # SSH 登录用户和 Gunicorn 运行用户
+DOMAIN_NAME = "azure.paimoe.tech"
+REMOTE_SITE_PATH = f"/home/{REMOTE_USER}/{DOMAIN_NAME}"
 # Django 项目的实际根目录（通常是 REMOTE_SITE_PATH/your_project_name）
 # 在你的例子中，项目目录是 todolist
 REMOTE_PROJECT_ROOT = f"{REMOTE_SITE_PATH}/todolist"
@@ -31,124 +36,238 @@ REMOTE_STATIC_ROOT_PATH = f"{REMOTE_SITE_PATH}/static"
 REMOTE_DATABASE_ROOT_PATH = f"{REMOTE_SITE_PATH}/database"
 # 环境变量文件的路径
 REMOTE_ENV_VARS_FILE_PATH = f"{REMOTE_SITE_PATH}/env_vars.conf"
-REMOTE_BIN_PATH = f"/home/opaimon/.local/bin/"
+REMOTE_BIN_PATH = f"/home/{REMOTE_USER}/.local/bin/"
+# 各部署步骤上次成功时的输入哈希，用于跳过输入没有变化的步骤
+REMOTE_DEPLOY_STATE_PATH = f"{REMOTE_SITE_PATH}/.deploy-state"
 
 # 服务器连接信息
 SERVER_IP = "4.194.57.235"
-DOMAIN_NAME = "azure.paimoe.tech"
-REMOTE_USER = "opaimon" # SSH 登录用户和 Gunicorn 运行用户
 REMOTE_SSH_PORT = 5987 # SSH 端口
 
+# 部署目标主机清单，逗号分隔，格式为 user@host:port；未设置时只部署到 DOMAIN_NAME 这一台。
+# 所有主机并行部署，也可以指向本地的 SSH 服务或 docker 容器来演练，例如
+# DEPLOY_INDEPENDENT_HOSTS=1 DEPLOY_HOSTS="opaimon@127.0.0.1:2201,opaimon@127.0.0.1:2202" fab deploy
+# 注意：每台主机都使用自己本地的 SQLite 数据库，主机之间不共享数据。把多台主机放在同一个负载均衡后面时，
+# 在一台主机上创建的清单在其他主机上是 404。因此部署到多台主机需要设置 DEPLOY_INDEPENDENT_HOSTS=1，
+# 确认它们是各自独立的站点（或演练环境）
+DEPLOY_HOSTS = os.getenv("DEPLOY_HOSTS", f"{REMOTE_USER}@{DOMAIN_NAME}:{REMOTE_SSH_PORT}")
+DEPLOY_INDEPENDENT_HOSTS = os.getenv("DEPLOY_INDEPENDENT_HOSTS", "0") == "1"
+# 滚动重载时每批处理的主机数；重载期间新旧 worker 交替服务，其余主机也继续提供服务
+DEPLOY_ROLLING_BATCH = int(os.getenv("DEPLOY_ROLLING_BATCH", "1"))
+
+# 清单分片数（见 notes/settings.py 的 LIST_SHARDS），写入 systemd service，迁移时也要使用同样的值
+DEPLOY_LIST_SHARDS = os.getenv("DEPLOY_LIST_SHARDS", "1")
+
+# 列表实时更新的发布/订阅后端（见 lists/events.py）。uvicorn worker 多于一个时必须经由 Redis 分发，
+# 否则 gunicorn.conf.py 拒绝启动；设置 DEPLOY_LIST_EVENTS_REDIS_URL 后安装 redis 可选依赖并改用 RedisBroker
+DEPLOY_LIST_EVENTS_REDIS_URL = os.getenv("DEPLOY_LIST_EVENTS_REDIS_URL", "")
+DEPLOY_LIST_EVENTS_BACKEND = (
+    "lists.events.RedisBroker" if DEPLOY_LIST_EVENTS_REDIS_URL else "lists.events.InProcessBroker"
+)
+DEPLOY_UV_SYNC = "uv sync --extra redis" if DEPLOY_LIST_EVENTS_REDIS_URL else "uv sync"
+
+# 每个步骤依赖的文件：这些文件在要部署的提交中的内容没有变化时，跳过该步骤（fab deploy --force 强制执行）
+STEP_INPUTS = {
+    "dependencies": ["pyproject.toml", "uv.lock"],
+    "collectstatic": ["lists/static", "lists/storage.py", "notes/settings.py"],
+    # uv.lock：升级 Django 等依赖时可能带来 contrib 应用的新迁移
+    "migrate": ["lists/migrations", "uv.lock"],
+}
+# 步骤依赖的部署配置，和文件一起计入哈希：分片数变化时需要 migrate_shards 创建新的分片数据库，
+# 开启 Redis 时需要安装 redis 可选依赖
+STEP_CONFIG = {
+    "dependencies": {"UV_SYNC": DEPLOY_UV_SYNC},
+    "migrate": {"DJANGO_LIST_SHARDS": DEPLOY_LIST_SHARDS},
+}
+
+# Gunicorn worker 配置
+# 默认由容量探测结果（fab capacity-probe）选择 worker 类型，没有探测结果时使用 gthread；
+# 应用入口（WSGI / ASGI）、协程视图和持久连接随 worker 类型一起确定，见 deploy_tools/gunicorn.conf.py。
+# 设置环境变量 DEPLOY_ASGI=1 则固定使用 uvicorn worker 运行 ASGI 应用（notes/asgi.py）
+DEPLOY_ASGI = os.getenv("DEPLOY_ASGI", "0") == "1"
+GUNICORN_WORKER_CLASS = "uvicorn_worker.UvicornWorker" if DEPLOY_ASGI else ""
+
+# 生产环境使用精简的 settings（见 notes/settings_lean.py），设置 DEPLOY_SETTINGS_MODULE=notes.settings 可改回默认
+DEPLOY_SETTINGS_MODULE = os.getenv("DEPLOY_SETTINGS_MODULE", "notes.settings_lean")
+
+# 容量探测结果，gunicorn.conf.py 通过 GUNICORN_PROFILE 读取；放在代码目录之外，git reset 不会影响它
+REMOTE_GUNICORN_PROFILE_PATH = f"{REMOTE_SITE_PATH}/gunicorn-profile.json"
+
+def _group(inventory=None):
+    """Connections to every host in the inventory, driven in parallel."""
+    hosts = [host.strip() for host in (inventory or DEPLOY_HOSTS).split(",") if host.strip()]
+    # 如果需要密码认证，可以传入 connect_kwargs={"password": "your_ssh_password"}
+    # 强烈建议使用 SSH 密钥认证，将密钥添加到 SSH 代理或 ~/.ssh 目录
+    return ThreadingGroup(*hosts)
+
+def _hosts(connections):
+    return ", ".join(f"{c.host}:{c.port}" for c in connections)
+
+def input_digest(commit, paths, config=None):
+    """Hash of the given files and directories as they are in ``commit``, plus ``config``."""
+    listing = subprocess.run(
+        ["git", "ls-tree", "-r", commit, "--", *paths],
+        cwd=LOCAL_FABFILE_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    listing += "".join(f"{name}={value}\n" for name, value in sorted((config or {}).items()))
+    return hashlib.sha256(listing.encode()).hexdigest()
+
+def stale_hosts(group, step, digest):
+    """Hosts whose last successful ``step`` ran on different inputs."""
+    results = group.run(f"cat {REMOTE_DEPLOY_STATE_PATH}/{step} 2>/dev/null || true", hide=True)
+    return [c for c, result in results.items() if result.stdout.strip() != digest]
+
+def run_step(group, step, commit, commands, force=False):
+    """Run ``commands`` on the hosts where the step's inputs changed, then record them."""
+    digest = input_digest(commit, STEP_INPUTS[step], STEP_CONFIG.get(step))
+    hosts = list(group) if force else stale_hosts(group, step, digest)
+    if not hosts:
+        print(f"Skipping {step}: inputs unchanged on every host")
+        return
+    print(f"Running {step} on {_hosts(hosts)}...")
+    subgroup = ThreadingGroup.from_connections(hosts)
+    for command in commands:
+        subgroup.run(f"cd {REMOTE_PROJECT_ROOT} && {command}")
+    subgroup.run(f"mkdir -p {REMOTE_DEPLOY_STATE_PATH} && echo {digest} > {REMOTE_DEPLOY_STATE_PATH}/{step}")
+
+def rolling_reload(group, service_file_name, restart_hosts=()):
+    """Reload gunicorn a batch of hosts at a time, waiting until each batch serves again.
+
+    A reload starts the new master and workers before the old ones stop (see
+    deploy_tools/gunicorn-reload.sh), so every host keeps serving. Hosts in
+    ``restart_hosts`` are restarted instead.
+    """
+    hosts = list(group)
+    health_check = (
+        f"for i in $(seq 30); do "
+        f"curl -sf -o /dev/null -H 'Host: {DOMAIN_NAME}' --unix-socket {REMOTE_GUNICORN_SOCKET_PATH} http://localhost/ "
+        f"&& exit 0; sleep 1; done; exit 1"
+    )
+    for start in range(0, len(hosts), DEPLOY_ROLLING_BATCH):
+        batch = hosts[start:start + DEPLOY_ROLLING_BATCH]
+        print(f"Reloading Gunicorn on {_hosts(batch)}...")
+        reload = [c for c in batch if c not in restart_hosts]
+        restart = [c for c in batch if c in restart_hosts]
+        # 服务还没有运行时（第一次部署）reload-or-restart 会直接启动它
+        if reload:
+            ThreadingGroup.from_connections(reload).run(f"sudo systemctl reload-or-restart {service_file_name}")
+        if restart:
+            ThreadingGroup.from_connections(restart).run(f"sudo systemctl restart {service_file_name}")
+        # 这一批恢复服务之后才处理下一批；健康检查失败时中止部署，其余主机保持旧版本继续服务
+        ThreadingGroup.from_connections(batch).run(health_check, hide=True)
+
+def _render_template(name, replacements):
+    with open(os.path.join(LOCAL_FABFILE_DIR, "deploy_tools", name), "r", encoding="utf-8") as f:
+        content = f.read()
+    for placeholder, value in replacements:
+        content = content.replace(placeholder, value)
+    return content
+
 @task
-def deploy(ctx): # ctx 是 invoke.Context 对象
+def capacity_probe(ctx, duration=10, inventory=None):
     """
-    Deploys the Django application to the remote server.
+    Measures req/s of several gunicorn worker profiles on each server and saves the best one.
     """
-    # 在任务内部创建 Fabric Connection 对象
-    c = Connection(
-        host=DOMAIN_NAME, # 或者 SERVER_IP，使用域名更通用
-        port=REMOTE_SSH_PORT,
-        user=REMOTE_USER
-        # 如果需要密码认证，可以添加 connect_kwargs={"password": "your_ssh_password"}
-        # 强烈建议使用 SSH 密钥认证，将密钥添加到 SSH 代理或 ~/.ssh 目录
-    )
+    group = _group(inventory)
+    # 与 service 使用同一个实时更新后端：进程内后端只探测单个 uvicorn worker
+    group.run(f"cd {REMOTE_PROJECT_ROOT} && DJANGO_LIST_EVENTS_BACKEND={DEPLOY_LIST_EVENTS_BACKEND} "
+              f"{REMOTE_VENV_PATH}/bin/python -m benchmarks.capacity_probe "
+              f"--duration {duration} --output {REMOTE_GUNICORN_PROFILE_PATH}")
+    print("Run `fab deploy` (or restart the service) to apply the new profile.")
+
+@task
+def deploy(ctx, inventory=None, force=False): # ctx 是 invoke.Context 对象
+    """
+    Deploys the Django application to every host in the inventory in parallel.
+    """
+    group = _group(inventory)
+    if len(group) > 1 and not DEPLOY_INDEPENDENT_HOSTS:
+        raise Exit(
+            f"Refusing to deploy to {len(group)} hosts: each keeps its own SQLite database, so lists created "
+            "on one are missing on the others. Set DEPLOY_INDEPENDENT_HOSTS=1 if they are separate sites "
+            "or a rehearsal."
+        )
+    local_commit = subprocess.run(
+        ["git", "log", "-n", "1", "--format=%H"], cwd=LOCAL_FABFILE_DIR, capture_output=True, text=True, check=True,
+    ).stdout.strip()
 
-    print(f"--- Starting deployment to {c.host}:{c.port} as {c.user} ---")
+    print(f"--- Starting deployment of {local_commit[:12]} to {_hosts(group)} as {REMOTE_USER} ---")
 
     # 1. 确保远程站点根目录和子目录存在
     print(f"Ensuring remote directories exist: {REMOTE_SITE_PATH}, {REMOTE_PROJECT_ROOT}, {REMOTE_DATABASE_ROOT_PATH}")
-    c.run(f"mkdir -p {REMOTE_SITE_PATH}", warn=True)
-    c.run(f"mkdir -p {REMOTE_PROJECT_ROOT}", warn=True)
-    c.run(f"mkdir -p {REMOTE_DATABASE_ROOT_PATH}", warn=True)
+    group.run(f"mkdir -p {REMOTE_SITE_PATH} {REMOTE_PROJECT_ROOT} {REMOTE_DATABASE_ROOT_PATH}", warn=True)
 
     # 2. 拉取最新源代码（使用 git clone 或 git fetch + reset --hard）
     repo_url = "https://github.com/OPaimon/todolist.git"
-    local_commit = os.popen("git log -n 1 --format=%H").read().strip()
-    with c.cd(REMOTE_PROJECT_ROOT):
-        # 检查 .git 目录是否存在
-        result = c.run("test -d .git", warn=True)
-        if result.failed:
-            print("Cloning repository...")
-            c.run(f"git clone {repo_url} .")
-        else:
-            print("Fetching latest changes...")
-            c.run("git fetch")
-        print(f"Resetting to local commit {local_commit}...")
-        c.run(f"git reset --hard {local_commit}")
+    print(f"Fetching code and resetting to local commit {local_commit}...")
+    group.run(
+        f"cd {REMOTE_PROJECT_ROOT} && (test -d .git || git clone {repo_url} .) "
+        f"&& git fetch && git reset --hard {local_commit}"
+    )
 
     # 3. 创建并同步虚拟环境依赖
-    with c.cd(REMOTE_PROJECT_ROOT):
-        print("Synchronizing dependencies with uv...")
-        # uv sync 在 .venv 不存在时会自动创建虚拟环境并安装依赖
-        c.run(f"{REMOTE_BIN_PATH}uv sync")
-
-    # 5. 收集静态文件
-    with c.cd(REMOTE_PROJECT_ROOT):
-        print("Collecting static files...")
-        c.run(f"{REMOTE_VENV_PATH}/bin/python manage.py collectstatic --noinput")
-        # 设置静态文件目录的权限，确保 Nginx 可以读取
-        print(f"Setting permissions for static files: {REMOTE_STATIC_ROOT_PATH}")
-        c.run(f"sudo chown -R {REMOTE_USER}:{REMOTE_USER} {REMOTE_STATIC_ROOT_PATH}")
-        c.run(f"sudo chmod -R 755 {REMOTE_STATIC_ROOT_PATH}") # 确保 Nginx 可以进入目录并读取文件
-
-
-    # 6. 运行数据库迁移
-    with c.cd(REMOTE_PROJECT_ROOT):
-        print("Applying database migrations...")
-        c.run(f"{REMOTE_VENV_PATH}/bin/python manage.py migrate")
-        # 设置数据库文件（如果使用 SQLite）的权限
-        print(f"Setting permissions for database directory: {REMOTE_DATABASE_ROOT_PATH}")
-        c.run(f"sudo chown -R {REMOTE_USER}:{REMOTE_USER} {REMOTE_DATABASE_ROOT_PATH}")
-        c.run(f"sudo chmod -R 750 {REMOTE_DATABASE_ROOT_PATH}") # 数据库文件通常只需要拥有者和组读写
-
-
-    # 7. 更新 Gunicorn Systemd Service 文件
-    print("Updating Gunicorn Systemd service file...")
+    # uv sync 在 .venv 不存在时会自动创建虚拟环境并安装依赖
+    run_step(group, "dependencies", local_commit, [f"{REMOTE_BIN_PATH}{DEPLOY_UV_SYNC}"], force)
 
-    # 读取模板内容
-    template_path = os.path.join(LOCAL_FABFILE_DIR, "deploy_tools", "gunicorn-systemd.template.service")
-    with open(template_path, "r", encoding="utf-8") as f:
-        template_content = f.read()
-
-    # 替换模板变量
-    service_content = (
-        template_content
-        .replace("DOMAIN_NAME", DOMAIN_NAME)
-        .replace("REMOTE_USER", REMOTE_USER)
-        .replace("SERVER_IP", SERVER_IP)
-    )
+    # 4. 收集静态文件
+    # 文件名带内容哈希并生成 .gz/.br 压缩副本（见 lists/storage.py）
+    # 设置静态文件目录的权限，确保 Nginx 可以进入目录并读取文件
+    run_step(group, "collectstatic", local_commit, [
+        f"{REMOTE_VENV_PATH}/bin/python manage.py collectstatic --noinput",
+        f"sudo chown -R {REMOTE_USER}:{REMOTE_USER} {REMOTE_STATIC_ROOT_PATH}",
+        f"sudo chmod -R 755 {REMOTE_STATIC_ROOT_PATH}",
+    ], force)
+
+    # 5. 运行数据库迁移
+    # 设置数据库文件（如果使用 SQLite）的权限，数据库文件通常只需要拥有者和组读写
+    run_step(group, "migrate", local_commit, [
+        # 包括 default 在内的每个分片数据库
+        f"DJANGO_LIST_SHARDS={DEPLOY_LIST_SHARDS} {REMOTE_VENV_PATH}/bin/python manage.py migrate_shards",
+        f"sudo chown -R {REMOTE_USER}:{REMOTE_USER} {REMOTE_DATABASE_ROOT_PATH}",
+        f"sudo chmod -R 750 {REMOTE_DATABASE_ROOT_PATH}",
+    ], force)
 
+    # 6. 更新 Gunicorn Systemd Service 文件
+    print("Updating Gunicorn Systemd service file...")
+    service_content = _render_template("gunicorn-systemd.template.service", [
+        ("DOMAIN_NAME", DOMAIN_NAME),
+        ("REMOTE_USER", REMOTE_USER),
+        ("SERVER_IP", SERVER_IP),
+        ("GUNICORN_WORKER_CLASS_VALUE", GUNICORN_WORKER_CLASS),
+        ("DJANGO_LIST_SHARDS_VALUE", DEPLOY_LIST_SHARDS),
+        ("DJANGO_SETTINGS_MODULE_VALUE", DEPLOY_SETTINGS_MODULE),
+        ("DJANGO_LIST_EVENTS_BACKEND_VALUE", DEPLOY_LIST_EVENTS_BACKEND),
+        ("DJANGO_LIST_EVENTS_REDIS_URL_VALUE", DEPLOY_LIST_EVENTS_REDIS_URL),
+    ])
     service_file_name = f"{DOMAIN_NAME.replace('.', '_')}.service"
     remote_service_path = f"/etc/systemd/system/{service_file_name}"
+    # 平滑重载沿用 Gunicorn 启动时的环境变量，service 文件改变了的主机需要 restart
+    current = group.run(f"cat {remote_service_path} 2>/dev/null || true", hide=True)
+    restart_hosts = [c for c, result in current.items() if result.stdout.strip() != service_content.strip()]
+    # 上传并写入 service 文件，重新加载 Systemd 配置
+    group.run(f"echo '{service_content}' | sudo tee {remote_service_path} > /dev/null")
+    group.run("sudo systemctl daemon-reload")
+    group.run(f"sudo systemctl enable {service_file_name}", warn=True) # enable warn=True, 首次启用
 
-    # 上传并写入 service 文件
-    c.run(f"echo '{service_content}' | sudo tee {remote_service_path}")
-
-    # 8. 重新加载 Systemd 配置并启动/重启 Gunicorn
-    print("Reloading Systemd daemon and restarting Gunicorn service...")
-    c.run("sudo systemctl daemon-reload")
-    c.run(f"sudo systemctl enable {service_file_name}", warn=True) # enable warn=True, 首次启用
-    c.run(f"sudo systemctl restart {service_file_name}")
+    # 7. 滚动重载 Gunicorn
+    rolling_reload(group, service_file_name, restart_hosts)
 
-    # 9. 更新 Nginx 配置
+    # 8. 更新 Nginx 配置
     print("Updating Nginx configuration...")
-    nginx_template_path = os.path.join(LOCAL_FABFILE_DIR, "deploy_tools", "nginx.template.conf")
-    with open(nginx_template_path, "r", encoding="utf-8") as f:
-        nginx_template_content = f.read()
-    nginx_conf_content = (
-        nginx_template_content
-        .replace("DOMAIN_NAME", DOMAIN_NAME)
-    )
+    nginx_conf_content = _render_template("nginx.template.conf", [
+        ("DOMAIN_NAME", DOMAIN_NAME),
+        ("REMOTE_USER", REMOTE_USER),
+    ])
     # 上传并写入 Nginx 配置文件
-    c.run(f"echo '{nginx_conf_content}' | sudo tee {REMOTE_NGINX_SITE_AVAILABLE}")
+    group.run(f"echo '{nginx_conf_content}' | sudo tee {REMOTE_NGINX_SITE_AVAILABLE} > /dev/null")
 
-    # 10. 激活 Nginx 站点 (如果尚未激活)
+    # 9. 激活 Nginx 站点 (如果尚未激活)
     print("Ensuring Nginx site is enabled...")
-    c.run(f"sudo ln -sf {REMOTE_NGINX_SITE_AVAILABLE} {REMOTE_NGINX_SITE_ENABLED}", warn=True)
+    group.run(f"sudo ln -sf {REMOTE_NGINX_SITE_AVAILABLE} {REMOTE_NGINX_SITE_ENABLED}", warn=True)
 
-    # 11. 测试 Nginx 配置并重启 Nginx
+    # 10. 测试 Nginx 配置并重启 Nginx
     print("Testing Nginx configuration and reloading...")
-    c.run("sudo nginx -t") # 测试 Nginx 配置是否有效
-    c.run("sudo systemctl reload nginx") # 平滑重启 Nginx
+    group.run("sudo nginx -t") # 测试 Nginx 配置是否有效
+    group.run("sudo systemctl reload nginx") # 平滑重启 Nginx
 
-    print(f"--- Deployment to {c.host} complete! Visit http://{DOMAIN_NAME} ---")
\ No newline at end of file
+    print(f"--- Deployment to {_hosts(group)} complete! Visit http://{DOMAIN_NAME} ---")